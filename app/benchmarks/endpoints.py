@@ -0,0 +1,266 @@
+"""
+주요 endpoint의 응답시간 백분위수와 쿼리 수 측정
+ 데이터 크기(--sizes, Post 수)마다 별도의 프로세스에서 임시 SQLite DB와 MEDIA_ROOT를 만들고
+ generate_dataset 명령으로 데이터를 생성한 후, django.test.Client로 각 endpoint를 반복 요청
+ (미들웨어, 템플릿/Serializer를 모두 거치며 네트워크/WSGI서버 비용은 포함하지 않음)
+ 요청마다 캐시를 비운 경우(cold)와 캐시가 채워진 경우(warm)를 나누어 측정
+ 결과는 JSON으로 저장하며, --compare로 두 결과 파일을 비교
+
+실행 (app 디렉터리에서)
+ python -m benchmarks.endpoints --sizes 1000 5000 --requests 50 --output after.json
+ python -m benchmarks.endpoints --sizes 1000 --endpoints PostList PostDetail
+ python -m benchmarks.endpoints --compare before.json after.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+
+# Post 수(size)에 대한 다른 데이터의 비율
+DATASET_RATIOS = {
+    'users': 0.1,
+    'comments': 3,
+    'likes': 5,
+    'hashtags': 0.1,
+}
+CACHE_MODES = ('cold', 'warm')
+
+
+def dataset_options(size, seed):
+    return {
+        'posts': size,
+        'users': max(10, int(size * DATASET_RATIOS['users'])),
+        'comments': int(size * DATASET_RATIOS['comments']),
+        'likes': int(size * DATASET_RATIOS['likes']),
+        'hashtags': max(50, int(size * DATASET_RATIOS['hashtags'])),
+        'photos': 5,
+        'photo_size': 320,
+        'seed': seed,
+    }
+
+
+def endpoints():
+    """
+    [(이름, method, path), ...]
+     생성된 데이터에서 가장 댓글이 많은 Post와 가장 많이 사용된 해시태그를 대상으로 함
+    """
+    from posts.models import Post, PostHashTag
+    from django.db.models import Sum
+
+    post = Post.objects.order_by('-comment_count', 'pk').first()
+    tag_name = PostHashTag.objects.values('hashtag__name')\
+        .annotate(count=Sum('comment_count')).order_by('-count')\
+        .values_list('hashtag__name', flat=True).first()
+    return [
+        ('post_list', 'get', '/posts/'),
+        ('PostList', 'get', '/api/posts/post/'),
+        ('PostDetail', 'get', f'/api/posts/post/{post.pk}/'),
+        ('tag_post_list', 'get', f'/explore/tags/{tag_name}/'),
+        ('tag_search', 'get', f'/posts/api/tag-search/?keyword={tag_name[:2]}'),
+        ('post_like_toggle', 'post', f'/posts/{post.pk}/like-toggle/'),
+    ]
+
+
+def percentile(values, p):
+    # 정렬된 values의 p백분위수 (nearest-rank)
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values))) - 1))
+    return values[index]
+
+
+def measure(client, method, path, cache_mode, requests, warmup):
+    from django.core.cache import cache
+    from config.querybudget import QueryRecorder
+
+    for _ in range(warmup):
+        getattr(client, method)(path)
+    latencies = []
+    queries = []
+    sql_times = []
+    statuses = set()
+    for _ in range(requests):
+        if cache_mode == 'cold':
+            cache.clear()
+        recorder = QueryRecorder()
+        with recorder.record():
+            started = time.perf_counter()
+            response = getattr(client, method)(path)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(recorder.count)
+        sql_times.append(recorder.duration * 1000)
+        statuses.add(response.status_code)
+    latencies.sort()
+    return {
+        'status': sorted(statuses),
+        'requests': requests,
+        'mean_ms': sum(latencies) / requests,
+        'p50_ms': percentile(latencies, 50),
+        'p90_ms': percentile(latencies, 90),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1],
+        'queries_avg': sum(queries) / requests,
+        'queries_max': max(queries),
+        'sql_ms_avg': sum(sql_times) / requests,
+    }
+
+
+def run_size(size, requests, warmup, seed, names=None):
+    # 자식 프로세스에서 실행, size에 해당하는 데이터를 만들고 모든 endpoint를 측정
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    directory = tempfile.mkdtemp(prefix='endpoint-benchmark-')
+    try:
+        # DEBUG 쿼리 기록과 요청별 예산 검사(config.querybudget)에 드는 시간은 제외
+        setup_test_environment(debug=False)
+        settings.QUERY_BUDGET_MODE = 'off'
+        settings.MEDIA_ROOT = os.path.join(directory, 'media')
+        settings.DATABASES['default']['NAME'] = os.path.join(directory, 'db.sqlite3')
+
+        started = time.perf_counter()
+        call_command('migrate', verbosity=0)
+        options = dataset_options(size, seed)
+        call_command('generate_dataset', stdout=io.StringIO(), **options)
+        generate_seconds = time.perf_counter() - started
+
+        from members.models import User
+        client = Client()
+        client.force_login(User.objects.filter(username__startswith='bench-').first())
+        results = []
+        for name, method, path in endpoints():
+            if names and name not in names:
+                continue
+            for cache_mode in CACHE_MODES:
+                result = measure(client, method, path, cache_mode, requests, warmup)
+                results.append({
+                    'size': size,
+                    'endpoint': name,
+                    'path': path,
+                    'cache': cache_mode,
+                    **result,
+                })
+        return {'size': size, 'dataset': options, 'generate_seconds': generate_seconds,
+                'results': results}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    runs = []
+    for size in args.sizes:
+        # 프로세스별 캐시(해시태그 인덱스 등)가 다른 크기의 측정에 영향을 주지 않도록 분리
+        output = subprocess.check_output([
+            sys.executable, '-m', 'benchmarks.endpoints',
+            '--run-size', str(size),
+            '--requests', str(args.requests),
+            '--warmup', str(args.warmup),
+            '--seed', str(args.seed),
+        ] + (['--endpoints'] + args.endpoints if args.endpoints else []))
+        runs.append(json.loads(output))
+        print_results(runs[-1]['results'], file=sys.stderr)
+
+    import sqlite3
+    report = {
+        'benchmark': 'endpoints',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'requests': args.requests,
+        'warmup': args.warmup,
+        'seed': args.seed,
+        'runs': runs,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+COLUMNS = ['size', 'endpoint', 'cache', 'p50_ms', 'p90_ms', 'p99_ms', 'queries_avg', 'status']
+
+
+def print_results(results, file=sys.stdout):
+    print(''.join(f'{column:>18}' for column in COLUMNS), file=file)
+    for result in results:
+        print(''.join(
+            f'{result[column]:>18.1f}' if isinstance(result[column], float)
+            else f'{str(result[column]):>18}'
+            for column in COLUMNS
+        ), file=file)
+
+
+def compare(before_path, after_path):
+    # 같은 (size, endpoint, cache)의 p50, p99, 쿼리 수 변화를 출력
+    def rows(path):
+        with open(path) as f:
+            report = json.load(f)
+        return {
+            (result['size'], result['endpoint'], result['cache']): result
+            for run in report['runs'] for result in run['results']
+        }
+
+    before, after = rows(before_path), rows(after_path)
+    columns = ['p50_ms', 'p99_ms', 'queries_avg']
+    print(f"{'size':>8}{'endpoint':>18}{'cache':>7}" + ''.join(
+        f'{column:>26}' for column in columns))
+    for key in sorted(before.keys() & after.keys()):
+        cells = []
+        for column in columns:
+            old, new = before[key][column], after[key][column]
+            change = (new - old) / old * 100 if old else 0
+            cells.append(f'{old:>9.1f} -> {new:>7.1f} ({change:+4.0f}%)')
+        print(f'{key[0]:>8}{key[1]:>18}{key[2]:>7}' + ''.join(f'{cell:>26}' for cell in cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument(
+        '--endpoints', nargs='+',
+        help='측정할 endpoint 이름 (post_list, PostList, PostDetail, '
+             'tag_post_list, tag_search, post_like_toggle), 없다면 전체')
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='결과 JSON파일 경로 (없다면 stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+    if args.run_size is not None:
+        json.dump(
+            run_size(args.run_size, args.requests, args.warmup, args.seed, args.endpoints),
+            sys.stdout,
+        )
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,458 @@
+"""
+읽기/쓰기가 섞인 요청으로 config.wsgi.application의 처리량과 포화 지점 측정
+ 임시 DB(--profile의 설정)에 generate_dataset으로 데이터를 만든 후
+ 가상 사용자(--users)마다 스레드 1개가 --mix의 비율로 요청을 골라 WSGI application을 직접 호출
+ (네트워크/WSGI서버 비용은 포함하지 않으며, --processes개의 프로세스가 사용자를 나누어 실행)
+ --users에 여러 값을 주면 동시 사용자 수를 늘려가며 단계별로 측정
+ 처리량이 더 늘지 않고 지연시간만 늘어나는 단계가 해당 설정의 포화 지점
+
+요청 종류 (--mix 이름=비율)
+ feed         피드 (session: /posts/feed/, token: /api/posts/feed/)
+ tag_search   해시태그 자동완성 (/posts/api/tag-search/)
+ tag_page     태그별 Post목록 (session: /explore/tags/<tag>/, token: /api/posts/tag/<tag>/)
+ like_toggle  좋아요/좋아요 취소
+ comment      해시태그가 포함된 댓글 작성 (session만 가능, token사용자는 제외하고 비율을 계산)
+ upload       사진 업로드 (session: /posts/create/, token: /api/posts/post/)
+
+--auth
+ session  로그인 세션 cookie (HTML view를 사용, POST에는 CSRF token을 함께 전송)
+ token    DRF Token (API를 사용)
+ bearer   서명된 access token (members.tokens, API를 사용)
+ mixed    사용자별로 session/token을 번갈아 사용
+
+실행 (app 디렉터리에서)
+ python -m benchmarks.loadtest --users 1 4 16 32 --seconds 10 --output loadtest.json
+ python -m benchmarks.loadtest --profile development --processes 4 --users 8 32 --auth mixed
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+
+from .endpoints import dataset_options, git_revision, percentile
+
+DEFAULT_MIX = 'feed=45,tag_search=20,tag_page=12,like_toggle=15,comment=6,upload=2'
+WORDS = ['오늘', '여행', '맛집', 'daily', 'photo', 'coffee']
+CSRF_TOKEN = 'loadtest' * 8
+
+# 자식 프로세스에 fork로 전달되는 값 (setup()에서 채움)
+_context = {}
+_current = threading.local()
+
+
+class LockErrorHandler(logging.Handler):
+    """
+    django.request 로거에 기록된 500 오류 중 'database is locked'를 요청 종류별로 집계
+     (오류가 발생한 요청과 같은 스레드에서 기록되므로 _current.action으로 구분)
+    """
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.counts = Counter()
+
+    def emit(self, record):
+        from config.db.sqlite3.base import is_locked_error
+        if record.exc_info and is_locked_error(record.exc_info[1]):
+            self.counts[getattr(_current, 'action', None)] += 1
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f'알 수 없는 요청 종류: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def environ(method, path, user, body=b'', content_type=''):
+    # WSGI서버가 만드는 것과 같은 형태의 environ
+    path, _, query = path.partition('?')
+    env = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    env.update(user['headers'])
+    if method == 'POST' and user['auth'] == 'session':
+        env['HTTP_X_CSRFTOKEN'] = CSRF_TOKEN
+    return env
+
+
+def call(application, env):
+    # application을 호출하고 응답 본문을 모두 읽은 후 상태 코드를 리턴
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        status.append(int(status_line.split(' ', 1)[0]))
+
+    response = application(env, start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return status[0]
+
+
+class VirtualUser:
+    def __init__(self, user, rng):
+        self.user = user
+        self.rng = rng
+        self.api = user['auth'] != 'session'
+        # 이 사용자가 좋아요를 누른 것으로 알고 있는 Post
+        self.liked = set()
+
+    def post_pk(self):
+        return _context['post_pks'][_context['post_sampler'].sample()[0]]
+
+    def tag(self):
+        return _context['tags'][_context['tag_sampler'].sample()[0]]
+
+    def content(self):
+        tags = {self.tag() for _ in range(self.rng.randint(1, 3))}
+        return ' '.join(self.rng.choices(WORDS, k=3) + [f'#{tag}' for tag in tags])
+
+    def feed(self):
+        return 'GET', '/api/posts/feed/' if self.api else '/posts/feed/', {}, {200}
+
+    def tag_search(self):
+        return 'GET', f'/posts/api/tag-search/?keyword={self.tag()[:2]}', {}, {200}
+
+    def tag_page(self):
+        tag = self.tag()
+        path = f'/api/posts/tag/{tag}/' if self.api else f'/explore/tags/{tag}/'
+        return 'GET', path, {}, {200}
+
+    def like_toggle(self):
+        pk = self.post_pk()
+        if not self.api:
+            return 'POST', f'/posts/{pk}/like-toggle/', {}, {302}
+        # 이미 좋아요(400)/취소(404)된 상태였다면 다음 요청에서 반대로 처리
+        if pk in self.liked:
+            self.liked.discard(pk)
+            return 'DELETE', f'/api/posts/post/{pk}/like/', {}, {202, 204, 404}
+        self.liked.add(pk)
+        return 'POST', f'/api/posts/post/{pk}/like/', {}, {201, 202, 400}
+
+    def comment(self):
+        pk = self.post_pk()
+        return 'POST', f'/posts/{pk}/comments/create/', {'content': self.content()}, {302}
+
+    def upload(self):
+        data = {'photo': io.BytesIO(_context['photo']), 'comment': self.content()}
+        data['photo'].name = 'loadtest.jpg'
+        if self.api:
+            return 'POST', '/api/posts/post/', data, {201}
+        return 'POST', '/posts/create/', data, {302}
+
+    def request(self, action):
+        from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+        method, path, data, expected = getattr(self, action)()
+        body = encode_multipart(BOUNDARY, data) if data else b''
+        env = environ(method, path, self.user, body, MULTIPART_CONTENT if data else '')
+        return call(_context['application'], env), expected
+
+
+ACTIONS = ('feed', 'tag_search', 'tag_page', 'like_toggle', 'comment', 'upload')
+# session으로만 사용할 수 있는 요청 (댓글 API가 없음)
+SESSION_ONLY_ACTIONS = ('comment',)
+
+
+def run_user(user, mix, deadline, think_time, seed, results):
+    rng = random.Random(seed)
+    virtual_user = VirtualUser(user, rng)
+    actions = [
+        action for action in mix
+        if not (virtual_user.api and action in SESSION_ONLY_ACTIONS)
+    ]
+    weights = [mix[action] for action in actions]
+    while time.monotonic() < deadline:
+        action = rng.choices(actions, weights)[0]
+        _current.action = action
+        started = time.perf_counter()
+        try:
+            status, expected = virtual_user.request(action)
+            error = status not in expected
+        except Exception:
+            status, error = 'exception', True
+        elapsed = (time.perf_counter() - started) * 1000
+        with results['lock']:
+            results['latencies'][action].append(elapsed)
+            results['statuses'][action][str(status)] += 1
+            results['errors'][action] += error
+        if think_time:
+            time.sleep(rng.expovariate(1 / think_time))
+
+
+def run_process(users, mix, seconds, think_time, seed):
+    # 한 프로세스에서 users의 가상 사용자를 스레드로 실행하고, 측정값을 그대로 리턴
+    from django.db import connections
+    from config.db.sqlite3.base import lock_stats
+
+    handler = LockErrorHandler()
+    logging.getLogger('django.request').addHandler(handler)
+    retries_before = lock_stats.retries
+    results = {
+        'lock': threading.Lock(),
+        'latencies': defaultdict(list),
+        'statuses': defaultdict(Counter),
+        'errors': Counter(),
+    }
+    deadline = time.monotonic() + seconds
+    threads = [
+        threading.Thread(
+            target=run_user,
+            args=(user, mix, deadline, think_time, seed * 100003 + index, results),
+        )
+        for index, user in enumerate(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connections.close_all()
+    logging.getLogger('django.request').removeHandler(handler)
+    return {
+        'latencies': dict(results['latencies']),
+        'statuses': {action: dict(counts) for action, counts in results['statuses'].items()},
+        'errors': dict(results['errors']),
+        'lock_errors': dict(handler.counts),
+        'lock_retries': lock_stats.retries - retries_before,
+    }
+
+
+def run_stage(concurrency, args, mix):
+    users = [_context['users'][index % len(_context['users'])] for index in range(concurrency)]
+    processes = min(args.processes, concurrency)
+    started = time.monotonic()
+    # 여러 프로세스를 사용한다면 부모 프로세스에서는 요청을 처리하지 않음
+    #  (백그라운드 작업 스레드가 있는 상태에서 fork하지 않도록)
+    if args.processes == 1:
+        parts = [run_process(users, mix, args.seconds, args.think_time, args.seed)]
+    else:
+        # 자식 프로세스는 fork로 _context(WSGI application, 데이터 정보)를 그대로 사용
+        from django.db import connections
+        connections.close_all()
+        with ProcessPoolExecutor(processes, mp_context=get_context('fork')) as executor:
+            futures = [
+                executor.submit(
+                    run_process, users[index::processes], mix,
+                    args.seconds, args.think_time, args.seed + index,
+                )
+                for index in range(processes)
+            ]
+            parts = [future.result() for future in futures]
+    elapsed = time.monotonic() - started
+
+    endpoints = []
+    total = errors = lock_errors = 0
+    for action in mix:
+        latencies = sorted(sum((part['latencies'].get(action, []) for part in parts), []))
+        if not latencies:
+            continue
+        statuses = Counter()
+        for part in parts:
+            statuses.update(part['statuses'].get(action, {}))
+        action_errors = sum(part['errors'].get(action, 0) for part in parts)
+        action_lock_errors = sum(part['lock_errors'].get(action, 0) for part in parts)
+        total += len(latencies)
+        errors += action_errors
+        lock_errors += action_lock_errors
+        endpoints.append({
+            'endpoint': action,
+            'requests': len(latencies),
+            'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1],
+            'error_rate': action_errors / len(latencies),
+            'lock_errors': action_lock_errors,
+            'statuses': dict(statuses),
+        })
+    return {
+        'users': concurrency,
+        'processes': processes,
+        'seconds': elapsed,
+        'requests': total,
+        'rps': total / elapsed,
+        'error_rate': errors / total if total else 0,
+        'lock_errors': lock_errors,
+        'lock_retries': sum(part['lock_retries'] for part in parts),
+        'endpoints': endpoints,
+    }
+
+
+def setup(args, directory):
+    """
+    임시 DB/MEDIA_ROOT에 데이터를 만들고, 가상 사용자들의 인증 정보를 준비
+     설정은 WSGI application을 만들기 전에 변경 (운영 환경과 같이 DEBUG=False)
+    """
+    os.environ['DJANGO_DB_PROFILE'] = args.profile
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['localhost']
+    settings.QUERY_BUDGET_MODE = 'off'
+    settings.ACCESS_TOKEN_LIFETIME = max(settings.ACCESS_TOKEN_LIFETIME, 24 * 60 * 60)
+    settings.MEDIA_ROOT = os.path.join(directory, 'media')
+    settings.DATABASES['default']['NAME'] = os.path.join(directory, 'db.sqlite3')
+    call_command('migrate', verbosity=0)
+    call_command('generate_dataset', stdout=io.StringIO(),
+                 **dataset_options(args.dataset_size, args.seed))
+
+    from django.test import Client
+    from PIL import Image
+    from rest_framework.authtoken.models import Token
+    from members.models import User
+    from members.tokens import make_access_token
+    from posts.management.commands.generate_dataset import ZipfSampler
+    from posts.models import HashTag, Post
+
+    users = []
+    for index, user in enumerate(User.objects.filter(username__startswith='bench-')):
+        auth = args.auth
+        if auth == 'mixed':
+            auth = ('session', 'token')[index % 2]
+        if auth == 'session':
+            client = Client()
+            client.force_login(user)
+            cookie = '; '.join([
+                f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}',
+                f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}',
+            ])
+            headers = {'HTTP_COOKIE': cookie}
+        elif auth == 'token':
+            token, _ = Token.objects.get_or_create(user=user)
+            headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        else:
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {make_access_token(user)}'}
+        users.append({'auth': auth, 'headers': headers})
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 640), (200, 120, 40)).save(buffer, 'JPEG')
+    rng = random.Random(args.seed)
+    post_pks = list(Post.objects.values_list('pk', flat=True))
+    rng.shuffle(post_pks)
+    tags = list(HashTag.objects.order_by('pk').values_list('name', flat=True))
+
+    from config.wsgi import application
+    _context.update({
+        'application': application,
+        'users': users,
+        'post_pks': post_pks,
+        'post_sampler': ZipfSampler(rng, len(post_pks), 0.7),
+        'tags': tags,
+        'tag_sampler': ZipfSampler(rng, len(tags), 1.1),
+        'photo': buffer.getvalue(),
+    })
+
+
+COLUMNS = ['users', 'endpoint', 'requests', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'error_rate',
+           'lock_errors']
+
+
+def print_stage(stage, file=sys.stderr):
+    print(
+        f"users={stage['users']} processes={stage['processes']} rps={stage['rps']:.1f} "
+        f"error_rate={stage['error_rate']:.3f} lock_errors={stage['lock_errors']} "
+        f"lock_retries={stage['lock_retries']}",
+        file=file,
+    )
+    print(''.join(f'{column:>13}' for column in COLUMNS), file=file)
+    for row in stage['endpoints']:
+        row = {'users': stage['users'], **row}
+        print(''.join(
+            f'{row[column]:>13.1f}' if isinstance(row[column], float) else f'{row[column]:>13}'
+            for column in COLUMNS
+        ), file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16],
+                        help='단계별 동시 가상 사용자 수')
+    parser.add_argument('--seconds', type=float, default=10, help='단계별 측정 시간(초)')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--think-time', type=float, default=0,
+                        help='가상 사용자의 요청 사이 평균 대기시간(초), 0이면 쉬지 않고 요청')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument('--auth', choices=['session', 'token', 'bearer', 'mixed'],
+                        default='session')
+    parser.add_argument('--profile', default='production',
+                        help='사용할 settings.DATABASE_PROFILES의 이름')
+    parser.add_argument('--dataset-size', type=int, default=1000, help='생성할 Post 수')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='결과 JSON파일 경로 (없다면 stdout)')
+    args = parser.parse_args(argv)
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    directory = tempfile.mkdtemp(prefix='loadtest-')
+    try:
+        setup(args, directory)
+        stages = []
+        for concurrency in args.users:
+            stages.append(run_stage(concurrency, args, args.mix))
+            print_stage(stages[-1])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    import sqlite3
+    report = {
+        'benchmark': 'loadtest',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'profile': args.profile,
+        'auth': args.auth,
+        'mix': args.mix,
+        'dataset_size': args.dataset_size,
+        'think_time': args.think_time,
+        'seed': args.seed,
+        'stages': stages,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+settings.DATABASE_PROFILES의 SQLite설정별 처리량 비교
+ 각 설정으로 임시 DB파일을 만들고, 여러 스레드가 동시에
+ 읽기(범위 SELECT)와 쓰기(UPDATE + INSERT 트랜잭션)를 섞어서 실행
+ 스레드의 작업 1번을 요청 1번으로 보고, 요청이 끝날 때마다
+ Django와 같이 close_if_unusable_or_obsolete()를 호출 (CONN_MAX_AGE 반영)
+
+실행 (app 디렉터리에서)
+ python -m benchmarks.sqlite_profiles --threads 8 --seconds 5 --write-ratio 0.2
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import django
+
+ROWS = 10000
+
+
+def setup_database(alias):
+    from django.db import connections
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE bench_item ('
+            'id INTEGER PRIMARY KEY, counter INTEGER NOT NULL, body TEXT NOT NULL)')
+        cursor.executemany(
+            'INSERT INTO bench_item (id, counter, body) VALUES (%s, 0, %s)',
+            [(pk, 'x' * 200) for pk in range(1, ROWS + 1)],
+        )
+    connections[alias].close()
+
+
+def worker(alias, deadline, write_ratio, stats):
+    from django.db import DatabaseError, connections, transaction
+    connection = connections[alias]
+    reads = writes = errors = 0
+    latencies = []
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            if random.random() < write_ratio:
+                with transaction.atomic(using=alias):
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            'UPDATE bench_item SET counter = counter + 1 WHERE id = %s',
+                            [random.randint(1, ROWS)],
+                        )
+                        cursor.execute(
+                            'INSERT INTO bench_item (counter, body) VALUES (0, %s)', ['y' * 200])
+                writes += 1
+            else:
+                start = random.randint(1, ROWS - 20)
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        'SELECT id, counter, body FROM bench_item WHERE id BETWEEN %s AND %s',
+                        [start, start + 20],
+                    )
+                    cursor.fetchall()
+                reads += 1
+        except DatabaseError:
+            errors += 1
+        latencies.append(time.monotonic() - started)
+        # 요청 종료
+        connection.close_if_unusable_or_obsolete()
+    connection.close()
+    with stats['lock']:
+        stats['reads'] += reads
+        stats['writes'] += writes
+        stats['errors'] += errors
+        stats['latencies'].extend(latencies)
+
+
+def run(profile, directory, threads, seconds, write_ratio):
+    from django.conf import settings
+    from django.db import connections
+
+    # 쿼리 기록/출력(DEBUG)에 드는 시간은 제외
+    settings.DEBUG = False
+    alias = f'benchmark_{profile}'
+    connections.databases[alias] = {
+        **settings.DATABASE_PROFILES[profile],
+        'NAME': os.path.join(directory, f'{profile}.sqlite3'),
+    }
+    setup_database(alias)
+
+    stats = {'lock': threading.Lock(), 'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+    deadline = time.monotonic() + seconds
+    workers = [
+        threading.Thread(target=worker, args=(alias, deadline, write_ratio, stats))
+        for _ in range(threads)
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    latencies = sorted(stats['latencies']) or [0]
+    return {
+        'profile': profile,
+        'ops/s': (stats['reads'] + stats['writes']) / seconds,
+        'reads/s': stats['reads'] / seconds,
+        'writes/s': stats['writes'] / seconds,
+        'errors': stats['errors'],
+        'p50 ms': latencies[len(latencies) // 2] * 1000,
+        'p99 ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument(
+        '--profiles', nargs='+', default=['development', 'production'])
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+    directory = tempfile.mkdtemp(prefix='sqlite-benchmark-')
+    try:
+        results = [
+            run(profile, directory, args.threads, args.seconds, args.write_ratio)
+            for profile in args.profiles
+        ]
+    finally:
+        shutil.rmtree(directory)
+
+    columns = ['profile', 'ops/s', 'reads/s', 'writes/s', 'errors', 'p50 ms', 'p99 ms']
+    print(f'threads={args.threads} seconds={args.seconds} write_ratio={args.write_ratio}')
+    print(''.join(f'{column:>14}' for column in columns))
+    for result in results:
+        print(''.join(
+            f'{result[column]:>14.1f}' if isinstance(result[column], float)
+            else f'{result[column]:>14}'
+            for column in columns
+        ))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+조건부 GET (ETag, Last-Modified)
+ 응답 본문을 만들기 전에 가벼운 쿼리로 validator를 계산하고
+ 요청의 If-None-Match/If-Modified-Since와 일치하면 Serializer를 거치지 않고 304로 응답
+ ETag는 weak(W/"...")이며 View가 돌려준 값(version, 카운터 등)과 함께
+  요청 경로(쿼리 포함), 협상된 media type, 요청한 사용자를 포함
+  (같은 URL이라도 형식과 사용자별 값(is_like)이 다르므로)
+"""
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(request, *parts):
+    key = repr((
+        request.get_full_path(),
+        request.accepted_media_type,
+        request.user.pk,
+        parts,
+    ))
+    return 'W/"{}"'.format(hashlib.md5(key.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    APIView의 GET요청에서 get_validators()로 (etag, last_modified)를 계산해서
+     요청의 조건과 일치하면 304로 응답하고
+     그렇지 않다면 기존 응답에 ETag, Last-Modified헤더를 추가
+    get_validators()는 Serializer를 거치지 않는 가벼운 쿼리로 구현하며
+     대상이 없는 경우(404)등 계산할 수 없다면 (None, None)을 리턴
+    """
+
+    def get_validators(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        if last_modified is not None:
+            last_modified = timegm(last_modified.utctimetuple())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        if etag is not None:
+            response.setdefault('ETag', etag)
+        if last_modified is not None:
+            response.setdefault('Last-Modified', http_date(last_modified))
+        return response
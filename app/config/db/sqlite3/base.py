@@ -0,0 +1,118 @@
+"""
+운영 환경용 SQLite backend (settings.DATABASE_PROFILES['production'])
+ django.db.backends.sqlite3에 다음 기능을 추가
+ - 연결할 때마다 settings_dict['PRAGMAS']의 PRAGMA를 실행 (WAL, synchronous, busy_timeout 등)
+ - settings_dict['TRANSACTION_MODE']로 트랜잭션 시작 방식을 지정 (ex. 'IMMEDIATE')
+   DEFERRED(기본값) 트랜잭션은 읽기 후 쓰기로 바뀔 때 잠금을 기다리지 않고 바로 실패하므로
+   IMMEDIATE로 시작해서 BEGIN에서 쓰기 잠금을 기다리도록 함
+ - 'database is locked'오류가 발생하면 LOCK_RETRIES번까지 간격을 늘려가며 다시 시도
+   (트랜잭션 밖의 단일 문장과 BEGIN만 다시 시도, 트랜잭션 중간의 문장은 그대로 오류를 발생시킴)
+ - settings_dict['HEALTH_CHECKS']가 True면 유지중인 연결(CONN_MAX_AGE)을
+   요청에서 처음 사용할 때 확인하고, 사용할 수 없다면 다시 연결
+"""
+import random
+import threading
+import time
+
+from django.db.backends.sqlite3 import base
+
+Database = base.Database
+
+
+def is_locked_error(e):
+    return 'database is locked' in str(e)
+
+
+class LockStats:
+    # 프로세스에서 잠금 때문에 다시 시도한 횟수 (benchmarks.loadtest에서 잠금 경합 측정에 사용)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+
+lock_stats = LockStats()
+
+
+class LockRetryMixin:
+    # 단일 문장이 잠금 때문에 실패하면 다시 시도
+    #  self.connection(sqlite3.Connection)이 트랜잭션 중이라면 다시 시도하지 않음
+    retries = 0
+    delay = 0
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(*args)
+            except Database.OperationalError as e:
+                if attempt >= self.retries or not is_locked_error(e) or \
+                        self.connection.in_transaction:
+                    raise
+            lock_stats.add_retry()
+            time.sleep(self.delay * 2 ** attempt * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+class SQLiteCursorWrapper(LockRetryMixin, base.SQLiteCursorWrapper):
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._retry(super().executemany, query, param_list)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # settings_dict에서 사용하는 추가 설정과 기본값
+    EXTRA_SETTINGS = {
+        'PRAGMAS': {},
+        'TRANSACTION_MODE': None,
+        'HEALTH_CHECKS': False,
+        'LOCK_RETRIES': 0,
+        'LOCK_RETRY_DELAY': 0.05,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for key, default in self.EXTRA_SETTINGS.items():
+            self.settings_dict.setdefault(key, default)
+        self.health_check_needed = False
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict['PRAGMAS'].items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.retries = self.settings_dict['LOCK_RETRIES']
+        cursor.delay = self.settings_dict['LOCK_RETRY_DELAY']
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['TRANSACTION_MODE']
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        # 요청 시작/종료시 호출됨, 유지하는 연결은 다음에 처음 사용할 때 확인
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None and self.settings_dict['HEALTH_CHECKS']:
+            self.health_check_needed = True
+
+    def ensure_connection(self):
+        if self.health_check_needed and self.connection is not None:
+            self.health_check_needed = False
+            if not self.in_atomic_block and not self.is_usable():
+                self.close()
+        super().ensure_connection()
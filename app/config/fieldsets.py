@@ -0,0 +1,121 @@
+"""
+API 응답의 필드 선택(?fields=)과 관계필드 확장(?expand=)
+ ?fields=pk,photo,created_at
+  나열한 필드만 응답에 포함 (없다면 Serializer의 모든 필드)
+ ?expand=author
+  Meta.expandable_fields중 나열한 필드만 중첩된 객체로 포함하고, 나머지는 pk(목록)로 대체
+  (없다면 모두 중첩된 객체로 포함, 파라미터가 없는 요청의 응답은 기존과 같음)
+ View는 요청한 필드(Fieldset)로 Serializer.optimize_queryset()을 호출해서
+  필요한 컬럼(only())과 JOIN(select_related), prefetch_related만 사용
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_names(value):
+    # 'a, b,,a' -> ['a', 'b']
+    return list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+
+
+class Fieldset:
+    """
+    한 요청에서 serializer_class의 응답에 포함할 필드와 확장할 관계필드
+     fields는 요청한 순서가 아닌 Serializer(Meta.fields)의 순서를 따름
+    """
+
+    def __init__(self, serializer_class, fields=None, expand=None):
+        meta = serializer_class.Meta
+        expandable = getattr(meta, 'expandable_fields', ())
+        self.serializer_class = serializer_class
+        self.fields = tuple(meta.fields if fields is None else (
+            name for name in meta.fields if name in fields
+        ))
+        self.expand = frozenset(expandable if expand is None else (
+            name for name in expandable if name in expand
+        ))
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        # 두 파라미터가 모두 없다면 None (Serializer의 기본 동작)
+        params = request.query_params
+        if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+            return None
+        meta = serializer_class.Meta
+        errors = {}
+        fields = expand = None
+        if FIELDS_PARAM in params:
+            fields = parse_names(params[FIELDS_PARAM])
+            unknown = [name for name in fields if name not in meta.fields]
+            if unknown:
+                errors[FIELDS_PARAM] = [f"알 수 없는 필드입니다: {', '.join(unknown)}"]
+        if EXPAND_PARAM in params:
+            expand = parse_names(params[EXPAND_PARAM])
+            expandable = getattr(meta, 'expandable_fields', ())
+            unknown = [name for name in expand if name not in expandable]
+            if unknown:
+                errors[EXPAND_PARAM] = [f"확장할 수 없는 필드입니다: {', '.join(unknown)}"]
+        if errors:
+            raise ValidationError(errors)
+        return cls(serializer_class, fields or None, expand)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def expanded(self, name):
+        return name in self.fields and name in self.expand
+
+
+class FieldsetSerializerMixin:
+    """
+    context['fieldset']이 이 Serializer에 대한 Fieldset이라면
+     요청하지 않은 필드는 제외하고, 확장하지 않은 관계필드는 PrimaryKeyRelatedField로 대체
+    중첩된 Serializer는 같은 context를 공유하므로 Fieldset.serializer_class로 구분
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None or fieldset.serializer_class is not type(self):
+            return fields
+        ret = type(fields)()
+        for name in fieldset.fields:
+            field = fields[name]
+            if name in getattr(self.Meta, 'expandable_fields', ()) \
+                    and not fieldset.expanded(name):
+                field = serializers.PrimaryKeyRelatedField(
+                    source=field.source,
+                    read_only=True,
+                    many=isinstance(field, serializers.ListSerializer),
+                )
+            ret[name] = field
+        return ret
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fieldset):
+        # 기본값: 요청한 필드의 컬럼만 가져옴
+        return queryset.only('pk', *fieldset.fields)
+
+
+class FieldsetMixin:
+    # GenericAPIView에서 GET요청의 Fieldset으로 queryset과 Serializer를 구성
+    def get_fieldset(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = Fieldset.from_request(self.request, self.get_serializer_class())
+        return self._fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            queryset = self.get_serializer_class().optimize_queryset(queryset, fieldset)
+        return queryset
@@ -1,3 +1,8 @@
+from django.conf import settings
+
+from . import routers
+
+
 class CORSMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -5,4 +10,29 @@ class CORSMiddleware:
     def __call__(self, request):
         response = self.get_response(request)
         response['Access-Control-Allow-Origin'] = 'http://localhost:3000'
-        return response
\ No newline at end of file
+        return response
+
+
+class ReplicaStickinessMiddleware:
+    """
+    config.routers.ReplicaRouter를 사용할 때 요청 단위의 primary 고정을 처리
+     - GET/HEAD/OPTIONS가 아닌 요청은 처음부터 primary에서 읽음
+     - 쓰기를 실행한 요청의 응답에는 DATABASE_REPLICA_STICKY_SECONDS초 후의 시간을 cookie로 기록하고
+       (세션 cookie나 Authorization헤더가 있다면 캐시에도 기록)
+       그 시간 전에 들어오는 같은 클라이언트(세션)의 요청은 primary에서 읽음
+       (replica에 복사되기 전에도 방금 작성한 Post, 좋아요 등이 보이도록)
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset()
+        if routers.should_pin(request):
+            routers.pin_to_primary()
+        try:
+            response = self.get_response(request)
+            if routers.written() and settings.DATABASE_REPLICAS:
+                routers.mark_sticky(request, response)
+            return response
+        finally:
+            routers.reset()
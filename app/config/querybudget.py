@@ -0,0 +1,274 @@
+"""
+요청(view/API endpoint)별 SQL 실행량 측정과 예산(budget) 검사
+ DEBUG 로깅(django.db)대신 connection.execute_wrapper()로 요청에서 실행된 쿼리를 기록
+  - 쿼리 수, 전체 SQL 실행시간
+  - 같은 SQL과 인자로 두 번 이상 실행된 쿼리 (duplicate)
+  - 인자만 바뀌며 반복된 같은 형태의 쿼리 (N+1, repeat)
+ endpoint별 예산(settings.QUERY_BUDGETS)을 넘으면 QUERY_BUDGET_MODE에 따라
+  'log'는 경고 로그를 남기고, 'raise'는 QueryBudgetExceeded를 발생 (테스트에서 사용)
+ 운영환경에서는 QUERY_BUDGET_SAMPLE_RATE 비율의 요청만 측정하며
+  측정하지 않는 요청에는 execute_wrapper를 설치하지 않음
+ endpoint별 누적 통계는 QUERY_BUDGET_REPORT_INTERVAL번째 측정마다
+  'config.querybudget' 로거로 상위 endpoint목록(report())을 출력
+  프로세스 종료시에는 QUERY_BUDGET_REPORT_AT_EXIT인 경우에만,
+  테스트에서는 QueryBudgetTestRunner가 verbosity 2이상일 때 출력
+"""
+import atexit
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger(__name__)
+
+# 트랜잭션 제어문은 쿼리 수에는 포함하지만 duplicate/repeat 검사에서는 제외
+CONTROL_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK', 'BEGIN', 'COMMIT')
+IN_PLACEHOLDERS = re.compile(r'\((?:%s, )+%s\)')
+VALUES_GROUPS = re.compile(r'\(\.\.\.\)(?:, \(\.\.\.\))+')
+WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def signature(sql):
+    # 인자 개수만 다른 쿼리(IN (%s, %s, ...), bulk insert의 VALUES목록)를 같은 형태로 취급
+    sql = WHITESPACE.sub(' ', sql.strip())
+    sql = IN_PLACEHOLDERS.sub('(...)', sql)
+    return VALUES_GROUPS.sub('(...)', sql)
+
+
+class QueryRecorder:
+    """
+    execute_wrapper로 설치해서 실행된 쿼리를 기록
+     with recorder.record(): 블록 안에서 모든 DB alias(default, replica)의 쿼리를 기록
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # {signature: 실행 횟수}
+        self.signatures = Counter()
+        # {(signature, params): 실행 횟수}
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            if not sql.lstrip().upper().startswith(CONTROL_STATEMENTS):
+                sig = signature(sql)
+                self.signatures[sig] += 1
+                try:
+                    self.executions[(sig, repr(params))] += 1
+                except TypeError:
+                    pass
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def duplicates(self):
+        # 같은 SQL, 같은 인자로 다시 실행된 횟수의 합
+        return sum(count - 1 for count in self.executions.values() if count > 1)
+
+    @property
+    def max_repeats(self):
+        # 한 형태의 쿼리가 가장 많이 실행된 횟수 (N+1이면 목록의 길이만큼 커짐)
+        return max(self.signatures.values(), default=0)
+
+    def most_repeated(self, n=3):
+        return [(sig, count) for sig, count in self.signatures.most_common(n) if count > 1]
+
+
+def get_budget(endpoint):
+    budget = dict(settings.QUERY_BUDGET_DEFAULT)
+    budget.update(settings.QUERY_BUDGETS.get(endpoint, {}))
+    return budget
+
+
+def check_budget(budget, recorder):
+    # 예산을 넘은 항목의 설명 목록을 리턴
+    violations = []
+    if budget.get('queries') is not None and recorder.count > budget['queries']:
+        violations.append(f"queries {recorder.count} > {budget['queries']}")
+    duration_ms = recorder.duration * 1000
+    if budget.get('time_ms') is not None and duration_ms > budget['time_ms']:
+        violations.append(f"sql time {duration_ms:.1f}ms > {budget['time_ms']}ms")
+    if budget.get('duplicates') is not None and recorder.duplicates > budget['duplicates']:
+        violations.append(f"duplicates {recorder.duplicates} > {budget['duplicates']}")
+    if budget.get('repeats') is not None and recorder.max_repeats > budget['repeats']:
+        violations.append(f"repeated query {recorder.max_repeats} > {budget['repeats']}")
+    return violations
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.duration = 0.0
+        self.max_queries = 0
+        self.violations = 0
+        self.signatures = Counter()
+
+
+class QueryStats:
+    """
+    endpoint별 측정 결과의 프로세스 단위 누적값
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._recorded = 0
+
+    def add(self, endpoint, recorder, violations):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.queries += recorder.count
+            stats.duration += recorder.duration
+            stats.max_queries = max(stats.max_queries, recorder.count)
+            stats.violations += bool(violations)
+            stats.signatures.update({
+                sig: count for sig, count in recorder.signatures.items() if count > 1
+            })
+            self._recorded += 1
+            return self._recorded
+
+    def report(self, limit=10):
+        """
+        SQL 실행시간 합계가 큰 순서로 endpoint별 요약을 리턴
+         [{'endpoint', 'requests', 'avg_queries', 'max_queries', 'avg_time_ms',
+           'total_time_ms', 'violations', 'top_repeated': [(signature, count), ...]}, ...]
+        """
+        with self._lock:
+            items = sorted(
+                self._endpoints.items(),
+                key=lambda item: (item[1].violations, item[1].duration),
+                reverse=True,
+            )[:limit]
+            return [{
+                'endpoint': endpoint,
+                'requests': stats.requests,
+                'avg_queries': stats.queries / stats.requests,
+                'max_queries': stats.max_queries,
+                'avg_time_ms': stats.duration * 1000 / stats.requests,
+                'total_time_ms': stats.duration * 1000,
+                'violations': stats.violations,
+                'top_repeated': stats.signatures.most_common(3),
+            } for endpoint, stats in items]
+
+    def format_report(self, limit=10):
+        lines = ['SQL per endpoint (violations, total sql time)']
+        for row in self.report(limit):
+            lines.append(
+                '{endpoint}: {requests} req, {avg_queries:.1f} avg / {max_queries} max queries, '
+                '{avg_time_ms:.1f}ms avg sql, {violations} over budget'.format(**row)
+            )
+            for sig, count in row['top_repeated']:
+                lines.append(f'    x{count} {sig[:200]}')
+        return '\n'.join(lines)
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._recorded = 0
+
+
+query_stats = QueryStats()
+
+
+def log_report():
+    if query_stats.report(1):
+        logger.info(query_stats.format_report())
+
+
+def register_exit_report():
+    # 여러 번 호출해도 한 번만 등록
+    atexit.unregister(log_report)
+    atexit.register(log_report)
+
+
+def endpoint_name(request):
+    # URL name(namespace 포함)이 없다면 view의 경로를 사용
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return request.path
+    if match.url_name:
+        return match.view_name
+    func = getattr(match.func, 'view_class', match.func)
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+class QueryBudgetMiddleware:
+    """
+    요청에서 실행된 SQL을 측정하고 endpoint별 예산(settings.QUERY_BUDGETS)과 비교
+     DEBUG일 때는 응답에 Server-Timing 헤더로 쿼리 수와 SQL 실행시간을 기록
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if settings.QUERY_BUDGET_REPORT_AT_EXIT:
+            register_exit_report()
+
+    def __call__(self, request):
+        mode = settings.QUERY_BUDGET_MODE
+        if mode == 'off' or random.random() >= settings.QUERY_BUDGET_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+
+        endpoint = endpoint_name(request)
+        violations = check_budget(get_budget(endpoint), recorder)
+        recorded = query_stats.add(endpoint, recorder, violations)
+        interval = settings.QUERY_BUDGET_REPORT_INTERVAL
+        if interval and recorded % interval == 0:
+            log_report()
+        if settings.DEBUG:
+            response['Server-Timing'] = \
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"'
+
+        if violations:
+            message = '{} {}: {}{}'.format(
+                request.method, endpoint, ', '.join(violations), ''.join(
+                    f'\n    x{count} {sig[:200]}' for sig, count in recorder.most_repeated()
+                ),
+            )
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning('Query budget exceeded: %s', message)
+        return response
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    # 테스트에서는 모든 요청을 측정하고, 예산을 넘으면 해당 테스트를 실패시킴
+    #  endpoint별 요약은 verbosity 2이상(-v 2)일 때만 테스트가 끝난 후 출력
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_MODE = 'raise'
+        settings.QUERY_BUDGET_SAMPLE_RATE = 1.0
+        settings.QUERY_BUDGET_REPORT_AT_EXIT = False
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        if self.verbosity >= 2:
+            log_report()
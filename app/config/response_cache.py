@@ -0,0 +1,176 @@
+"""
+비로그인 사용자의 GET응답 캐시
+ 모든 비로그인 사용자에게 같은 응답을 돌려주는 View에 사용
+ (posts.views.post_list, tag_post_list, posts.apis.PostList)
+ 키: scheme, host, 경로(쿼리 포함), 응답 형식(DRF의 media type)
+ 무효화: View가 의존하는 세대(generation) 카운터들의 값을 응답과 함께 저장하고
+  쓰기가 커밋되면 bump_generations()로 카운터를 증가시켜 저장된 응답을 오래된 것으로 만듦
+  (어떤 페이지가 영향을 받는지 찾아서 지우지 않아도 됨)
+ stampede 방지 (stale-while-revalidate)
+  오래된 응답(세대 변경 또는 RESPONSE_CACHE_TIMEOUT 경과)은 cache.add()로 잠금을 얻은 요청 하나만
+  다시 만들고, 그동안 다른 요청에는 RESPONSE_CACHE_STALE_TIMEOUT이내라면 이전 응답을 사용
+  저장된 응답이 없다면 잠금을 얻지 못한 요청은 RESPONSE_CACHE_WAIT초까지 만들어진 응답을 기다림
+ 캐시 backend가 프로세스별(LocMemCache)이라면 다른 프로세스의 쓰기는 반영되지 않으므로
+  RESPONSE_CACHE_TIMEOUT이내에 반영됨
+"""
+import hashlib
+import time
+from functools import partial, wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+KEY_PREFIX = 'response-cache'
+# 캐시에 저장된 응답을 다시 만드는 중인지 확인하는 간격
+WAIT_INTERVAL = 0.05
+
+
+def generation_key(name):
+    return f'{KEY_PREFIX}:generation:{name}'
+
+
+def new_generation():
+    # 카운터가 캐시에서 삭제된 후 다시 만들어질 때 이전 값과 겹치지 않도록 현재 시간을 사용
+    return int(time.time() * 1000000)
+
+
+def get_generations(names):
+    keys = [generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, new_generation(), None)
+            values[key] = cache.get(key)
+    return tuple(values[key] for key in keys)
+
+
+def _bump(names):
+    for name in names:
+        key = generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, new_generation(), None)
+
+
+def bump_generations(*names):
+    # 트랜잭션이 커밋된 후 증가 (커밋 전의 데이터로 다시 만든 응답이 새 세대로 저장되지 않도록)
+    #  트랜잭션 밖(autocommit)에서는 바로 증가하므로 쓰기를 마친 후에 호출
+    transaction.on_commit(partial(_bump, names))
+
+
+def is_cacheable(request):
+    # 비로그인 사용자의 GET/HEAD요청, 표시할 메시지(django.contrib.messages)가 없는 경우
+    return settings.RESPONSE_CACHE_ENABLED \
+        and request.method in ('GET', 'HEAD') \
+        and not request.user.is_authenticated \
+        and not len(get_messages(request))
+
+
+def response_key(request):
+    key = repr((request.build_absolute_uri(), getattr(request, 'accepted_media_type', None)))
+    return f'{KEY_PREFIX}:{hashlib.md5(key.encode()).hexdigest()}'
+
+
+def to_entry(response, generations):
+    return {
+        'generations': generations,
+        'created': time.time(),
+        'status': response.status_code,
+        'headers': list(response.items()),
+        'content': response.content,
+    }
+
+
+def from_entry(request, entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers']:
+        response[name] = value
+    # 저장된 ETag/Last-Modified로 조건부 GET 처리 (config.conditional)
+    last_modified = response.get('Last-Modified')
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=last_modified and parse_http_date_safe(last_modified),
+        response=response,
+    )
+
+
+def when_rendered(response, callback):
+    # DRF Response등 아직 렌더링되지 않은 응답은 렌더링된 후 callback을 실행
+    if getattr(response, 'is_rendered', True):
+        callback(response)
+    else:
+        response.add_post_render_callback(callback)
+
+
+def cached_response(request, generation_names, get_response):
+    """
+    request에 대해 저장된 응답을 리턴하거나, get_response()로 만들어서 저장
+     generation_names중 하나라도 증가했다면 저장된 응답을 다시 만듦
+    """
+    key = response_key(request)
+    lock_key = f'{key}:lock'
+    generations = get_generations(generation_names)
+    entry = cache.get(key)
+    if entry is not None and entry['generations'] == generations \
+            and time.time() - entry['created'] < settings.RESPONSE_CACHE_TIMEOUT:
+        return from_entry(request, entry)
+
+    if not cache.add(lock_key, 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+        # 다른 요청이 다시 만드는 중
+        if entry is not None:
+            return from_entry(request, entry)
+        deadline = time.monotonic() + settings.RESPONSE_CACHE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return from_entry(request, entry)
+        # 기다려도 만들어지지 않았다면 직접 만들되 저장하지 않음
+        return get_response()
+
+    def store(response):
+        try:
+            if response.status_code == 200 and not response.cookies:
+                cache.set(key, to_entry(response, generations),
+                          settings.RESPONSE_CACHE_STALE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+
+    try:
+        response = get_response()
+    except Exception:
+        cache.delete(lock_key)
+        raise
+    when_rendered(response, store)
+    return response
+
+
+def cache_anonymous_response(*generation_names):
+    # 함수 View의 비로그인 사용자 응답을 캐시
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+            return cached_response(
+                request, generation_names, partial(view, request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+class AnonymousResponseCacheMixin:
+    # APIView의 비로그인 사용자 GET응답을 캐시, response_cache_generations에 의존하는 세대 카운터를 지정
+    response_cache_generations = ()
+
+    def get(self, request, *args, **kwargs):
+        get_response = partial(super().get, request, *args, **kwargs)
+        if not is_cacheable(request):
+            return get_response()
+        return cached_response(request, self.response_cache_generations, get_response)
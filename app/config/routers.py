@@ -0,0 +1,120 @@
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def pinned_to_primary():
+    return getattr(_state, 'pinned', False)
+
+
+def written():
+    return getattr(_state, 'written', False)
+
+
+def reset():
+    _state.pinned = False
+    _state.written = False
+
+
+def pin_to_primary():
+    _state.pinned = True
+
+
+@contextmanager
+def use_primary():
+    # with블록 안에서 현재 스레드의 모든 읽기를 primary(default)에서 실행
+    previous = pinned_to_primary()
+    _state.pinned = True
+    try:
+        yield
+    finally:
+        _state.pinned = previous
+
+
+class ReplicaRouter:
+    """
+    읽기는 settings.DATABASE_REPLICAS중 하나, 쓰기는 primary(default)로 보내는 router
+     다음의 경우에는 읽기도 primary에서 실행 (read-your-writes)
+     - 같은 스레드(요청)에서 이미 쓰기를 실행했거나 pin_to_primary/use_primary로 고정한 경우
+     - primary의 트랜잭션(atomic) 안에서 읽는 경우
+     - 이미 primary에서 가져온 인스턴스와 연결된 객체를 읽는 경우
+     - settings.DATABASE_PRIMARY_ONLY_APPS의 모델 (세션, 토큰 등 방금 생성된 값으로 인증하는 경우)
+    요청 사이의 고정은 config.middleware.ReplicaStickinessMiddleware에서 처리
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return None
+        if model._meta.app_label in settings.DATABASE_PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == DEFAULT_DB_ALIAS:
+            return DEFAULT_DB_ALIAS
+        if pinned_to_primary() or written() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.written = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 모든 replica는 primary의 복사본이므로 서로 연결할 수 있음
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # migration은 primary에만 실행, replica에는 primary의 내용이 복사됨
+        return db not in settings.DATABASE_REPLICAS
+
+
+def sticky_until(request):
+    # 요청의 cookie에 기록된, primary에서 읽어야 하는 시간(timestamp)
+    try:
+        return float(request.COOKIES.get(settings.DATABASE_REPLICA_STICKY_COOKIE, 0))
+    except ValueError:
+        return 0
+
+
+def client_cache_key(request):
+    # cookie를 유지하지 않는 API클라이언트도 구분할 수 있도록
+    #  세션 cookie 또는 Authorization헤더로 만든 캐시 키, 둘 다 없다면 None
+    identity = request.COOKIES.get(settings.SESSION_COOKIE_NAME) or \
+        request.META.get('HTTP_AUTHORIZATION')
+    if not identity:
+        return None
+    return 'db-primary:' + hashlib.sha256(identity.encode()).hexdigest()
+
+
+def should_pin(request):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return True
+    if sticky_until(request) > time.time():
+        return True
+    key = client_cache_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def mark_sticky(request, response):
+    # 쓰기를 실행한 클라이언트의 이후 요청을 DATABASE_REPLICA_STICKY_SECONDS초동안 primary로 고정
+    seconds = settings.DATABASE_REPLICA_STICKY_SECONDS
+    response.set_cookie(
+        settings.DATABASE_REPLICA_STICKY_COOKIE,
+        str(time.time() + seconds),
+        max_age=seconds,
+        httponly=True,
+    )
+    key = client_cache_key(request)
+    if key is not None:
+        cache.set(key, 1, seconds)
@@ -24,6 +24,15 @@ MEDIA_ROOT = os.path.join(ROOT_DIR, '.media')
 #  FileField, MediaField의 URL이 아래 설정 기준으로 바뀜
 MEDIA_URL = '/media/'
 STATIC_URL = '/static/'
+# 업로드된 파일 응답의 Cache-Control max-age(초) (config.views.serve_media)
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 30
+# 파일 내용을 웹서버가 직접 보내도록 할 때 사용
+#  None: Django가 직접 파일을 읽어서 응답
+#  'x-sendfile': Apache(mod_xsendfile), lighttpd 등에 X-Sendfile헤더로 파일 경로 전달
+#  'x-accel-redirect': nginx에 X-Accel-Redirect헤더로
+#                      MEDIA_ACCEL_REDIRECT_PREFIX + <파일 경로>를 전달 (internal location)
+MEDIA_SENDFILE_BACKEND = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
 
 # 정적파일을 검색할 경로 목록
 STATICFILES_DIRS = [
@@ -35,6 +44,12 @@ STATICFILES_DIRS = [
 secrets = json.load(open(os.path.join(SECRETS_DIR, 'base.json')))
 FACEBOOK_APP_ID = secrets['FACEBOOK_APP_ID']
 FACEBOOK_APP_SECRET = secrets['FACEBOOK_APP_SECRET']
+# 페이스북 Graph API (members.backends.FacebookBackend)
+FACEBOOK_GRAPH_API_BASE = 'https://graph.facebook.com/v3.2'
+#  (연결, 응답) timeout(초)
+FACEBOOK_GRAPH_TIMEOUT = (3.05, 10)
+#  Graph API와 유지할 최대 연결 수
+FACEBOOK_GRAPH_POOL_SIZE = 10
 
 # login_required 데코레이터에 의해
 # 로그인 페이지로 이동해야 할 때,
@@ -46,6 +61,76 @@ AUTHENTICATION_BACKENDS = [
     'members.backends.FacebookBackend',
 ]
 
+# 홈 타임라인 (posts.models.TimelineEntry)
+#  사용자별 타임라인에 보관할 최대 Post 수
+TIMELINE_MAX_LENGTH = 800
+#  타임라인 길이를 검사하는 빈도 (Post가 추가될 때 N번에 1번꼴로 검사)
+TIMELINE_TRIM_INTERVAL = 50
+#  Post 작성시 한 번의 INSERT로 추가할 팔로워 수
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+#  팔로우시 타임라인에 채워넣을 상대방의 최근 Post 수
+TIMELINE_FOLLOW_BACKFILL = 20
+#  팔로워가 이 수 이상인 사용자의 Post는 fan-out하지 않고 읽을 때 합침
+TIMELINE_CELEBRITY_FOLLOWER_COUNT = 10000
+#  /posts/feed/ 페이지에 보여줄 Post 수
+TIMELINE_PAGE_SIZE = 30
+
+# 요청과 별도로 실행할 작업(config.tasks)의 worker 스레드 수
+BACKGROUND_TASK_WORKERS = 2
+#  True면 worker pool을 사용하지 않고 트랜잭션 커밋 직후 바로 실행 (테스트용)
+BACKGROUND_TASKS_EAGER = False
+
+# 업로드할 수 있는 Post사진의 최대 크기(byte), 최대 픽셀 수(가로x세로), 형식 (posts.uploads)
+POST_PHOTO_MAX_UPLOAD_SIZE = 20 * 2 ** 20
+POST_PHOTO_MAX_PIXELS = 50 * 10 ** 6
+POST_PHOTO_FORMATS = ['JPEG', 'PNG', 'GIF', 'WEBP']
+
+# Post사진을 줄여서 저장할 너비 목록과 JPEG 품질 (posts.renditions)
+POST_PHOTO_RENDITION_WIDTHS = [320, 640, 1080]
+POST_PHOTO_RENDITION_QUALITY = 85
+
+# post_list.html의 Post카드 조각을 캐시할 시간(초)
+#  캐시 키에 Post.version이 포함되므로 좋아요/댓글/수정시에는 바로 새 조각이 사용됨
+POST_CARD_CACHE_TIMEOUT = 60 * 60
+
+# 비로그인 사용자의 응답 캐시 (config.response_cache)
+#  post_list, tag_post_list, api PostList의 응답을 RESPONSE_CACHE_TIMEOUT초동안 사용하고
+#  Post/댓글/좋아요의 쓰기가 커밋되면 다시 만듦
+#  다시 만드는 동안 다른 요청에는 RESPONSE_CACHE_STALE_TIMEOUT초까지 이전 응답을 사용
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_TIMEOUT = 30
+RESPONSE_CACHE_STALE_TIMEOUT = 60 * 5
+# 다시 만드는 요청의 잠금 유지시간, 저장된 응답이 없을 때 다른 요청이 기다리는 최대 시간(초)
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+RESPONSE_CACHE_WAIT = 2
+
+# 좋아요 쓰기 지연(write-behind) 버퍼 (posts.like_buffer)
+#  True면 좋아요/좋아요 취소를 프로세스별 버퍼에 모아두었다가
+#  POST_LIKE_BUFFER_FLUSH_INTERVAL초마다, 또는 POST_LIKE_BUFFER_MAX_SIZE개가 쌓이면 한 번에 DB에 기록
+POST_LIKE_BUFFER_ENABLED = False
+POST_LIKE_BUFFER_FLUSH_INTERVAL = 1
+POST_LIKE_BUFFER_MAX_SIZE = 1000
+#  버퍼에 추가하기 전에 기록하는 journal 파일의 위치
+#  비정상 종료된 프로세스의 journal은 다른 프로세스가 시작할 때 DB에 다시 적용
+POST_LIKE_BUFFER_JOURNAL_DIR = os.path.join(ROOT_DIR, '.like-journal')
+
+# 태그 페이지(posts.views.tag_post_list)에서 한 번에 보여줄 Post 수
+TAG_POST_PAGE_SIZE = 24
+
+# 댓글 저장시 사용하는 {태그명: pk} 캐시의 최대 크기 (posts.models.HashTagManager)
+HASHTAG_PK_CACHE_SIZE = 10000
+
+# 해시태그 자동완성 (posts.autocomplete)
+#  기본 결과 수와 ?limit=으로 요청할 수 있는 최대 결과 수
+HASHTAG_AUTOCOMPLETE_LIMIT = 10
+HASHTAG_AUTOCOMPLETE_MAX_LIMIT = 30
+#  새로 생긴 HashTag를 인덱스에 추가하는 주기(초)
+HASHTAG_AUTOCOMPLETE_REFRESH_INTERVAL = 5
+#  사용 횟수를 갱신하기 위해 인덱스 전체를 다시 읽는 주기(초)
+HASHTAG_AUTOCOMPLETE_RELOAD_INTERVAL = 600
+#  접두어별 검색 결과를 캐시할 최대 개수
+HASHTAG_AUTOCOMPLETE_CACHE_SIZE = 10000
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.1/howto/deployment/checklist/
 
@@ -84,8 +169,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 요청별 쿼리 수/SQL 실행시간 측정과 endpoint별 예산 검사 (config.querybudget)
+    'config.querybudget.QueryBudgetMiddleware',
     # django-cors-headers 라이브러리를 사용해보기
     'config.middleware.CORSMiddleware',
+    # 쓰기를 실행한 요청/클라이언트의 읽기를 primary DB로 고정 (config.routers)
+    'config.middleware.ReplicaStickinessMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -125,10 +214,98 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# 환경변수 DJANGO_DB_PROFILE로 DATABASE_PROFILES중 사용할 설정을 선택 (기본값: development)
+DATABASE_PROFILES = {
+    'development': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    },
+    # 여러 worker/스레드가 동시에 읽고 쓰는 운영 환경용 설정 (config.db.sqlite3)
+    'production': {
+        'ENGINE': 'config.db.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # 요청마다 다시 연결하지 않고 연결을 유지(초), 처음 사용할 때 연결 상태를 확인
+        'CONN_MAX_AGE': 600,
+        'HEALTH_CHECKS': True,
+        'PRAGMAS': {
+            # 읽기와 쓰기가 서로를 막지 않도록 WAL모드 사용
+            'journal_mode': 'wal',
+            # WAL모드에서는 checkpoint때만 fsync해도 DB가 손상되지 않음
+            'synchronous': 'normal',
+            # 다른 연결이 쓰기 잠금을 가지고 있다면 최대 5초동안 기다림
+            'busy_timeout': 5000,
+            # DB파일을 256MB까지 메모리에 매핑해서 읽음
+            'mmap_size': 256 * 2 ** 20,
+            # 연결별 page cache 64MB (음수는 KiB단위)
+            'cache_size': -64 * 2 ** 10,
+            'temp_store': 'memory',
+        },
+        # 쓰기 트랜잭션은 BEGIN에서 잠금을 기다리도록 IMMEDIATE로 시작
+        'TRANSACTION_MODE': 'IMMEDIATE',
+        # 'database is locked'오류시 최대 5번, 0.05초부터 2배씩 늘려가며 다시 시도
+        'LOCK_RETRIES': 5,
+        'LOCK_RETRY_DELAY': 0.05,
+    },
+}
+DATABASE_PROFILE = os.environ.get('DJANGO_DB_PROFILE', 'development')
+DATABASES = {
+    'default': DATABASE_PROFILES[DATABASE_PROFILE],
+}
+# 읽기 전용 replica DB (config.routers.ReplicaRouter)
+#  환경변수 DJANGO_DB_REPLICAS에 ','로 구분한 SQLite파일 경로를 지정하면 replica1, replica2, ...로 추가
+#  (primary의 내용은 litestream, sqlite3 .backup등으로 별도로 복사)
+#  테스트에서는 default의 테스트 DB를 그대로 사용 (MIRROR)
+DATABASE_REPLICAS = []
+for index, name in enumerate(filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_ROUTERS = [
+    'config.routers.ReplicaRouter',
+]
+# 쓰기를 실행한 클라이언트는 이 시간(초)동안 replica대신 primary에서 읽음
+DATABASE_REPLICA_STICKY_SECONDS = 5
+DATABASE_REPLICA_STICKY_COOKIE = 'db_primary_until'
+# replica를 사용하지 않고 항상 primary에서 읽는 app (방금 생성된 세션/토큰으로 인증하는 경우)
+DATABASE_PRIMARY_ONLY_APPS = ['sessions', 'authtoken']
+
+# Django REST framework
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        # 서명된 access token으로 인증, User는 프로세스별로 캐시 (members.tokens)
+        #  첫 번째 인증 클래스의 WWW-Authenticate(Bearer)를 사용하므로
+        #  인증되지 않은 요청은 403이 아닌 401로 응답
+        'members.authentication.AccessTokenAuthentication',
+        # Token인증 결과를 프로세스별로 캐시 (members.authentication)
+        'members.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ),
+}
+# CachedTokenAuthentication에서 캐시할 최대 토큰 수, 캐시할 시간(초)
+#  다른 프로세스에서 삭제한 토큰이나 비활성화한 사용자는 최대 이 시간만큼 늦게 반영됨
+API_TOKEN_CACHE_SIZE = 10000
+API_TOKEN_CACHE_TIMEOUT = 60
+# 서명된 access token의 유효시간(초), 만료되기 전에는 폐기할 수 없으므로 짧게 유지
+ACCESS_TOKEN_LIFETIME = 5 * 60
+# access token을 다시 발급받을 때 사용하는 refresh token의 유효시간(초)
+REFRESH_TOKEN_LIFETIME = 60 * 60 * 24 * 14
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'instagram',
+        # Post카드 조각 캐시는 Post마다 2개씩 저장되므로 기본값(300)보다 크게 설정
+        #  (가득 차면 1/3을 비우므로 렌더링 도중 다른 Post의 조각이 삭제됨)
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -167,6 +344,8 @@ USE_TZ = True
 
 LOGGING = {
     'version': 1,
+    # 기본값(True)은 이미 생성된 django.request등의 로거를 비활성화해서 500오류가 기록되지 않음
+    'disable_existing_loggers': False,
     'formatters': {
         'default': {
             'format': '[%(levelname)s] %(name)s (%(asctime)s)\n\t%(message)s'
@@ -179,12 +358,46 @@ LOGGING = {
         },
     },
     'loggers': {
-        'django.db': {
+        # 쿼리별 DEBUG 로그(django.db)대신 요청별 측정값과 예산 초과만 기록
+        'config.querybudget': {
             'handlers': [
                 'console',
             ],
-            'level': 'DEBUG',
+            'level': 'INFO',
             'propagate': True,
         },
     }
-}
\ No newline at end of file
+}
+
+# 요청별 SQL 예산 (config.querybudget)
+#  'log': 예산을 넘으면 경고 로그, 'raise': QueryBudgetExceeded 발생, 'off': 측정하지 않음
+#  테스트(QueryBudgetTestRunner)에서는 'raise'로 모든 요청을 측정
+TEST_RUNNER = 'config.querybudget.QueryBudgetTestRunner'
+QUERY_BUDGET_MODE = 'log'
+# 측정할 요청의 비율
+QUERY_BUDGET_SAMPLE_RATE = 1.0 if DEBUG else 0.05
+# 측정한 요청 n개마다 endpoint별 요약을 로그로 출력 (0이면 출력하지 않음)
+QUERY_BUDGET_REPORT_INTERVAL = 1000
+# 프로세스 종료시에도 요약을 출력 (서버 프로세스에서만 켬, 관리 명령/테스트마다 출력되지 않도록)
+QUERY_BUDGET_REPORT_AT_EXIT = False
+# 모든 endpoint의 기본 예산
+#  queries: 쿼리 수, time_ms: SQL 실행시간 합계,
+#  duplicates: 같은 SQL/인자로 다시 실행된 횟수, repeats: 같은 형태의 쿼리가 실행된 횟수 (N+1)
+QUERY_BUDGET_DEFAULT = {
+    'queries': 30,
+    'time_ms': 500,
+    'duplicates': 2,
+    'repeats': 5,
+}
+# endpoint(URL name 또는 view 경로)별 예산, 지정하지 않은 항목은 기본값을 사용
+#  목록은 Post 수와 관계없이 일정한 수의 쿼리로 처리해야 하므로 같은 형태의 쿼리 반복을 허용하지 않음
+QUERY_BUDGETS = {
+    'posts:post-list': {'queries': 8, 'repeats': 1},
+    'posts:feed': {'queries': 8, 'repeats': 1},
+    'tag-post-list': {'queries': 6, 'repeats': 1},
+    # 조건부 GET의 validator(Post, 댓글 작성자) 조회 2번 포함 (config.conditional)
+    'api:posts:post-list': {'queries': 10, 'repeats': 1},
+    'api:posts:post-detail': {'queries': 8, 'repeats': 1},
+    'api:posts:feed': {'queries': 8, 'repeats': 1},
+    'api:posts:tag-post-list': {'queries': 6, 'repeats': 1},
+}
@@ -0,0 +1,53 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # 프로세스별로 하나의 worker pool을 처음 사용할 때 생성
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASK_WORKERS,
+                thread_name_prefix='background-task',
+            )
+        return _executor
+
+
+def run_task(func, *args, **kwargs):
+    try:
+        # 방금 커밋된 내용을 읽을 수 있도록 replica대신 primary DB에서 읽음
+        with use_primary():
+            return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', func.__name__)
+    finally:
+        # worker 스레드에서 연 DB연결은 작업이 끝나면 닫음
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """
+    요청을 처리하는 스레드를 막지 않도록 func를 worker pool에서 실행
+     현재 트랜잭션이 커밋된 후에 실행되므로
+     func에서는 방금 저장한 객체를 DB에서 다시 읽을 수 있음
+     settings.BACKGROUND_TASKS_EAGER가 True면 (테스트 등) 커밋 후 바로 실행
+    """
+    def submit():
+        if settings.BACKGROUND_TASKS_EAGER:
+            func(*args, **kwargs)
+        else:
+            get_executor().submit(run_task, func, *args, **kwargs)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,489 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import OperationalError, transaction
+from django.db.utils import ConnectionHandler
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import Http404, HttpResponse
+
+from members.models import User
+from posts.models import Post
+from . import routers
+from .db.sqlite3.base import Database, LockRetryMixin, lock_stats
+from .middleware import ReplicaStickinessMiddleware
+from .querybudget import (
+    QueryBudgetExceeded, QueryBudgetMiddleware, QueryRecorder, query_stats, signature,
+)
+from .response_cache import _bump, cache_anonymous_response, response_key
+from .views import serve_media
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        routers.reset()
+        self.router = routers.ReplicaRouter()
+
+    def tearDown(self):
+        routers.reset()
+
+    def test_reads_go_to_replicas(self):
+        self.assertIn(self.router.db_for_read(Post), ['replica1', 'replica2'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_reads_after_write_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_use_primary(self):
+        with routers.use_primary():
+            self.assertTrue(routers.pinned_to_primary())
+        self.assertFalse(routers.pinned_to_primary())
+
+    def test_primary_only_apps(self):
+        from django.contrib.sessions.models import Session
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+
+    def test_migrate_only_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTransactionTest(TestCase):
+    def test_reads_in_transaction_go_to_primary(self):
+        with transaction.atomic():
+            self.assertEqual(routers.ReplicaRouter().db_for_read(Post), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_REPLICA_STICKY_SECONDS=5)
+class ReplicaStickinessMiddlewareTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def run_middleware(self, request, view):
+        states = []
+
+        def get_response(request):
+            states.append(routers.pinned_to_primary())
+            view()
+            return HttpResponse()
+
+        response = ReplicaStickinessMiddleware(get_response)(request)
+        return states[0], response
+
+    def test_write_sets_sticky_cookie(self):
+        pinned, response = self.run_middleware(
+            self.factory.post('/'),
+            lambda: User.objects.create_user(username='a'),
+        )
+        self.assertTrue(pinned)
+        self.assertIn('db_primary_until', response.cookies)
+        self.assertFalse(routers.written())
+
+        request = self.factory.get('/')
+        request.COOKIES['db_primary_until'] = response.cookies['db_primary_until'].value
+        pinned, response = self.run_middleware(request, lambda: None)
+        self.assertTrue(pinned)
+
+    def test_write_sticks_api_client_without_cookies(self):
+        auth = {'HTTP_AUTHORIZATION': 'Token abc'}
+        self.run_middleware(
+            self.factory.post('/', **auth),
+            lambda: User.objects.create_user(username='a'),
+        )
+        pinned, response = self.run_middleware(self.factory.get('/', **auth), lambda: None)
+        self.assertTrue(pinned)
+
+    def test_read_only_request(self):
+        pinned, response = self.run_middleware(self.factory.get('/'), lambda: None)
+        self.assertFalse(pinned)
+        self.assertNotIn('db_primary_until', response.cookies)
+
+
+class QueryRecorderTest(TestCase):
+    def test_signature_ignores_number_of_params(self):
+        self.assertEqual(
+            signature('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            signature('SELECT *\n FROM t WHERE id IN (%s, %s)'),
+        )
+
+    def test_counts_duplicates_and_repeats(self):
+        user = User.objects.create_user(username='a')
+        with QueryRecorder().record() as recorder:
+            for _ in range(2):
+                list(User.objects.filter(pk=user.pk))
+            list(User.objects.filter(pk=user.pk + 1))
+        self.assertEqual(recorder.count, 3)
+        self.assertEqual(recorder.duplicates, 1)
+        self.assertEqual(recorder.max_repeats, 3)
+
+
+@override_settings(
+    QUERY_BUDGET_MODE='raise',
+    QUERY_BUDGET_SAMPLE_RATE=1.0,
+    QUERY_BUDGETS={'/n-plus-one/': {'queries': 3, 'repeats': 2}},
+)
+class QueryBudgetMiddlewareTest(TestCase):
+    def setUp(self):
+        query_stats.clear()
+        self.users = [User.objects.create_user(username=f'u{i}') for i in range(3)]
+
+    def n_plus_one(self, request):
+        for user in self.users:
+            User.objects.get(pk=user.pk)
+        return HttpResponse()
+
+    def get(self, path):
+        return QueryBudgetMiddleware(self.n_plus_one)(RequestFactory().get(path))
+
+    def test_raise_when_over_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'repeated query 3 > 2'):
+            self.get('/n-plus-one/')
+
+    @override_settings(QUERY_BUDGET_MODE='log')
+    def test_log_and_report(self):
+        with self.assertLogs('config.querybudget', 'WARNING'):
+            self.get('/n-plus-one/')
+        self.get('/other/')
+        report = {row['endpoint']: row for row in query_stats.report()}
+        self.assertEqual(report['/n-plus-one/']['violations'], 1)
+        self.assertEqual(report['/other/']['violations'], 0)
+        self.assertEqual(report['/other/']['max_queries'], 3)
+        self.assertEqual(report['/other/']['top_repeated'][0][1], 3)
+
+    @override_settings(QUERY_BUDGET_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        self.get('/n-plus-one/')
+        self.assertEqual(query_stats.report(), [])
+
+    def test_exit_report(self):
+        # 프로세스 종료시의 요약은 QUERY_BUDGET_REPORT_AT_EXIT인 경우에만 등록
+        with mock.patch('config.querybudget.atexit') as atexit:
+            QueryBudgetMiddleware(self.n_plus_one)
+            atexit.register.assert_not_called()
+            with override_settings(QUERY_BUDGET_REPORT_AT_EXIT=True):
+                QueryBudgetMiddleware(self.n_plus_one)
+                QueryBudgetMiddleware(self.n_plus_one)
+        self.assertEqual(atexit.register.call_count, 2)
+        self.assertEqual(atexit.unregister.call_count, 2)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=30, RESPONSE_CACHE_STALE_TIMEOUT=60, RESPONSE_CACHE_WAIT=2)
+class ResponseCacheTest(SimpleTestCase):
+    # 세대 카운터 무효화와 stampede 방지 (config.response_cache)
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+        @cache_anonymous_response('test')
+        def view(request):
+            self.calls += 1
+            self.release.wait(5)
+            return HttpResponse(f'response {self.calls}')
+        self.view = view
+
+    def get(self, path='/cached/', user=None, **extra):
+        request = RequestFactory().get(path, **extra)
+        request.user = user or AnonymousUser()
+        request._messages = []
+        return self.view(request)
+
+    def test_cache_and_invalidate(self):
+        self.assertEqual(self.get().content, b'response 1')
+        self.assertEqual(self.get().content, b'response 1')
+        self.assertEqual(self.get('/cached/?page=2').content, b'response 2')
+        _bump(['test'])
+        self.assertEqual(self.get().content, b'response 3')
+        self.assertEqual(self.get().content, b'response 3')
+
+    def test_authenticated_bypass(self):
+        user = User(pk=1, username='user')
+        self.assertEqual(self.get(user=user).content, b'response 1')
+        self.assertEqual(self.get(user=user).content, b'response 2')
+
+    def test_single_recompute_with_stale_response(self):
+        self.get()
+        _bump(['test'])
+        # 한 요청이 다시 만드는 동안 다른 요청은 이전 응답을 사용
+        self.release.clear()
+        leader = threading.Thread(target=self.get)
+        leader.start()
+        while self.calls < 2:
+            time.sleep(0.01)
+        contents = {self.get().content for _ in range(5)}
+        self.release.set()
+        leader.join()
+        self.assertEqual(contents, {b'response 1'})
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.get().content, b'response 2')
+
+    def test_concurrent_misses_wait_for_leader(self):
+        self.release.clear()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.get().content))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [b'response 1'] * 8)
+
+    @override_settings(RESPONSE_CACHE_WAIT=0.1)
+    def test_lock_holder_timeout(self):
+        # 잠금을 가진 요청이 응답하지 않으면 기다린 후 직접 만들고 저장하지 않음
+        request = RequestFactory().get('/cached/')
+        cache.add(f'{response_key(request)}:lock', 1)
+        self.assertEqual(self.get().content, b'response 1')
+        self.assertEqual(self.get().content, b'response 2')
+
+    def test_conditional_get_on_hit(self):
+        @cache_anonymous_response('test')
+        def view(request):
+            response = HttpResponse('body')
+            response['ETag'] = '"v1"'
+            return response
+        self.view = view
+        self.get('/etag/')
+        self.assertEqual(self.get('/etag/', HTTP_IF_NONE_MATCH='"v1"').status_code, 304)
+
+
+class ServeMediaTest(SimpleTestCase):
+    # 업로드된 파일의 조건부 GET과 Range요청 (config.views.serve_media)
+    content = b'0123456789'
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.media_root, 'post'))
+        with open(os.path.join(self.media_root, 'post', 'a.jpg'), 'wb') as f:
+            f.write(self.content)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def get(self, path='post/a.jpg', method='get', **headers):
+        request = getattr(RequestFactory(), method)(f'/media/{path}', **headers)
+        return serve_media(request, path)
+
+    def read(self, response):
+        try:
+            return b''.join(response.streaming_content)
+        finally:
+            response.close()
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.read(response), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=', response['Cache-Control'])
+
+        head = self.get(method='head')
+        self.assertEqual(head.status_code, 200)
+        self.assertEqual(head.content, b'')
+        self.assertEqual(head['ETag'], response['ETag'])
+
+    def test_conditional(self):
+        response = self.get()
+        response.close()
+        etag = response['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        not_modified = self.get(HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(not_modified.status_code, 200)
+        not_modified.close()
+
+        # 파일이 바뀌면 ETag도 바뀜
+        with open(os.path.join(self.media_root, 'post', 'a.jpg'), 'ab') as f:
+            f.write(b'!')
+        changed = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(self.read(changed), self.content + b'!')
+
+    def test_range(self):
+        for header, body, content_range in [
+            ('bytes=2-5', b'2345', 'bytes 2-5/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=-3', b'789', 'bytes 7-9/10'),
+            ('bytes=8-100', b'89', 'bytes 8-9/10'),
+            ('bytes=-100', self.content, 'bytes 0-9/10'),
+        ]:
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(self.read(response), body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+
+    def test_unsatisfiable_range(self):
+        for header in ['bytes=10-', 'bytes=5-2', 'bytes=-0']:
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_empty_file(self):
+        # 빈 파일에는 만족할 수 있는 범위가 없으므로 모든 범위에 416
+        open(os.path.join(self.media_root, 'post', 'empty.jpg'), 'wb').close()
+        for header in ['bytes=-3', 'bytes=0-', 'bytes=0-0']:
+            with self.subTest(header=header):
+                response = self.get('post/empty.jpg', HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */0')
+        response = self.get('post/empty.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.read(response), b'')
+
+    def test_ignored_range(self):
+        # 형식이 맞지 않거나 여러 범위라면 전체 파일
+        for header in ['bytes=a-b', 'bytes=-', 'bytes=0-1,3-4', 'items=0-1']:
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.read(response), self.content)
+
+    def test_if_range(self):
+        response = self.get()
+        response.close()
+        for if_range, status in [
+            (response['ETag'], 206),
+            (response['Last-Modified'], 206),
+            ('"other"', 200),
+            ('Sat, 01 Jan 2000 00:00:00 GMT', 200),
+        ]:
+            with self.subTest(if_range=if_range):
+                ranged = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=if_range)
+                self.assertEqual(ranged.status_code, status)
+                self.assertEqual(self.read(ranged), b'01' if status == 206 else self.content)
+
+    def test_not_found(self):
+        for path in ['post/missing.jpg', 'post', '../settings.py']:
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
+        self.assertEqual(self.get(method='post').status_code, 405)
+
+    def test_sendfile(self):
+        with override_settings(MEDIA_SENDFILE_BACKEND='x-sendfile'):
+            response = self.get()
+            self.assertEqual(response['X-Sendfile'],
+                             os.path.join(self.media_root, 'post', 'a.jpg'))
+            self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_SENDFILE_BACKEND='x-accel-redirect'):
+            self.assertEqual(self.get()['X-Accel-Redirect'], '/protected-media/post/a.jpg')
+
+
+class ProductionSQLiteBackendTest(SimpleTestCase):
+    # 운영 환경용 SQLite backend (config.db.sqlite3)
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir, ignore_errors=True)
+        self.connections = ConnectionHandler({
+            alias: {
+                **settings.DATABASE_PROFILES['production'],
+                'NAME': os.path.join(self.tempdir, 'db.sqlite3'),
+                'LOCK_RETRY_DELAY': 0,
+            } for alias in ['default', 'second']
+        })
+        self.addCleanup(self.connections.close_all)
+        with self.connections['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+
+    def lock(self, alias='second'):
+        # 다른 연결이 쓰기 잠금을 가진 상태로 만듦
+        connection = self.connections[alias]
+        connection.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        self.addCleanup(connection.set_autocommit, True)
+        return connection
+
+    def pragma(self, name):
+        with self.connections['default'].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    def test_begin_immediate(self):
+        first = self.connections['default']
+        with CaptureQueriesContext(first) as queries:
+            first.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        self.addCleanup(first.set_autocommit, True)
+        self.assertEqual([query['sql'] for query in queries], ['BEGIN IMMEDIATE'])
+        # 아직 쓰지 않았어도 BEGIN에서 쓰기 잠금을 가짐
+        second = self.connections['second']
+        second.ensure_connection()
+        second.connection.execute('PRAGMA busy_timeout = 0')
+        with self.assertRaisesMessage(Database.OperationalError, 'database is locked'):
+            second.connection.execute('BEGIN IMMEDIATE')
+
+    def test_lock_retry(self):
+        first = self.connections['default']
+        first.ensure_connection()
+        first.connection.execute('PRAGMA busy_timeout = 0')
+        second = self.lock()
+        retries = lock_stats.retries
+
+        # 잠금이 풀리면 다시 시도한 문장이 성공
+        with mock.patch('config.db.sqlite3.base.time.sleep',
+                        side_effect=lambda delay: second.commit()):
+            with first.cursor() as cursor:
+                cursor.execute('INSERT INTO item (id) VALUES (1)')
+        self.assertEqual(lock_stats.retries, retries + 1)
+
+        # LOCK_RETRIES번 다시 시도한 후에는 오류를 발생
+        second.connection.execute('BEGIN IMMEDIATE')
+        with mock.patch('config.db.sqlite3.base.time.sleep') as sleep, \
+                self.assertRaises(OperationalError):
+            with first.cursor() as cursor:
+                cursor.execute('INSERT INTO item (id) VALUES (2)')
+        self.assertEqual(sleep.call_count, settings.DATABASE_PROFILES['production']['LOCK_RETRIES'])
+        second.rollback()
+
+    def test_no_retry_in_transaction(self):
+        # 트랜잭션 중간의 문장은 다시 시도하지 않음 (이전 문장의 결과가 유지되지 않을 수 있으므로)
+        wrapper = LockRetryMixin()
+        wrapper.retries = 5
+        wrapper.connection = mock.Mock(in_transaction=True)
+        method = mock.Mock(side_effect=Database.OperationalError('database is locked'))
+        with self.assertRaises(Database.OperationalError):
+            wrapper._retry(method)
+        method.assert_called_once_with()
+
+    def test_health_check(self):
+        first = self.connections['default']
+        first.ensure_connection()
+        # 요청 사이에 연결이 끊어졌다면 다음에 사용할 때 다시 연결
+        first.connection.close()
+        first.close_if_unusable_or_obsolete()
+        self.assertTrue(first.health_check_needed)
+        with first.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone(), (0,))
+        self.assertFalse(first.health_check_needed)
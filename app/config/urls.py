@@ -13,10 +13,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.views.generic import RedirectView
 
 from . import views
@@ -28,6 +29,8 @@ urlpatterns_api_posts = ([
     path('post/', posts_apis.PostList.as_view(), name='post-list'),
     path('post/<int:pk>/', posts_apis.PostDetail.as_view(), name='post-detail'),
     path('post/<int:post_pk>/like/', posts_apis.PostLikeCreateDestroy.as_view(), name='post-like'),
+    path('feed/', posts_apis.HomeTimeline.as_view(), name='feed'),
+    path('tag/<str:tag_name>/', posts_apis.TagPostList.as_view(), name='tag-post-list'),
 
     path('postlike/', posts_apis.PostLikeCreateAPIView.as_view()),
     path('postlike/<int:pk>/', posts_apis.PostLikeDestroyAPIView.as_view()),
@@ -35,10 +38,13 @@ urlpatterns_api_posts = ([
 
 urlpatterns_api_members = ([
     path('auth-token/', members_apis.AuthTokenView.as_view()),
+    path('auth-token/refresh/', members_apis.TokenRefreshView.as_view()),
+    path('auth-token/revoke/', members_apis.TokenRevokeView.as_view()),
     path('user/profile/', members_apis.UserDetail.as_view()),
     path('user/<int:pk>/', members_apis.UserDetail.as_view()),
     path('user/view/profile/', members_apis.UserDetailAPIView.as_view()),
     path('user/view/<int:pk>/', members_apis.UserDetailAPIView.as_view()),
+    path('user/<int:pk>/follow/', members_apis.FollowCreateDestroy.as_view()),
 ], 'members')
 
 urlpatterns_api = ([
@@ -60,12 +66,13 @@ urlpatterns = [
 
     path('api/', include(urlpatterns_api)),
 ]
-# MEDIA_URL로 시작하는 URL은 static()내의 serve() 함수를 통해 처리
+# MEDIA_URL로 시작하는 URL은 config.views.serve_media를 통해 처리
 # MEDIA_ROOT기준으로 파일을 검색함
-urlpatterns += static(
-    prefix=settings.MEDIA_URL,
-    document_root=settings.MEDIA_ROOT,
-)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            views.serve_media,
+            name='media'),
+]
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns = [
@@ -1,5 +1,156 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
 # from django.shortcuts import redirect
 #
 #
 # def index(request):
-#     return redirect('posts:post-list')
\ No newline at end of file
+#     return redirect('posts:post-list')
+
+
+RANGE_PATTERN = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+
+def iter_file_range(f, start, length, chunk_size=64 * 2 ** 10):
+    # 파일의 start위치부터 length만큼을 chunk_size씩 나누어 돌려줌
+    try:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def parse_range(header, size):
+    """
+    Range헤더에서 (start, end)를 가져옴 (end는 포함)
+     'bytes=<start>-<end>' 형태의 단일 범위만 처리하며
+     형식이 맞지 않으면 None (전체 파일로 응답),
+     파일 범위를 벗어나면 False (416으로 응답)를 리턴
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or not (match.group('start') or match.group('end')):
+        return None
+    if not size:
+        # 빈 파일에는 만족할 수 있는 범위가 없음
+        return False
+    start, end = match.group('start'), match.group('end')
+    if not start:
+        # bytes=-500: 마지막 500byte
+        length = int(end)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def serve_media(request, path):
+    """
+    MEDIA_ROOT아래의 업로드된 파일을 돌려주는 view
+     - 파일의 수정시간과 크기로 만든 ETag, Last-Modified, Cache-Control헤더
+     - If-None-Match/If-Modified-Since에 대해 파일을 열지 않고 304로 응답
+     - 단일 범위 Range요청에 대해 206으로 응답
+     - settings.MEDIA_SENDFILE_BACKEND가 지정되어 있다면
+       파일 내용은 웹서버가 보내도록 X-Sendfile 또는 X-Accel-Redirect헤더만 설정
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(fullpath)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    content_type, encoding = mimetypes.guess_type(fullpath)
+
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    response['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response['Content-Encoding'] = encoding
+
+    conditional_response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(stat.st_mtime),
+        response=response,
+    )
+    if conditional_response is not response:
+        return conditional_response
+
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    if backend == 'x-sendfile':
+        response['X-Sendfile'] = fullpath
+        return response
+    if backend == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+        return response
+
+    # Range요청 처리, If-Range가 현재 파일과 다르면 전체 파일로 응답
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range or if_range == etag or \
+                parse_http_date_safe(if_range) == int(stat.st_mtime):
+            byte_range = parse_range(range_header, size)
+    if byte_range is False:
+        response.status_code = 416
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+    length = end - start + 1
+
+    if request.method == 'HEAD':
+        response.status_code = status
+    elif status == 200:
+        # 전체 파일은 FileResponse를 사용 (WSGI서버의 wsgi.file_wrapper 사용 가능)
+        file_response = FileResponse(open(fullpath, 'rb'))
+        for header, value in response.items():
+            file_response[header] = value
+        response = file_response
+    else:
+        range_response = StreamingHttpResponse(
+            iter_file_range(open(fullpath, 'rb'), start, length),
+            status=status,
+        )
+        for header, value in response.items():
+            range_response[header] = value
+        response = range_response
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    return response
@@ -1,10 +1,12 @@
 from django.contrib import admin
 
-from .models import User
+from .models import RefreshToken, Relation, User
 
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ['username']
 
 
-admin.site.register(User, UserAdmin)
\ No newline at end of file
+admin.site.register(User, UserAdmin)
+admin.site.register(Relation)
+admin.site.register(RefreshToken)
@@ -1,12 +1,15 @@
 
 from django.contrib.auth import get_user_model
-from rest_framework import generics, status
-from rest_framework.exceptions import NotAuthenticated
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotAuthenticated, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .serializers import AuthTokenSerializer, UserSerializer
+from config.conditional import ConditionalGetMixin, make_etag
+from config.fieldsets import Fieldset, FieldsetMixin
+from .models import RefreshToken, Relation
+from .serializers import AuthTokenSerializer, TokenRefreshSerializer, UserSerializer
 
 User = get_user_model()
 
@@ -24,21 +27,50 @@ class AuthTokenView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TokenRefreshView(APIView):
+    """
+    refresh_token을 받아서 새 access token, refresh token을 리턴
+     사용한 refresh token은 폐기되며, 폐기된 토큰이 다시 사용되면 해당 사용자의 refresh token을 모두 폐기
+    """
+
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        if serializer.is_valid():
+            return Response(serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TokenRevokeView(APIView):
+    # refresh_token을 폐기 (로그아웃)
+    #  이미 발급된 access token은 만료될 때까지 유효함
+    def post(self, request):
+        refresh_token = request.data.get('refresh_token')
+        if not refresh_token:
+            raise ValidationError({'refresh_token': ['이 필드는 필수 항목입니다.']})
+        RefreshToken.objects.revoke(refresh_token)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class UserDetailAPIView(APIView):
     # URL1: /apis/members/view/<int:pk>/
     # URL2: /apis/members/view/profile/
+    #  ?fields=로 응답의 필드를 선택 (config.fieldsets)
     def get(self, request, pk=None):
+        fieldset = Fieldset.from_request(request, UserSerializer)
         if pk:
-            user = get_object_or_404(User, pk=pk)
+            queryset = User.objects.all()
+            if fieldset is not None:
+                queryset = UserSerializer.optimize_queryset(queryset, fieldset)
+            user = get_object_or_404(queryset, pk=pk)
         else:
             user = request.user
             if not user.is_authenticated:
                 raise NotAuthenticated()
-        serializer = UserSerializer(user)
+        serializer = UserSerializer(user, context={'fieldset': fieldset})
         return Response(serializer.data)
 
 
-class UserDetail(generics.RetrieveAPIView):
+class UserDetail(ConditionalGetMixin, FieldsetMixin, generics.RetrieveAPIView):
     # URL1: /apis/members/<int:pk>/
     # URL2: /apis/members/profile/
     #  2개의 URL에 모두 매칭되도록
@@ -50,9 +82,28 @@ class UserDetail(generics.RetrieveAPIView):
     #   pk값이 주어지지 않았는데 request.user가 인증되지 않았다면 예외 일으키기
 
     # 돌려주는 데이터는 유저정보 serialize결과
+    #  ?fields=로 응답의 필드를 선택 (config.fieldsets)
+    #  응답에 포함될 컬럼의 값으로 ETag를 계산 (config.conditional)
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def get_validators(self):
+        fieldset = self.get_fieldset()
+        fields = fieldset.fields if fieldset is not None else UserSerializer.Meta.fields
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            values = User.objects\
+                .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})\
+                .values_list(*fields)\
+                .first()
+            if values is None:
+                return None, None
+        elif self.request.user.is_authenticated:
+            values = tuple(getattr(self.request.user, name) for name in fields)
+        else:
+            return None, None
+        return make_etag(self.request, values), None
+
     def get_object(self):
         # 하나의 Object를 특정화 하기 위한 조건을 가진 필드명 또는 URL패턴명
         #  기본값: 'pk'
@@ -67,4 +118,29 @@ class UserDetail(generics.RetrieveAPIView):
 
         # 'pk'가 URL패턴명에 있으면,
         # 기존 GenericAPIView에서의 동작을 그대로 실행
-        return super().get_object()
\ No newline at end of file
+        return super().get_object()
+
+
+class FollowCreateDestroy(APIView):
+    # URL: /apis/members/user/<int:pk>/follow/
+    #  POST: pk에 해당하는 User를 팔로우
+    #  DELETE: pk에 해당하는 User를 언팔로우
+    permission_classes = (
+        permissions.IsAuthenticated,
+    )
+
+    def post(self, request, pk):
+        user = get_object_or_404(User, pk=pk)
+        if user.pk == request.user.pk:
+            raise ValidationError('자기 자신은 팔로우할 수 없습니다')
+        relation, relation_created = request.user.following_relations.get_or_create(to_user=user)
+        serializer = UserSerializer(user)
+        if relation_created:
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data)
+
+    def delete(self, request, pk):
+        relation = get_object_or_404(
+            Relation, from_user=request.user, to_user_id=pk)
+        relation.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -3,4 +3,9 @@ from django.apps import AppConfig
 
 class MembersConfig(AppConfig):
     name = 'members'
-    verbose_name = '사용자'
\ No newline at end of file
+    verbose_name = '사용자'
+
+    def ready(self):
+        # Token삭제, User변경시 토큰 인증 캐시를 비우도록 signal을 연결
+        from .authentication import connect_signals
+        connect_signals()
@@ -0,0 +1,214 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication, TokenAuthentication, get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from config.routers import use_primary
+from .tokens import read_access_token
+
+
+class _Load:
+    # 같은 키를 동시에 조회하는 스레드들이 기다리는 조회 작업
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TokenCache:
+    """
+    {토큰 키: 값}을 저장하는 프로세스별 TTL/LRU 캐시
+     - 최대 maxsize개, 각 항목은 timeout초동안 유지
+     - 같은 키를 동시에 조회하면 한 스레드만 load()를 실행하고 나머지는 그 결과를 사용
+     - invalidate_user()로 특정 사용자의 항목을 모두 삭제
+       (다른 프로세스의 캐시는 지울 수 없으므로 timeout초 이내에 반영됨)
+    """
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # {키: (user_pk, 값, 만료시간)}
+        self._entries = OrderedDict()
+        # {user_pk: {키, ...}}
+        self._user_keys = {}
+        # {키: _Load}
+        self._loading = {}
+        # 조회하는 동안 삭제된 항목을 다시 저장하지 않도록 삭제할 때마다 증가
+        self._generation = 0
+
+    def get(self, key, load):
+        """
+        key의 값을 리턴, 없다면 load()를 실행해서 (user_pk, 값)을 받아 저장
+         load()에서 발생한 예외는 저장하지 않고 기다리던 스레드에도 그대로 발생시킴
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[1]
+            loading = self._loading.get(key)
+            leader = loading is None
+            if leader:
+                loading = self._loading[key] = _Load()
+                generation = self._generation
+        if not leader:
+            loading.event.wait()
+            if loading.error is not None:
+                raise loading.error
+            return loading.value
+
+        try:
+            user_pk, value = load()
+            loading.value = value
+            with self._lock:
+                if generation == self._generation:
+                    self._set(key, user_pk, value)
+            return value
+        except Exception as e:
+            loading.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.event.set()
+
+    def _set(self, key, user_pk, value):
+        self._remove(key)
+        self._entries[key] = (user_pk, value, time.monotonic() + self.timeout)
+        self._user_keys.setdefault(user_pk, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._user_keys.get(entry[0])
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[entry[0]]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._remove(key)
+
+    def invalidate_user(self, user_pk):
+        with self._lock:
+            self._generation += 1
+            for key in list(self._user_keys.get(user_pk, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._user_keys.clear()
+
+
+token_cache = TokenCache(
+    maxsize=settings.API_TOKEN_CACHE_SIZE,
+    timeout=settings.API_TOKEN_CACHE_TIMEOUT,
+)
+
+
+def user_values(user):
+    # token_cache에 저장할 User의 모든 필드값
+    return [getattr(user, field.attname) for field in user._meta.concrete_fields]
+
+
+def user_from_values(values):
+    # user_values()로 저장한 값으로 새 User인스턴스를 만듦 (DB를 조회하지 않음)
+    User = get_user_model()
+    return User.from_db(
+        User.objects.db,
+        [field.attname for field in User._meta.concrete_fields],
+        values,
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    DRF Token인증 결과를 프로세스별 캐시(token_cache)에 저장해서
+     같은 토큰의 요청은 Token, User를 DB에서 다시 조회하지 않음
+    요청마다 캐시된 값으로 새 User, Token인스턴스를 만들어서 돌려주므로
+     view에서 request.user를 변경해도 다른 요청에 영향을 주지 않음
+    Token이 삭제되거나 User가 저장/삭제되면 해당 항목을 캐시에서 삭제
+    """
+
+    def authenticate_credentials(self, key):
+        def load():
+            user, token = super(CachedTokenAuthentication, self).authenticate_credentials(key)
+            return user.pk, (user_values(user), token.created)
+
+        values, created = token_cache.get(key, load)
+        user = user_from_values(values)
+        token = Token(key=key, user=user, created=created)
+        token._state.adding = False
+        return user, token
+
+
+def invalidate_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+def invalidate_user_tokens(sender, instance, **kwargs):
+    # 비활성화, 비밀번호 변경 등 User가 저장/삭제되면 해당 User의 토큰을 모두 다시 조회
+    token_cache.invalidate_user(instance.pk)
+
+
+def connect_signals():
+    # MembersConfig.ready()에서 호출
+    User = get_user_model()
+    post_delete.connect(invalidate_token, sender=Token, dispatch_uid='token_cache_token_delete')
+    post_save.connect(invalidate_user_tokens, sender=User, dispatch_uid='token_cache_user_save')
+    post_delete.connect(invalidate_user_tokens, sender=User, dispatch_uid='token_cache_user_delete')
+
+
+class AccessTokenAuthentication(BaseAuthentication):
+    """
+    'Authorization: Bearer <access token>'헤더의 서명된 access token(members.tokens)으로 인증
+     토큰에 담긴 pk의 User는 token_cache에 모든 필드를 저장해두고
+     같은 사용자의 요청은 DB를 조회하지 않음 (프로세스별로 API_TOKEN_CACHE_TIMEOUT초마다 1번 조회)
+     User가 저장/삭제되면 캐시에서 삭제되므로 비활성화/삭제된 사용자는 인증되지 않음
+     (다른 프로세스에서의 변경은 API_TOKEN_CACHE_TIMEOUT초 이내에 반영됨)
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('올바르지 않은 토큰 헤더입니다')
+        payload = read_access_token(auth[1].decode(errors='replace'))
+        if payload is None:
+            raise exceptions.AuthenticationFailed('만료되었거나 올바르지 않은 토큰입니다')
+        user_pk = payload['uid']
+
+        def load():
+            # 방금 가입한 사용자도 읽을 수 있도록 primary DB에서 읽음
+            User = get_user_model()
+            try:
+                with use_primary():
+                    user = User._default_manager.get(pk=user_pk)
+            except User.DoesNotExist:
+                raise exceptions.AuthenticationFailed('존재하지 않는 사용자입니다')
+            return user.pk, user_values(user)
+
+        # Token의 키(문자열)와 겹치지 않도록 tuple을 키로 사용
+        user = user_from_values(token_cache.get(('user', user_pk), load))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('비활성화된 사용자입니다')
+        return user, payload
+
+    def authenticate_header(self, request):
+        return self.keyword
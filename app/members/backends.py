@@ -1,22 +1,93 @@
 import imghdr
+import logging
+import threading
 
 import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.base import ContentFile
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config.response_cache import bump_generations
+from config.tasks import run_in_background
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
+# {다시 시도 여부: requests.Session}
+_sessions = {}
+_session_lock = threading.Lock()
 
-class FacebookBackend:
-    def authenticate(self, request, facebook_request_token):
-        api_base = 'https://graph.facebook.com/v3.2'
-        api_get_access_token = f'{api_base}/oauth/access_token'
-        api_me = f'{api_base}/me'
 
-        # 페이스북으로부터 받아온 request token
-        code = facebook_request_token
+def get_graph_session(retry=False):
+    # 프로세스별로 requests.Session을 공유
+    #  요청마다 새로 연결하지 않고 연결을 POOL_SIZE개까지 유지하며 재사용
+    #  retry=True라면 연결 실패나 일시적인 오류(502, 503, 504)를 다시 시도
+    with _session_lock:
+        session = _sessions.get(retry)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_maxsize=settings.FACEBOOK_GRAPH_POOL_SIZE,
+                max_retries=Retry(
+                    total=2,
+                    backoff_factor=0.2,
+                    status_forcelist=(502, 503, 504),
+                    method_whitelist=frozenset(['GET']),
+                ) if retry else 0,
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[retry] = session
+        return session
+
+
+def graph_get(url, params=None, retry=False):
+    # retry: 여러 번 요청해도 결과가 같은 요청(/me, 사진)에만 사용
+    #  (request token은 한 번만 교환할 수 있으므로 /oauth/access_token은 다시 시도하지 않음)
+    response = get_graph_session(retry).get(
+        url,
+        params=params,
+        timeout=settings.FACEBOOK_GRAPH_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response
+
 
+def save_profile_image(user_pk, facebook_id, url):
+    """
+    페이스북 프로필 사진을 받아서 User.img_profile에 저장 (run_in_background로 실행)
+     저장한 후 img_profile_source에 url을 기록해서 다음 로그인때 같은 사진을 다시 받지 않음
+    """
+    img_data = graph_get(url, retry=True).content
+    # imghdr모듈을 사용해 Image binary data의 확장자를 알아냄
+    ext = imghdr.what('', h=img_data)
+    if ext is None:
+        logger.warning('Facebook profile image of user %s is not an image', user_pk)
+        return
+    user = User.objects.filter(pk=user_pk).only('pk', 'img_profile').first()
+    if user is None:
+        return
+    # 파일만 저장하고, DB에는 img_profile과 img_profile_source만 기록
+    user.img_profile.save(f'{facebook_id}.{ext}', ContentFile(img_data), save=False)
+    User.objects.filter(pk=user_pk).update(
+        img_profile=user.img_profile.name,
+        img_profile_source=url,
+    )
+    # 작성자 정보가 포함된 Post카드 응답을 다시 만듦 (Post카드 조각은 키에 img_profile을 포함)
+    bump_generations('posts')
+
+
+class FacebookBackend:
+    """
+    페이스북 로그인 인증 backend
+     - Graph API요청은 연결을 재사용하는 공유 Session과 timeout을 사용
+     - /me는 로그인할 때마다 새로 발급받은 access token으로 요청하므로 캐시하지 않음
+     - 프로필 사진은 로그인 요청에서 받지 않고,
+       사진 URL이 바뀐 경우에만 백그라운드 작업으로 받아서 저장
+    """
+    def get_access_token(self, code):
         # request token을 access token으로 교환
         params = {
             'client_id': settings.FACEBOOK_APP_ID,
@@ -24,13 +95,10 @@ class FacebookBackend:
             'client_secret': settings.FACEBOOK_APP_SECRET,
             'code': code,
         }
-        response = requests.get(api_get_access_token, params)
-        # 인수로 전달한 문자열이 'JSON'형식일 것으로 생각
-        # json.loads는 전달한 문자열이 JSON형식일 경우, 해당 문자열을 parsing해서 파이썬 Object를 리턴함
-        # response_object = json.loads(response.text)
-        data = response.json()
-        access_token = data['access_token']
+        url = f'{settings.FACEBOOK_GRAPH_API_BASE}/oauth/access_token'
+        return graph_get(url, params).json()['access_token']
 
+    def get_profile(self, access_token):
         # access_token을 사용해서 사용자 정보를 가져오기
         params = {
             'access_token': access_token,
@@ -41,45 +109,42 @@ class FacebookBackend:
                 'picture.type(large)',
             ]),
         }
-        response = requests.get(api_me, params)
-        data = response.json()
-
-        facebook_id = data['id']
-        first_name = data['first_name']
-        last_name = data['last_name']
-        url_img_profile = data['picture']['data']['url']
-        # HTTP GET요청의 응답을 받아와서 binary data를 img_data변수에 할당
-        img_response = requests.get(url_img_profile)
-        img_data = img_response.content
-
-        # 응답의 binary data를 사용해서 In-memory binary stream(file)객체를 생성
-        # 이렇게 안하고 FileField가 지원하는 InMemoryUploadedFile객체를 사용하기!
-        # f = io.BytesIO(img_response.content)
-
-        # imghdr모듈을 사용해 Image binary data의 확장자를 알아냄
-        ext = imghdr.what('', h=img_data)
-        # Form에서 업로드한 것과 같은 형태의 file-like object생성
-        #  첫 번째 인수로 반드시 파일명이 필요. <facebook_id>.<확장자>형태의 파일명을 지정
-        f = SimpleUploadedFile(f'{facebook_id}.{ext}', img_response.content)
+        url = f'{settings.FACEBOOK_GRAPH_API_BASE}/me'
+        return graph_get(url, params, retry=True).json()
+
+    def authenticate(self, request, facebook_request_token):
+        # 페이스북으로부터 받아온 request token
+        code = facebook_request_token
+        try:
+            access_token = self.get_access_token(code)
+            data = self.get_profile(access_token)
+            facebook_id = data['id']
+            first_name = data['first_name']
+            last_name = data['last_name']
+        except (requests.RequestException, KeyError, ValueError):
+            logger.warning('Facebook login failed', exc_info=True)
+            return None
+        url_img_profile = data.get('picture', {}).get('data', {}).get('url')
 
         try:
             user = User.objects.get(username=facebook_id)
-            # update_or_create
-            user.last_name = last_name
-            user.first_name = first_name
-            # user.img_profile = f
-            user.save()
+            # 이름이 바뀐 경우에만 저장
+            if (user.first_name, user.last_name) != (first_name, last_name):
+                user.first_name = first_name
+                user.last_name = last_name
+                user.save(update_fields=['first_name', 'last_name'])
         except User.DoesNotExist:
             user = User.objects.create_user(
                 username=facebook_id,
                 first_name=first_name,
                 last_name=last_name,
-                img_profile=f,
             )
+        if url_img_profile and url_img_profile != user.img_profile_source:
+            run_in_background(save_profile_image, user.pk, facebook_id, url_img_profile)
         return user
 
     def get_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
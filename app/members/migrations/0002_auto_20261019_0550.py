@@ -0,0 +1,55 @@
+# Generated by Django 2.1.2 on 2026-10-18 20:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Relation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': '팔로우 관계',
+                'verbose_name_plural': '팔로우 관계 목록',
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='팔로워 수'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='팔로잉 수'),
+        ),
+        migrations.AddField(
+            model_name='relation',
+            name='from_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following_relations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='relation',
+            name='to_user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_relations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following',
+            field=models.ManyToManyField(blank=True, related_name='followers', related_query_name='follower', through='members.Relation', to=settings.AUTH_USER_MODEL, verbose_name='팔로우 목록'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='relation',
+            unique_together={('from_user', 'to_user')},
+        ),
+    ]
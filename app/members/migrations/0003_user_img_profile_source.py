@@ -0,0 +1,18 @@
+# Generated by Django 2.1.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0002_auto_20261019_0550'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='img_profile_source',
+            field=models.URLField(blank=True, max_length=1000, verbose_name='프로필 이미지 원본 URL'),
+        ),
+    ]
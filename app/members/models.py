@@ -1,8 +1,16 @@
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.staticfiles.templatetags.staticfiles import static
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
-from posts.models import PostLike
+from config.response_cache import bump_generations
+from posts.models import Post, PostLike, TimelineEntry
 
 
 class User(AbstractUser):
@@ -11,12 +19,37 @@ class User(AbstractUser):
         upload_to='user',
         blank=True,
     )
+    # img_profile을 받아온 외부(페이스북) URL, 같은 URL이라면 다시 받지 않음
+    img_profile_source = models.URLField(
+        '프로필 이미지 원본 URL',
+        max_length=1000,
+        blank=True,
+    )
     site = models.URLField(
         '사이트',
         max_length=150,
         blank=True,
     )
     introduce = models.TextField('소개', blank=True)
+    following = models.ManyToManyField(
+        'self',
+        verbose_name='팔로우 목록',
+        through='Relation',
+        symmetrical=False,
+        related_name='followers',
+        related_query_name='follower',
+        blank=True,
+    )
+    # 팔로워/팔로잉 수
+    #  Relation의 생성/삭제시 F()를 사용해 증감
+    follower_count = models.PositiveIntegerField('팔로워 수', default=0)
+    following_count = models.PositiveIntegerField('팔로잉 수', default=0)
+
+    # save()로 덮어쓰지 않고 Relation.update_counters()에서만 변경하는 필드
+    DERIVED_FIELDS = ('follower_count', 'following_count')
+    # Post카드(post_list.html)에 표시되는 필드
+    #  변경되면 비로그인 사용자 응답 캐시(config.response_cache)를 무효화
+    POST_CARD_FIELDS = ('username', 'img_profile')
 
     def __str__(self):
         return self.username
@@ -25,6 +58,32 @@ class User(AbstractUser):
         verbose_name = '사용자'
         verbose_name_plural = f'{verbose_name} 목록'
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # 이미 저장된 User를 수정할 때는 (UserProfileForm등)
+            #  메모리에 있던(오래된) 팔로워/팔로잉 수로 덮어쓰지 않도록 해당 필드를 제외
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+        username_changed = not self._state.adding \
+            and self.username != getattr(self, '_loaded_username', None)
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.POST_CARD_FIELDS):
+            bump_generations('posts')
+            # 댓글 작성자 이름은 Post의 version으로 캐시되므로 댓글을 작성한 Post들의 version을 올림
+            if username_changed and 'username' in update_fields:
+                Post.touch_commented_by(self.pk)
+        self._loaded_username = self.username
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # DB에서 가져온 시점의 username을 기억해두고 save()시 바뀐 경우에만 Post의 version을 올림
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
     @property
     def img_profile_url(self):
         # 자신의 img_profile필드에 내용이 있다면
@@ -35,9 +94,135 @@ class User(AbstractUser):
         return static('images/blank_user.png')
 
     def like_post_toggle(self, post):
-        # 자신에게 연결된 PostLike중, post값이 매개변수의 post인 PostLike가 있다면 가져오고, 없으면 생성
-        postlike, postlike_created = self.postlike_set.get_or_create(post=post)
-        # 생성되었다면 없다가 생겼다는 말이므로(새로 좋아요를 누름) 따로 처리 필요없음
-        # 생성되지 않았다면 이미 있었다는 말이므로 toggle처리를 위해 삭제
-        if not postlike_created:
-            postlike.delete()
\ No newline at end of file
+        # 자신에게 연결된 PostLike중, post값이 매개변수의 post인 PostLike가 있다면 삭제하고, 없으면 생성
+        # (좋아요 여부, 좋아요 수)를 리턴
+        return PostLike.objects.toggle(post.pk, self)
+
+    def follow_toggle(self, user):
+        # 전달받은 user를 팔로우하고 있다면 언팔로우
+        # 팔로우하지 않았다면 팔로우
+        if user.pk == self.pk:
+            raise ValueError('자기 자신은 팔로우할 수 없습니다')
+        relation, relation_created = self.following_relations.get_or_create(to_user=user)
+        if not relation_created:
+            relation.delete()
+
+
+class Relation(models.Model):
+    # from_user가 to_user를 팔로우
+    from_user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='following_relations',
+    )
+    to_user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follower_relations',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'Relation ({self.from_user_id} -> {self.to_user_id})'
+
+    class Meta:
+        verbose_name = '팔로우 관계'
+        verbose_name_plural = f'{verbose_name} 목록'
+        unique_together = (
+            ('from_user', 'to_user'),
+        )
+
+    def update_counters(self, delta):
+        User.objects.filter(pk=self.from_user_id).update(
+            following_count=F('following_count') + delta)
+        User.objects.filter(pk=self.to_user_id).update(
+            follower_count=F('follower_count') + delta)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.update_counters(1)
+                # 새로 팔로우한 사용자의 최근 Post를 타임라인에 채워넣음
+                TimelineEntry.objects.add_author_posts(self.from_user, self.to_user)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self.update_counters(-1)
+            TimelineEntry.objects.remove_author_posts(self.from_user, self.to_user)
+        return result
+
+
+class RefreshTokenManager(models.Manager):
+    @staticmethod
+    def hash(raw_token):
+        return hashlib.sha256(raw_token.encode()).hexdigest()
+
+    def issue(self, user):
+        # 새 refresh token을 생성하고 원래의 토큰 문자열을 리턴
+        #  DB에는 토큰의 hash값만 저장
+        raw_token = secrets.token_urlsafe(32)
+        self.create(
+            user=user,
+            token_hash=self.hash(raw_token),
+            expires_at=timezone.now() + timedelta(seconds=settings.REFRESH_TOKEN_LIFETIME),
+        )
+        return raw_token
+
+    def rotate(self, raw_token):
+        """
+        유효한 refresh token이라면 폐기하고 (User, 새 refresh token)을 리턴, 아니라면 None
+         이미 폐기된(교체된) 토큰이 다시 사용되었다면 탈취된 것으로 보고
+         해당 User의 모든 refresh token을 폐기
+        """
+        now = timezone.now()
+        refresh_token = self.select_related('user')\
+            .filter(token_hash=self.hash(raw_token)).first()
+        if refresh_token is None:
+            return None
+        if refresh_token.revoked_at is not None:
+            self.filter(user_id=refresh_token.user_id, revoked_at__isnull=True)\
+                .update(revoked_at=now)
+            return None
+        if refresh_token.expires_at <= now or not refresh_token.user.is_active:
+            return None
+        with transaction.atomic():
+            # 동시에 같은 토큰으로 요청한 경우 하나만 교체에 성공
+            revoked = self.filter(pk=refresh_token.pk, revoked_at__isnull=True)\
+                .update(revoked_at=now)
+            if not revoked:
+                return None
+            return refresh_token.user, self.issue(refresh_token.user)
+
+    def revoke(self, raw_token):
+        # 폐기되었다면 True
+        return bool(
+            self.filter(token_hash=self.hash(raw_token), revoked_at__isnull=True)
+            .update(revoked_at=timezone.now())
+        )
+
+
+class RefreshToken(models.Model):
+    # access token(members.tokens)을 다시 발급받을 때 사용하는 토큰
+    #  한 번 사용하면 폐기되고 새 토큰으로 교체됨 (rotation)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='refresh_tokens',
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    # 교체되거나 로그아웃으로 폐기된 시간
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    objects = RefreshTokenManager()
+
+    def __str__(self):
+        return f'RefreshToken (User: {self.user_id})'
+
+    class Meta:
+        verbose_name = 'Refresh 토큰'
+        verbose_name_plural = f'{verbose_name} 목록'
@@ -3,10 +3,15 @@ from rest_framework import serializers
 from rest_framework.authtoken.models import Token
 from rest_framework.exceptions import AuthenticationFailed
 
+from config.fieldsets import FieldsetSerializerMixin
+
+from .models import RefreshToken
+from .tokens import issue_tokens, token_response
+
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (
@@ -37,5 +42,23 @@ class AuthTokenSerializer(serializers.Serializer):
         data = {
             'user': UserSerializer(self.user).data,
             'token': token.key,
+            # 서명된 access token과 refresh token (members.tokens)
+            **issue_tokens(self.user),
         }
-        return data
\ No newline at end of file
+        return data
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    # refresh token을 새 access token, refresh token으로 교환
+    #  사용한 refresh token은 폐기됨
+    refresh_token = serializers.CharField()
+
+    def validate(self, data):
+        result = RefreshToken.objects.rotate(data['refresh_token'])
+        if result is None:
+            raise AuthenticationFailed('만료되었거나 올바르지 않은 refresh token입니다')
+        self.user, self.refresh_token = result
+        return data
+
+    def to_representation(self, instance):
+        return token_response(self.user, self.refresh_token)
\ No newline at end of file
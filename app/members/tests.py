@@ -1,3 +1,509 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlparse
 
-# Create your tests here.
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from posts.models import Post, TimelineEntry
+from .authentication import AccessTokenAuthentication, TokenCache, token_cache
+from .backends import FacebookBackend
+from .forms import UserProfileForm
+from .models import RefreshToken, Relation, User
+from .tokens import read_access_token
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class GraphAPIServer(ThreadingMixIn, HTTPServer):
+    """
+    테스트에서 graph.facebook.com대신 사용하는 로컬 Graph API 서버
+     /oauth/access_token, /me, /picture/<version>.png에 응답하며
+     경로별 요청 수를 requests에 기록
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), GraphAPIHandler)
+        self.requests = Counter()
+        self.picture_version = 1
+        # 한 번씩 503으로 응답할 경로
+        self.unavailable = set()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+
+class GraphAPIHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.requests[url.path] += 1
+        if url.path in self.server.unavailable:
+            self.server.unavailable.discard(url.path)
+            return self.send(503, {})
+
+        if url.path == '/oauth/access_token':
+            if params.get('code') == 'invalid':
+                return self.send(400, {'error': {'message': 'Invalid verification code'}})
+            return self.send(200, {'access_token': 'token', 'token_type': 'bearer'})
+        if url.path == '/me':
+            picture_url = f'{self.server.base_url}/picture/{self.server.picture_version}.png'
+            return self.send(200, {
+                'id': '1234',
+                'first_name': 'Gildong',
+                'last_name': 'Hong',
+                'picture': {'data': {'url': picture_url}},
+            })
+        if url.path.startswith('/picture/'):
+            return self.send(200, png_bytes('red'), 'image/png')
+        self.send(404, {})
+
+
+class FacebookBackendTest(TransactionTestCase):
+    # 백그라운드 작업은 트랜잭션 커밋 후에 실행되므로 TransactionTestCase를 사용
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = GraphAPIServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.picture_version = 1
+        self.server.unavailable.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(
+            FACEBOOK_GRAPH_API_BASE=self.server.base_url,
+            BACKGROUND_TASKS_EAGER=True,
+            MEDIA_ROOT=self.media_root,
+        )
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def authenticate(self, code='code'):
+        return FacebookBackend().authenticate(None, facebook_request_token=code)
+
+    def test_creates_user_and_stores_profile_image(self):
+        user = self.authenticate()
+        user.refresh_from_db()
+        self.assertEqual(user.username, '1234')
+        self.assertEqual((user.first_name, user.last_name), ('Gildong', 'Hong'))
+        self.assertTrue(user.img_profile.name.startswith('user/1234'))
+        self.assertEqual(user.img_profile_source, f'{self.server.base_url}/picture/1.png')
+        self.assertEqual(self.server.requests['/picture/1.png'], 1)
+
+    def test_retry(self):
+        # /me와 사진은 일시적인 오류를 다시 시도
+        self.server.unavailable.update(['/me', '/picture/1.png'])
+        self.assertIsNotNone(self.authenticate())
+        self.assertEqual(self.server.requests['/me'], 2)
+        self.assertEqual(self.server.requests['/picture/1.png'], 2)
+        self.assertTrue(User.objects.get(username='1234').img_profile)
+
+    def test_access_token_not_retried(self):
+        # request token은 한 번만 교환할 수 있으므로 다시 시도하지 않음
+        self.server.unavailable.add('/oauth/access_token')
+        self.assertIsNone(self.authenticate())
+        self.assertEqual(self.server.requests['/oauth/access_token'], 1)
+        self.assertEqual(self.server.requests['/me'], 0)
+
+    def test_profile_image_downloaded_only_when_url_changes(self):
+        self.authenticate()
+        self.authenticate()
+        self.assertEqual(self.server.requests['/me'], 2)
+        self.assertEqual(self.server.requests['/picture/1.png'], 1)
+
+        self.server.picture_version = 2
+        self.authenticate()
+        self.assertEqual(self.server.requests['/picture/2.png'], 1)
+        self.assertEqual(
+            User.objects.get(username='1234').img_profile_source,
+            f'{self.server.base_url}/picture/2.png',
+        )
+
+    def test_graph_error_fails_login(self):
+        self.assertIsNone(self.authenticate('invalid'))
+        self.assertFalse(User.objects.exists())
+
+    def test_facebook_login_view(self):
+        response = self.client.get('/members/facebook-login/', {'code': 'code'})
+        self.assertRedirects(response, '/posts/', fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), User.objects.get().pk)
+
+
+class UserDetailTest(TestCase):
+    # ?fields= (config.fieldsets), 조건부 GET (config.conditional)
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='fieldset', introduce='소개')
+
+    def test_user_detail(self):
+        for path in [f'/api/members/user/{self.user.pk}/', f'/api/members/user/view/{self.user.pk}/']:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).json(),
+                                 {'pk': self.user.pk, 'username': 'fieldset'})
+                self.assertEqual(self.client.get(f'{path}?fields=username').json(),
+                                 {'username': 'fieldset'})
+                self.assertEqual(self.client.get(f'{path}?fields=email').status_code, 400)
+
+    def test_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/api/members/user/{self.user.pk}/?fields=pk')
+        sql = [query['sql'] for query in queries if 'members_user' in query['sql']][0]
+        self.assertNotIn('username', sql)
+        self.assertNotIn('introduce', sql)
+
+    def test_conditional_get(self):
+        # ETag (config.conditional)
+        path = f'/api/members/user/{self.user.pk}/'
+        etag = self.client.get(path)['ETag']
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(f'{path}?fields=pk', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.client.force_login(self.user)
+        etag = self.client.get('/api/members/user/profile/')['ETag']
+        self.assertEqual(self.client.get(
+            '/api/members/user/profile/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_profile(self):
+        self.client.force_login(self.user)
+        for path in ['/api/members/user/profile/', '/api/members/user/view/profile/']:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f'{path}?fields=pk').json(), {'pk': self.user.pk})
+
+
+class FollowTest(TestCase):
+    # 팔로워/팔로잉 수와 타임라인 (posts.models.TimelineEntryManager)
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.posts = [Post.objects.create(author=cls.author, photo='post/a.jpg') for _ in range(3)]
+
+    def assertCounts(self, user, follower_count, following_count):
+        user = User.objects.get(pk=user.pk)
+        self.assertEqual((user.follower_count, user.following_count),
+                         (follower_count, following_count))
+
+    def timeline(self, user):
+        return list(TimelineEntry.objects.posts_for(user).values_list('pk', flat=True))
+
+    def test_follow_toggle(self):
+        self.follower.follow_toggle(self.author)
+        self.assertCounts(self.author, 1, 0)
+        self.assertCounts(self.follower, 0, 1)
+        # 팔로우한 사용자의 기존 Post를 타임라인에 추가
+        self.assertEqual(self.timeline(self.follower), [post.pk for post in reversed(self.posts)])
+
+        self.follower.follow_toggle(self.author)
+        self.assertCounts(self.author, 0, 0)
+        self.assertCounts(self.follower, 0, 0)
+        self.assertEqual(self.timeline(self.follower), [])
+        with self.assertRaises(ValueError):
+            self.author.follow_toggle(self.author)
+
+    def test_follow_toggle_view(self):
+        url = f'/members/{self.author.pk}/follow-toggle/'
+        self.client.force_login(self.follower)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertCounts(self.author, 0, 0)
+
+        response = self.client.post(f'{url}?next=/members/profile/')
+        self.assertRedirects(response, '/members/profile/', fetch_redirect_response=False)
+        self.assertCounts(self.author, 1, 0)
+        # 다른 사이트로는 이동하지 않음 (두 번 토글하므로 팔로우 상태는 그대로)
+        for next_path in ['https://evil.example/', '//evil.example/']:
+            response = self.client.post(f"{url}?{urlencode({'next': next_path})}")
+            self.assertRedirects(response, '/posts/', fetch_redirect_response=False)
+        self.assertCounts(self.author, 1, 0)
+
+    def test_save_keeps_counters(self):
+        # 팔로우 전에 가져온 User를 저장해도 팔로워 수를 덮어쓰지 않음
+        stale = User.objects.get(pk=self.author.pk)
+        self.follower.follow_toggle(self.author)
+        form = UserProfileForm({'introduce': '수정'}, instance=stale)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        stale.save()
+        self.assertCounts(self.author, 1, 0)
+        self.assertEqual(User.objects.get(pk=self.author.pk).introduce, '수정')
+
+    def test_fan_out(self):
+        Relation.objects.create(from_user=self.follower, to_user=self.author)
+        post = Post.objects.create(author=self.author, photo='post/b.jpg')
+        TimelineEntry.objects.fan_out(post)
+        # 이미 추가된 항목이 있어도 실패하지 않음
+        TimelineEntry.objects.fan_out(post)
+        self.assertEqual(self.timeline(self.follower)[0], post.pk)
+        self.assertEqual(self.timeline(self.author), [post.pk])
+
+    def test_fan_out_races_with_follow(self):
+        # 기존 항목을 확인한 후 추가하기 전에 다른 요청(add_author_posts)이 같은 항목을 추가한 경우
+        post = Post.objects.create(author=self.author, photo='post/b.jpg')
+        Relation.objects.bulk_create([Relation(from_user=self.follower, to_user=self.author)])
+        bulk_create = TimelineEntry.objects.bulk_create
+        raced = []
+
+        def racing_bulk_create(entries, *args, **kwargs):
+            if not raced and any(entry.user_id == self.follower.pk for entry in entries):
+                raced.append(True)
+                TimelineEntry.objects.add_author_posts(self.follower, self.author)
+            return bulk_create(entries, *args, **kwargs)
+
+        with mock.patch.object(TimelineEntry.objects, 'bulk_create', racing_bulk_create):
+            TimelineEntry.objects.fan_out(post)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.follower, post=post).count(), 1)
+
+
+class TokenTest(TestCase):
+    # 서명된 access token과 refresh token의 발급/교체/폐기 (members.tokens)
+    profile_path = '/api/members/user/profile/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='token', password='password')
+
+    def login(self):
+        response = self.client.post(
+            '/api/members/auth-token/', {'username': 'token', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def refresh(self, refresh_token):
+        return self.client.post('/api/members/auth-token/refresh/', {'refresh_token': refresh_token})
+
+    def get_profile(self, access_token):
+        return self.client.get(self.profile_path, HTTP_AUTHORIZATION=f'Bearer {access_token}')
+
+    def test_access_token(self):
+        access_token = self.login()['access_token']
+        self.assertEqual(read_access_token(access_token), {'uid': self.user.pk, 'username': 'token'})
+        self.assertEqual(self.get_profile(access_token).json()['pk'], self.user.pk)
+
+        # 서명이 다르거나 다른 용도로 서명된 값
+        payload, signature = access_token.rsplit(':', 1)
+        self.assertIsNone(read_access_token(f'{payload}:{signature[::-1]}'))
+        self.assertIsNone(read_access_token(signing.dumps({'uid': self.user.pk, 'username': 'token'})))
+        self.assertEqual(self.get_profile('invalid').status_code, 401)
+        self.assertEqual(self.client.get(
+            self.profile_path, HTTP_AUTHORIZATION='Bearer a b').status_code, 401)
+
+        # ACCESS_TOKEN_LIFETIME이 지난 토큰
+        expired = time.time() + settings.ACCESS_TOKEN_LIFETIME + 1
+        with mock.patch('django.core.signing.time.time', return_value=expired):
+            self.assertIsNone(read_access_token(access_token))
+            self.assertEqual(self.get_profile(access_token).status_code, 401)
+
+    def test_access_token_user(self):
+        # access token의 User는 모든 필드를 캐시해두고 속성마다 DB를 조회하지 않음
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        access_token = self.login()['access_token']
+        request = RequestFactory().get(
+            self.profile_path, HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        authentication = AccessTokenAuthentication()
+        with self.assertNumQueries(1):
+            authentication.authenticate(request)
+        with self.assertNumQueries(0):
+            user, payload = authentication.authenticate(request)
+            self.assertEqual((user.pk, user.username, user.img_profile.name, user.is_staff),
+                             (self.user.pk, 'token', '', False))
+        self.assertEqual(payload['uid'], self.user.pk)
+
+        # 저장/삭제된 User는 다시 조회하고 비활성화/삭제된 사용자는 인증하지 않음
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        with self.assertRaisesMessage(AuthenticationFailed, '비활성화된 사용자입니다'):
+            authentication.authenticate(request)
+        user.delete()
+        with self.assertRaisesMessage(AuthenticationFailed, '존재하지 않는 사용자입니다'):
+            authentication.authenticate(request)
+
+    def test_unauthenticated(self):
+        # 첫 번째 인증 클래스(AccessTokenAuthentication)의 WWW-Authenticate로 401 응답
+        response = self.client.get(self.profile_path)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+    def test_rotate(self):
+        refresh_token = self.login()['refresh_token']
+        response = self.refresh(refresh_token)
+        self.assertEqual(response.status_code, 200)
+        tokens = response.json()
+        self.assertNotEqual(tokens['refresh_token'], refresh_token)
+        self.assertEqual(self.get_profile(tokens['access_token']).status_code, 200)
+        self.assertEqual(self.refresh('invalid').status_code, 401)
+
+        # 교체된 토큰이 다시 사용되면 같은 사용자의 모든 refresh token을 폐기
+        other_refresh_token = self.login()['refresh_token']
+        self.assertEqual(self.refresh(refresh_token).status_code, 401)
+        self.assertEqual(self.refresh(tokens['refresh_token']).status_code, 401)
+        self.assertEqual(self.refresh(other_refresh_token).status_code, 401)
+        self.assertFalse(RefreshToken.objects.filter(revoked_at__isnull=True).exists())
+
+    def test_expired_or_inactive(self):
+        refresh_token = self.login()['refresh_token']
+        RefreshToken.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.refresh(refresh_token).status_code, 401)
+
+        refresh_token = self.login()['refresh_token']
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(RefreshToken.objects.rotate(refresh_token))
+
+    def test_revoke(self):
+        refresh_token = self.login()['refresh_token']
+        path = '/api/members/auth-token/revoke/'
+        self.assertEqual(self.client.post(path, {}).status_code, 400)
+        self.assertEqual(self.client.post(path, {'refresh_token': refresh_token}).status_code, 204)
+        self.assertFalse(RefreshToken.objects.revoke(refresh_token))
+        self.assertEqual(self.refresh(refresh_token).status_code, 401)
+        # DB에는 hash값만 저장
+        self.assertFalse(RefreshToken.objects.filter(token_hash=refresh_token).exists())
+
+
+class TokenCacheTest(TestCase):
+    # 프로세스별 TTL/LRU 캐시와 Token인증 결과 캐시 (members.authentication)
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+
+    def test_ttl(self):
+        tokens = TokenCache(maxsize=10, timeout=60)
+        load = mock.Mock(side_effect=[(1, 'first'), (1, 'second')])
+        with mock.patch('members.authentication.time.monotonic', return_value=100):
+            self.assertEqual(tokens.get('key', load), 'first')
+        with mock.patch('members.authentication.time.monotonic', return_value=159):
+            self.assertEqual(tokens.get('key', load), 'first')
+        with mock.patch('members.authentication.time.monotonic', return_value=160):
+            self.assertEqual(tokens.get('key', load), 'second')
+        self.assertEqual(load.call_count, 2)
+
+    def test_lru(self):
+        tokens = TokenCache(maxsize=2, timeout=60)
+        for key in ['a', 'b']:
+            tokens.get(key, lambda: (1, key))
+        # 최근에 사용한 'a'는 남고 'b'가 삭제됨
+        tokens.get('a', mock.Mock())
+        tokens.get('c', lambda: (2, 'c'))
+        not_loaded = mock.Mock(side_effect=AssertionError)
+        self.assertEqual(tokens.get('a', not_loaded), 'a')
+        self.assertEqual(tokens.get('c', not_loaded), 'c')
+        self.assertEqual(tokens.get('b', lambda: (1, 'b2')), 'b2')
+
+        # 사용자 1의 항목('a'는 이미 삭제됨, 'b')만 삭제
+        tokens.invalidate_user(1)
+        self.assertEqual(tokens.get('c', not_loaded), 'c')
+        self.assertEqual(tokens.get('b', lambda: (1, 'b3')), 'b3')
+
+    def test_single_flight(self):
+        tokens = TokenCache(maxsize=10, timeout=60)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def load():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 1, 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(tokens.get('key', load)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_single_flight_error(self):
+        tokens = TokenCache(maxsize=10, timeout=60)
+        with self.assertRaises(ValueError):
+            tokens.get('key', mock.Mock(side_effect=ValueError))
+        # 예외는 저장하지 않음
+        self.assertEqual(tokens.get('key', lambda: (1, 'value')), 'value')
+
+    def test_invalidated_while_loading(self):
+        # 조회하는 동안 삭제(무효화)되었다면 조회한 값을 저장하지 않음
+        tokens = TokenCache(maxsize=10, timeout=60)
+
+        def load():
+            tokens.invalidate_user(1)
+            return 1, 'stale'
+
+        self.assertEqual(tokens.get('key', load), 'stale')
+        self.assertEqual(tokens.get('key', lambda: (1, 'fresh')), 'fresh')
+
+    def test_deleted_or_rotated_token(self):
+        user = User.objects.create_user(username='cached')
+        token = Token.objects.create(user=user)
+        path = '/api/members/user/profile/'
+
+        def get_profile(key):
+            return self.client.get(path, HTTP_AUTHORIZATION=f'Token {key}')
+
+        self.assertEqual(get_profile(token.key).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_profile(token.key).status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+        # 캐시된 토큰을 삭제(교체)하면 거부됨
+        token.delete()
+        rotated = Token.objects.create(user=user)
+        self.assertEqual(get_profile(token.key).status_code, 401)
+        self.assertEqual(get_profile(rotated.key).status_code, 200)
+
+        # 사용자가 비활성화되면 다시 조회
+        user.is_active = False
+        user.save()
+        self.assertEqual(get_profile(rotated.key).status_code, 401)
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core import signing
+
+# 다른 용도의 서명값을 access token으로 사용할 수 없도록 구분
+ACCESS_TOKEN_SALT = 'members.tokens.access'
+
+
+def make_access_token(user):
+    """
+    user의 pk, username을 담고 SECRET_KEY로 HMAC서명한 access token
+     DB에 저장하지 않으므로 검증시에도 DB를 조회하지 않음
+     만료되기 전에는 폐기할 수 없으므로 settings.ACCESS_TOKEN_LIFETIME은 짧게 유지
+    """
+    return signing.dumps(
+        {'uid': user.pk, 'username': user.username},
+        salt=ACCESS_TOKEN_SALT,
+        compress=True,
+    )
+
+
+def read_access_token(token):
+    # 서명이 올바르고 ACCESS_TOKEN_LIFETIME이 지나지 않았다면 담긴 값(dict), 아니라면 None
+    #  (만료시간은 서명에 포함된 발급시간을 기준으로 검사)
+    try:
+        return signing.loads(
+            token,
+            salt=ACCESS_TOKEN_SALT,
+            max_age=settings.ACCESS_TOKEN_LIFETIME,
+        )
+    except signing.BadSignature:
+        return None
+
+
+def issue_tokens(user):
+    # 로그인/refresh시 응답할 토큰 정보
+    from .models import RefreshToken
+    return token_response(user, RefreshToken.objects.issue(user))
+
+
+def token_response(user, refresh_token):
+    return {
+        'access_token': make_access_token(user),
+        'token_type': 'Bearer',
+        'expires_in': settings.ACCESS_TOKEN_LIFETIME,
+        'refresh_token': refresh_token,
+    }
@@ -9,4 +9,5 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('profile/', views.profile, name='profile'),
     path('facebook-login/', views.facebook_login, name='facebook-login'),
+    path('<int:user_pk>/follow-toggle/', views.follow_toggle, name='follow-toggle'),
 ]
\ No newline at end of file
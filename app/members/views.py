@@ -1,7 +1,9 @@
 from django.contrib import messages
 from django.contrib.auth import login, logout, get_user_model, authenticate
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.http import is_safe_url
+from django.views.decorators.http import require_POST
 
 from .forms import LoginForm, SignupForm, UserProfileForm
 
@@ -153,6 +155,26 @@ def profile(request):
     return render(request, 'members/profile.html', context)
 
 
+@login_required
+@require_POST
+def follow_toggle(request, user_pk):
+    # URL: /members/<user_pk>/follow-toggle/
+    # POST method에 대해서만 처리
+    #  request.user가 user_pk에 해당하는 User를 팔로우/언팔로우
+    #  처리 후 'next'값 또는 posts:post-list로 이동
+    #  'next'가 다른 사이트의 URL이라면 사용하지 않음
+    user = get_object_or_404(User, pk=user_pk)
+    if user != request.user:
+        request.user.follow_toggle(user)
+    next_path = request.GET.get('next')
+    if next_path and is_safe_url(
+            next_path,
+            allowed_hosts={request.get_host()},
+            require_https=request.is_secure()):
+        return redirect(next_path)
+    return redirect('posts:post-list')
+
+
 def facebook_login(request):
     # FacebookBackend를 사용하는 authenticate함수
     user = authenticate(request, facebook_request_token=request.GET.get('code'))
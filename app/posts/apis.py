@@ -1,60 +1,224 @@
 import json
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from rest_framework import permissions, generics, status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import HashTag, Post, PostLike
+from config.conditional import ConditionalGetMixin, make_etag
+from config.fieldsets import FieldsetMixin
+from config.response_cache import AnonymousResponseCacheMixin
+from . import payloads
+from .autocomplete import tag_index
+from .like_buffer import like_buffer
+from .models import Comment, Post, PostHashTag, PostLike, TimelineEntry
+from .pagination import PostCursorPagination, TagPostCursorPagination
 from .serializers import PostSerializer, PostLikeSerializer
+from .uploads import photo_upload_handlers
 from .permissions import IsUser
 
 
+def pending_likes(request, post_pks):
+    # 요청한 사용자의 아직 DB에 기록되지 않은 좋아요 (posts.like_buffer)
+    #  version에 반영되지 않았지만 is_like에는 반영되므로 ETag에 포함
+    if not request.user.is_authenticated or not like_buffer.enabled():
+        return ()
+    return tuple(sorted(like_buffer.pending(request.user.pk, post_pks).items()))
+
+
+def comment_authors(fieldset, post_pks):
+    # 확장된 댓글에 포함되는 작성자의 username
+    #  User의 변경은 Post.version에 반영되지 않으므로 ETag에 포함
+    if not post_pks or not fieldset.expanded('comments'):
+        return ()
+    return tuple(
+        Comment.objects
+        .filter(post_id__in=post_pks)
+        .order_by('pk')
+        .values_list('author_id', 'author__username')
+    )
+
+
 # generics.ListCreateAPIView
-class PostList(generics.ListCreateAPIView):
+class PostList(AnonymousResponseCacheMixin, ConditionalGetMixin, FieldsetMixin,
+               generics.ListCreateAPIView):
+    # ?fields=, ?expand=로 응답의 필드를 선택 (config.fieldsets)
+    # 비로그인 사용자의 응답은 캐시 (config.response_cache)
+    # 페이지에 포함될 Post들의 (pk, version, 작성자)와 댓글 작성자로 ETag를 계산 (config.conditional)
+    #  페이지의 구성(삭제등)을 수정시간으로 나타낼 수 없으므로 Last-Modified는 사용하지 않음
     queryset = Post.objects\
         .select_related('author')\
         .prefetch_related('comments', 'comments__author')
     serializer_class = PostSerializer
+    # 전체 Post를 한 번에 돌려주지 않고 커서 단위로 나누어 돌려줌
+    #  prefetch_related는 잘라낸 페이지에 대해서만 실행됨
+    pagination_class = PostCursorPagination
+    response_cache_generations = ('posts', 'comments', 'likes')
 
     permission_classes = (
         permissions.IsAuthenticatedOrReadOnly,
     )
 
+    def initial(self, request, *args, **kwargs):
+        # 인증(CSRF검사)과정에서 요청 body를 읽기 전에
+        #  업로드된 사진을 임시파일에 나누어 기록하는 upload handler로 교체
+        if request.method == 'POST':
+            request._request.upload_handlers = photo_upload_handlers(request._request)
+        super().initial(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_validators(self):
+        # 응답과 같은 조건으로 페이지를 나누되 (pk, version, 작성자)만 가져옴
+        rows = self.paginate_queryset(self.filter_queryset(
+            Post.objects.values('pk', 'version', 'author__username')))
+        post_pks = [row['pk'] for row in rows]
+        etag = make_etag(
+            self.request,
+            tuple((row['pk'], row['version'], row['author__username']) for row in rows),
+            self.paginator.has_next,
+            self.paginator.has_previous,
+            pending_likes(self.request, post_pks),
+            comment_authors(self.get_fieldset() or payloads.default_fieldset(), post_pks),
+        )
+        return etag, None
+
+    def list(self, request, *args, **kwargs):
+        # JSON요청은 Serializer대신 .values() row로 같은 응답을 만듦 (posts.payloads)
+        if not payloads.accepts_json(request):
+            return super().list(request, *args, **kwargs)
+        fieldset = self.get_fieldset()
+        rows = self.paginate_queryset(
+            payloads.post_rows(self.filter_queryset(Post.objects.all()), fieldset))
+        data = payloads.PostPayloadBuilder(request, fieldset).build(rows)
+        return payloads.json_response(self.get_paginated_response(data).data)
+
+
+class HomeTimeline(generics.ListAPIView):
+    # 요청한 사용자와 팔로우하는 사용자들의 Post목록
+    serializer_class = PostSerializer
+    pagination_class = PostCursorPagination
+
+    permission_classes = (
+        permissions.IsAuthenticated,
+    )
+
+    def get_queryset(self):
+        return TimelineEntry.objects.posts_for(self.request.user)\
+            .select_related('author')\
+            .prefetch_related('comments', 'comments__author')
 
-class PostDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all()
+
+class PostDetail(ConditionalGetMixin, FieldsetMixin, generics.RetrieveUpdateDestroyAPIView):
+    # Post.version과 작성자, 댓글 작성자로 ETag를 계산 (config.conditional)
+    #  version은 수정, 좋아요, 댓글, 크기별 사진 생성시 갱신됨
+    #  modified_at은 작성자의 변경을 알 수 없고 초 단위이므로 Last-Modified는 사용하지 않음
+    queryset = Post.objects.select_related('author')\
+        .prefetch_related('comments', 'comments__author')
     serializer_class = PostSerializer
 
     permission_classes = (
         permissions.IsAuthenticatedOrReadOnly,
     )
 
+    def get_validators(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        pk = self.kwargs[lookup_url_kwarg]
+        post = self.filter_queryset(Post.objects.all())\
+            .filter(**{self.lookup_field: pk})\
+            .values_list('pk', 'version', 'author__username')\
+            .first()
+        if post is None:
+            return None, None
+        etag = make_etag(
+            self.request,
+            post,
+            pending_likes(self.request, [post[0]]),
+            comment_authors(self.get_fieldset() or payloads.default_fieldset(), [post[0]]),
+        )
+        return etag, None
+
+    def retrieve(self, request, *args, **kwargs):
+        # JSON요청은 Serializer대신 .values() row로 같은 응답을 만듦 (posts.payloads)
+        if not payloads.accepts_json(request):
+            return super().retrieve(request, *args, **kwargs)
+        fieldset = self.get_fieldset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            payloads.post_rows(self.filter_queryset(Post.objects.all()), fieldset),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(request, row)
+        data = payloads.PostPayloadBuilder(request, fieldset).build([row])[0]
+        return payloads.json_response(data)
+
+
+class TagPostList(generics.ListAPIView):
+    # tag_name의 HashTag를 가진 Comment가 있는 Post목록
+    #  PostHashTag(태그별 Post 인덱스)를 사용해 커서 단위로 가져옴
+    serializer_class = PostSerializer
+    pagination_class = TagPostCursorPagination
+
+    def get_queryset(self):
+        return PostHashTag.objects.posts_for(self.kwargs['tag_name'])\
+            .select_related('author')\
+            .prefetch_related('comments', 'comments__author')
+
 
 class PostLikeCreateDestroy(APIView):
     permission_classes = (
         permissions.IsAuthenticated,
     )
 
+    # Post와 PostLike를 먼저 조회하지 않고
+    #  PostLike.objects.like/unlike의 조건부 INSERT/DELETE 결과로 응답
+    # 좋아요 버퍼를 사용한다면 버퍼에 추가한 후 202로 응답 (posts.like_buffer)
+    #  이미 좋아요를 누른 경우(400)와 누르지 않은 경우(404)는 버퍼와 DB를 합친 상태로 판단
     def post(self, request, post_pk):
-        serializer = PostLikeSerializer(
-            data={**request.data, 'post': post_pk},
-            context={'request': request},
+        if like_buffer.enabled():
+            get_object_or_404(Post.objects.only('pk'), pk=post_pk)
+            if like_buffer.is_liked(request.user.pk, post_pk):
+                return Response(
+                    {'non_field_errors': ['이미 좋아요를 누른 포스트입니다']},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            like_buffer.add(request.user.pk, post_pk, True)
+            serializer = PostLikeSerializer(
+                PostLike(post_id=post_pk, user=request.user),
+                context={'request': request},
+            )
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        try:
+            post_like, like_count = PostLike.objects.like(post_pk, request.user)
+        except Post.DoesNotExist:
+            raise Http404
+        if post_like is None:
+            return Response(
+                {'non_field_errors': ['이미 좋아요를 누른 포스트입니다']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = PostLikeSerializer(post_like, context={'request': request})
+        return Response(
+            {**serializer.data, 'like_count': like_count},
+            status=status.HTTP_201_CREATED,
         )
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, post_pk):
-        post = get_object_or_404(Post, pk=post_pk)
-        post_like = get_object_or_404(
-            PostLike, post=post, user=request.user)
-        post_like.delete()
+        if like_buffer.enabled():
+            get_object_or_404(Post.objects.only('pk'), pk=post_pk)
+            if not like_buffer.is_liked(request.user.pk, post_pk):
+                raise Http404
+            like_buffer.add(request.user.pk, post_pk, False)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        try:
+            deleted, like_count = PostLike.objects.unlike(post_pk, request.user)
+        except Post.DoesNotExist:
+            raise Http404
+        if not deleted:
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -63,6 +227,16 @@ class PostLikeCreateAPIView(generics.CreateAPIView):
     serializer_class = PostLikeSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    def create(self, request, *args, **kwargs):
+        if not like_buffer.enabled():
+            return super().create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        post = serializer.validated_data['post']
+        like_buffer.add(request.user.pk, post.pk, True)
+        serializer = self.get_serializer(PostLike(post=post, user=request.user))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
 
 class PostLikeDestroyAPIView(generics.DestroyAPIView):
     queryset = PostLike.objects.all()
@@ -72,6 +246,13 @@ class PostLikeDestroyAPIView(generics.DestroyAPIView):
         IsUser,
     )
 
+    def perform_destroy(self, instance):
+        if like_buffer.enabled():
+            # 버퍼에 남아있는 좋아요가 나중에 다시 생성하지 않도록 버퍼를 통해 삭제
+            like_buffer.add(instance.user_id, instance.post_id, False)
+        else:
+            instance.delete()
+
 
 def tag_search(request):
     # URL: '/posts/api/tag-search/'
@@ -82,9 +263,16 @@ def tag_search(request):
     #  HashTag목록을 가져와 각 항목을 dict로 변경
     #   dict요소의 list로 만들어 HttpResponse에 리턴
     #  ex) [{}, {}, {}]
+    #  DB를 조회하지 않고 프로세스별 메모리 인덱스(posts.autocomplete)에서
+    #   keyword로 시작하는 태그 중 많이 사용된 순서로 최대 limit개를 가져옴
     keyword = request.GET.get('keyword')
+    try:
+        limit = int(request.GET.get('limit', settings.HASHTAG_AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = settings.HASHTAG_AUTOCOMPLETE_LIMIT
+    limit = max(1, min(limit, settings.HASHTAG_AUTOCOMPLETE_MAX_LIMIT))
     tags = []
     if keyword:
-        tags = list(HashTag.objects.filter(name__istartswith=keyword).values())
+        tags = tag_index.search(keyword, limit)
     result = json.dumps(tags)
     return HttpResponse(result, content_type='application/json')
\ No newline at end of file
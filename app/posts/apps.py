@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = '포스트'
+
+    def ready(self):
+        # Post삭제시 비로그인 사용자 응답 캐시의 세대를 증가시키도록 signal을 연결
+        from .models import connect_signals
+        connect_signals()
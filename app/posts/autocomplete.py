@@ -0,0 +1,141 @@
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import HashTag
+
+
+class HashTagIndex:
+    """
+    해시태그 자동완성에 사용하는 프로세스별 메모리 인덱스
+     소문자 태그명을 정렬된 list로 가지고 있다가
+     bisect로 접두어에 해당하는 범위를 찾고, 그 중 사용 횟수가 많은 태그를 돌려줌
+
+    - 처음 검색할 때 전체 HashTag를 읽어서 만들어짐 (lazy)
+    - HASHTAG_AUTOCOMPLETE_REFRESH_INTERVAL초마다 마지막으로 읽은 pk이후에 생긴 HashTag만 추가
+    - HASHTAG_AUTOCOMPLETE_RELOAD_INTERVAL초마다 전체를 다시 읽어서 사용 횟수를 갱신
+    - 범위가 넓은 짧은 접두어(SHORT_PREFIX_LENGTH글자 이하)는 상위 결과를 미리 계산해둠
+    """
+    SHORT_PREFIX_LENGTH = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (keys, tags, usages)
+        #  keys: 정렬된 소문자 태그명 list
+        #  tags: keys와 같은 순서의 {'id': pk, 'name': name} list
+        #  usages: keys와 같은 순서의 사용 횟수 list
+        #  검색중인 다른 스레드에 영향을 주지 않도록 갱신시에는 새 tuple로 교체
+        self._data = None
+        # {짧은 접두어: [(-사용 횟수, 소문자 태그명, tag), ...]}
+        self._top = {}
+        self._last_pk = 0
+        self._refreshed_at = 0
+        self._reloaded_at = 0
+        # 접두어별 검색 결과 캐시, 인덱스가 갱신되면 비움
+        self._results = {}
+
+    @staticmethod
+    def _rows(queryset):
+        return queryset\
+            .annotate(usage=Count('comment'))\
+            .order_by('pk')\
+            .values_list('pk', 'name', 'usage')
+
+    def _build(self, rows):
+        rows = sorted(rows, key=lambda row: row[1].lower())
+        keys = [name.lower() for _, name, _ in rows]
+        tags = [{'id': pk, 'name': name} for pk, name, _ in rows]
+        usages = [usage for _, _, usage in rows]
+        return keys, tags, usages
+
+    def _add_top(self, top, key, tag, usage):
+        for length in range(1, min(len(key), self.SHORT_PREFIX_LENGTH) + 1):
+            items = top.setdefault(key[:length], [])
+            bisect.insort(items, (-usage, key, tag['id'], tag))
+            del items[settings.HASHTAG_AUTOCOMPLETE_MAX_LIMIT:]
+
+    def _reload(self):
+        rows = list(self._rows(HashTag.objects.all()))
+        data = self._build(rows)
+        top = {}
+        for key, tag, usage in zip(*data):
+            self._add_top(top, key, tag, usage)
+        # 검색중인 다른 스레드가 서로 다른 시점의 data와 top을 보지 않도록 함께 교체
+        self._data, self._top = data, top
+        self._last_pk = max((row[0] for row in rows), default=0)
+        self._refreshed_at = self._reloaded_at = time.monotonic()
+        self._results = {}
+
+    def _refresh(self):
+        # 마지막으로 읽은 이후에 새로 생긴 HashTag만 읽어서 추가
+        #  (pk순서와 다르게 커밋되어 빠진 태그는 다음 전체 갱신때 추가됨)
+        rows = list(self._rows(HashTag.objects.filter(pk__gt=self._last_pk)))
+        self._refreshed_at = time.monotonic()
+        if not rows:
+            return
+        keys, tags, usages = (list(items) for items in self._data)
+        top = {prefix: list(items) for prefix, items in self._top.items()}
+        for pk, name, usage in rows:
+            key = name.lower()
+            tag = {'id': pk, 'name': name}
+            index = bisect.bisect_right(keys, key)
+            keys.insert(index, key)
+            tags.insert(index, tag)
+            usages.insert(index, usage)
+            self._add_top(top, key, tag, usage)
+        self._data, self._top = (keys, tags, usages), top
+        self._last_pk = max(self._last_pk, rows[-1][0])
+        self._results = {}
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        reload = self._data is None or \
+            now - self._reloaded_at > settings.HASHTAG_AUTOCOMPLETE_RELOAD_INTERVAL
+        refresh = now - self._refreshed_at > settings.HASHTAG_AUTOCOMPLETE_REFRESH_INTERVAL
+        if not (reload or refresh):
+            return
+        # 다른 스레드가 이미 갱신중이라면 기다리지 않고 기존 인덱스를 사용
+        #  (인덱스가 아직 없는 경우에만 기다림)
+        if not self._lock.acquire(blocking=self._data is None):
+            return
+        try:
+            if self._data is None or reload:
+                self._reload()
+            else:
+                self._refresh()
+        finally:
+            self._lock.release()
+
+    def search(self, keyword, limit):
+        self.ensure_fresh()
+        prefix = keyword.lower()
+        cache_key = (prefix, limit)
+        results = self._results.get(cache_key)
+        if results is not None:
+            return results
+
+        if len(prefix) <= self.SHORT_PREFIX_LENGTH:
+            results = [item[-1] for item in self._top.get(prefix, [])[:limit]]
+        else:
+            keys, tags, usages = self._data
+            start = bisect.bisect_left(keys, prefix)
+            end = bisect.bisect_left(keys, prefix + '\uffff', start)
+            # 사용 횟수가 많은 순서, 같다면 이름순
+            indexes = heapq.nsmallest(
+                limit,
+                range(start, end),
+                key=lambda index: (-usages[index], keys[index], index),
+            )
+            results = [tags[index] for index in indexes]
+
+        if len(self._results) >= settings.HASHTAG_AUTOCOMPLETE_CACHE_SIZE:
+            self._results = {}
+        self._results[cache_key] = results
+        return results
+
+
+tag_index = HashTagIndex()
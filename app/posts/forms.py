@@ -1,10 +1,11 @@
 from django import forms
 
 from .models import Post, Comment
+from .uploads import PhotoField
 
 
 class PostCreateForm(forms.Form):
-    photo = forms.ImageField(
+    photo = PhotoField(
         # 이 필드는 파일입력 위젯을 사용
         widget=forms.FileInput(
             # HTML위젯의 속성 설정
@@ -72,6 +73,15 @@ class CommentCreateForm(forms.Form):
 class PostForm(forms.ModelForm):
     # 1. posts.views.post_create
     # 2. templates/posts/post_create.html
+    # 사진 전체를 decode하지 않고 header만 검사하는 필드
+    photo = PhotoField(
+        label='사진',
+        widget=forms.ClearableFileInput(
+            attrs={
+                'class': 'form-control-file',
+            }
+        )
+    )
     comment = forms.CharField(
         label='내용',
         required=False,
@@ -0,0 +1,312 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+
+from config.routers import use_primary
+from .models import Post, PostLike
+
+logger = logging.getLogger(__name__)
+
+
+class LikeBuffer:
+    """
+    좋아요/좋아요 취소를 바로 DB에 기록하지 않고 프로세스별로 모아두었다가 한 번에 기록하는 버퍼
+     (settings.POST_LIKE_BUFFER_ENABLED가 True일 때만 사용)
+
+    - {(user_pk, post_pk): 좋아요 여부}로 저장하므로 같은 사용자/Post에 대해서는 마지막 요청만 남음
+    - POST_LIKE_BUFFER_FLUSH_INTERVAL초마다, 또는 POST_LIKE_BUFFER_MAX_SIZE개가 쌓이면
+      Post별로 bulk_create/DELETE하고 좋아요 수를 한 번에 증감
+    - 버퍼에 추가하기 전에 journal 파일에 기록(fsync)하므로 응답한 요청은 프로세스가 종료되어도 유실되지 않음
+      journal 파일은 flock으로 잠가두며, 잠기지 않은 journal은 비정상 종료된 프로세스의 것이므로
+      다른 프로세스가 시작할 때 다시 적용
+    - 프로세스가 정상 종료될 때(atexit) 남은 내용을 기록
+    - 아직 기록되지 않은 내용(기록중인 내용 포함)은 ViewerState에서 DB값 위에 덮어써서 보여줌
+      (Post.like_count는 기록된 후에 반영됨)
+    - journal 파일을 열 수 없다면 버퍼를 사용하지 않고 바로 DB에 기록
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        # {(user_pk, post_pk): 좋아요 여부}
+        self._pending = {}
+        # flush()가 버퍼에서 꺼내서 DB에 기록하고 있는 내용 (기록이 끝날 때까지 pending()에 포함)
+        self._flushing = {}
+        self._journal = None
+        # 버퍼에서 꺼냈지만 아직 DB에 기록되지 않은 내용의 journal 파일 목록
+        self._rotated = []
+        self._rotations = 0
+
+    @staticmethod
+    def enabled():
+        return settings.POST_LIKE_BUFFER_ENABLED
+
+    def _journal_path(self, suffix='log'):
+        return os.path.join(
+            settings.POST_LIKE_BUFFER_JOURNAL_DIR, f'{self._pid}.{suffix}')
+
+    def _open_journal(self):
+        # 새 journal을 열고 잠금, 실패하면 None (add()는 버퍼를 거치지 않고 바로 기록)
+        try:
+            journal = self._open_locked(self._journal_path())
+        except OSError:
+            logger.exception('Failed to open post like journal')
+            return None
+        if journal is None:
+            logger.error('Post like journal is locked by another process: %s',
+                         self._journal_path())
+        return journal
+
+    @staticmethod
+    def _open_locked(path, create=True):
+        # 다른 프로세스(또는 같은 프로세스의 다른 파일 객체)가 잠근 파일이라면 None
+        #  create=False(복구)라면 파일을 새로 만들지 않고, 없거나 잠그는 사이에
+        #  삭제된 경우(다른 프로세스가 기록을 마친 journal)에도 None
+        flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT if create else 0)
+        try:
+            fd = os.open(path, flags, 0o666)
+        except FileNotFoundError:
+            if create:
+                raise
+            return None
+        f = os.fdopen(fd, 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if not create and not os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                raise FileNotFoundError(path)
+        except OSError:
+            f.close()
+            return None
+        return f
+
+    def _start(self):
+        # 프로세스별로 처음 사용할 때 (fork된 worker에서도) journal과 flush 스레드를 준비
+        # self._lock을 가진 상태에서 호출
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._pending = {}
+        self._flushing = {}
+        self._rotated = []
+        os.makedirs(settings.POST_LIKE_BUFFER_JOURNAL_DIR, exist_ok=True)
+        # 같은 pid를 쓰던 프로세스의 journal이 남아있을 수 있으므로 먼저 복구한 후 journal을 엶
+        self.recover()
+        self._journal = self._open_journal()
+        threading.Thread(
+            target=self._run,
+            name='post-like-buffer',
+            daemon=True,
+        ).start()
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        pid = self._pid
+        while pid == os.getpid():
+            self._wakeup.wait(settings.POST_LIKE_BUFFER_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush post likes')
+            finally:
+                connections.close_all()
+
+    def add(self, user_pk, post_pk, like):
+        """
+        좋아요(like=True) 또는 좋아요 취소(like=False)를 버퍼에 추가
+         journal에 기록된 후에 리턴
+        """
+        with self._lock:
+            self._start()
+            if self._journal is None:
+                self._journal = self._open_journal()
+            if self._journal is not None:
+                self._journal.write(json.dumps([user_pk, post_pk, like]) + '\n')
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+                self._pending[(user_pk, post_pk)] = like
+                if len(self._pending) >= settings.POST_LIKE_BUFFER_MAX_SIZE:
+                    self._wakeup.set()
+                return
+        self._write_through(user_pk, post_pk, like)
+
+    def _write_through(self, user_pk, post_pk, like):
+        # journal없이 바로 DB에 기록
+        #  버퍼에 남아있는 같은 키의 이전 요청이 나중에 덮어쓰지 않도록
+        #  flush와 동시에 실행되지 않게 하고 버퍼에서 제거
+        with self._flush_lock:
+            with self._lock:
+                self._pending.pop((user_pk, post_pk), None)
+            self.apply({(user_pk, post_pk): like})
+
+    def is_liked(self, user_pk, post_pk):
+        # 버퍼와 DB를 합친 현재 좋아요 여부
+        like = self.pending(user_pk, [post_pk]).get(post_pk)
+        if like is None:
+            like = PostLike.objects.filter(user_id=user_pk, post_id=post_pk).exists()
+        return like
+
+    def toggle(self, user_pk, post_pk):
+        # 버퍼와 DB를 합친 현재 상태의 반대로 변경, 변경된 좋아요 여부를 리턴
+        like = not self.is_liked(user_pk, post_pk)
+        self.add(user_pk, post_pk, like)
+        return like
+
+    def pending(self, user_pk, post_pks):
+        # 아직 DB에 기록되지 않은 {post_pk: 좋아요 여부}
+        #  버퍼의 내용이 기록중인 내용보다 나중의 요청
+        with self._lock:
+            if not self._pending and not self._flushing:
+                return {}
+            result = {}
+            for post_pk in post_pks:
+                key = (user_pk, post_pk)
+                like = self._pending.get(key, self._flushing.get(key))
+                if like is not None:
+                    result[post_pk] = like
+            return result
+
+    def flush(self):
+        """
+        버퍼의 내용을 DB에 기록
+         기록하는 동안 들어오는 요청은 새 버퍼와 새 journal에 기록됨
+         실패하면 꺼낸 내용을 (그 사이에 들어온 요청보다 우선하지 않도록) 버퍼에 되돌림
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._pid != os.getpid() or not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+                self._rotate()
+            try:
+                self.apply(batch)
+            except Exception:
+                with self._lock:
+                    for key, like in batch.items():
+                        self._pending.setdefault(key, like)
+                    self._flushing = {}
+                raise
+            # 기록된 내용의 journal은 삭제 (실패했던 이전 journal의 내용도 batch에 포함되어 있음)
+            with self._lock:
+                self._flushing = {}
+                rotated, self._rotated = self._rotated, []
+            for path, f in rotated:
+                os.remove(path)
+                f.close()
+            return len(batch)
+
+    def shutdown(self):
+        # 프로세스 종료시 남은 내용을 기록하고, 모두 기록되었다면 journal을 삭제
+        if self._pid != os.getpid():
+            return
+        self.flush()
+        with self._lock:
+            if not self._pending and not self._rotated:
+                if self._journal is not None:
+                    os.remove(self._journal_path())
+                    self._journal.close()
+                    self._journal = None
+                self._pid = None
+
+    def _rotate(self):
+        # 현재 journal을 기록중인 파일로 이름을 바꾸고 새 journal을 엶
+        #  열어둔 파일 객체의 잠금은 이름을 바꿔도 유지됨
+        if self._journal is not None:
+            self._rotations += 1
+            path = self._journal_path(f'{self._rotations}.flushing')
+            os.rename(self._journal_path(), path)
+            self._rotated.append((path, self._journal))
+        self._journal = self._open_journal()
+
+    @classmethod
+    def apply(cls, batch):
+        """
+        {(user_pk, post_pk): 좋아요 여부}를 DB에 기록
+         Post별로 이미 있는 PostLike는 제외하고 bulk_create, 취소는 DELETE문 하나로 처리하며
+         실제로 생성/삭제된 수만큼 좋아요 수를 증감
+         같은 내용을 여러 번 적용해도 결과가 같음 (journal 복구시 사용)
+        """
+        likes = defaultdict(set)
+        unlikes = defaultdict(set)
+        for (user_pk, post_pk), like in batch.items():
+            (likes if like else unlikes)[post_pk].add(user_pk)
+        # 그 사이에 삭제된 Post는 제외 (방금 생성된 Post도 읽을 수 있도록 primary DB에서 읽음)
+        with use_primary():
+            post_pks = set(Post.objects.filter(
+                pk__in=set(likes) | set(unlikes),
+            ).values_list('pk', flat=True))
+
+        with transaction.atomic():
+            for post_pk in post_pks & set(unlikes):
+                deleted, _ = PostLike.objects.filter(
+                    post_id=post_pk,
+                    user_id__in=unlikes[post_pk],
+                ).delete()
+                if deleted:
+                    Post.update_counters(post_pk, like_count=-deleted)
+            for post_pk in post_pks & set(likes):
+                try:
+                    with transaction.atomic():
+                        cls._bulk_like(post_pk, likes[post_pk])
+                except IntegrityError:
+                    # 다른 프로세스가 그 사이에 같은 PostLike를 생성한 경우 하나씩 처리
+                    for user_pk in likes[post_pk]:
+                        PostLike.objects.like(post_pk, user_pk)
+
+    @staticmethod
+    def _bulk_like(post_pk, user_pks):
+        existing = set(PostLike.objects.filter(
+            post_id=post_pk,
+            user_id__in=user_pks,
+        ).values_list('user_id', flat=True))
+        created = PostLike.objects.bulk_create([
+            PostLike(post_id=post_pk, user_id=user_pk)
+            for user_pk in user_pks - existing
+        ])
+        if created:
+            Post.update_counters(post_pk, like_count=len(created))
+
+    def recover(self):
+        # 잠기지 않은(비정상 종료된 프로세스의) journal을 순서대로 읽어서 다시 적용
+        pattern = os.path.join(settings.POST_LIKE_BUFFER_JOURNAL_DIR, '*')
+        paths = []
+        for path in glob.glob(pattern):
+            try:
+                paths.append((os.path.getmtime(path), path))
+            except OSError:
+                # 그 사이에 다른 프로세스가 기록을 마치고 삭제한 journal
+                continue
+        for _, path in sorted(paths):
+            f = self._open_locked(path, create=False)
+            if f is None:
+                continue
+            try:
+                batch = {}
+                with open(path) as lines:
+                    for line in lines:
+                        try:
+                            user_pk, post_pk, like = json.loads(line)
+                        except ValueError:
+                            # 기록하던 중 종료되어 잘린 줄 (응답하지 않은 요청)
+                            continue
+                        batch[(user_pk, post_pk)] = like
+                if batch:
+                    self.apply(batch)
+                os.remove(path)
+                logger.info('Recovered %d post likes from %s', len(batch), path)
+            finally:
+                f.close()
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,238 @@
+import io
+import random
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from posts.models import Comment, HashTag, Post, PostHashTag, PostLike
+
+User = get_user_model()
+
+# 해시태그/댓글 내용을 만들 때 사용하는 음절과 단어
+SYLLABLES = [
+    'ka', 'ri', 'mo', 'su', 'ne', 'to', 'ha', 'yu', 'mi', 'ro',
+    'na', 'se', 'ko', 'da', 'pi', 'ju', 'bo', 'le', 'ga', 'zi',
+]
+WORDS = [
+    '오늘', '여행', '맛집', '카페', '주말', '사진', '좋아요', '최고', '날씨', '친구',
+    'daily', 'love', 'photo', 'food', 'travel', 'coffee', 'good', 'nice',
+]
+
+
+class ZipfSampler:
+    # 0 ~ n-1 중 k번째 값이 1 / (k + 1) ** s에 비례하는 확률로 선택됨
+    def __init__(self, rng, n, s):
+        self.rng = rng
+        self.population = range(n)
+        self.cum_weights = list(accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+    def sample(self, k=1):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+
+class Command(BaseCommand):
+    help = '벤치마크/부하테스트용 데이터(사용자, 사진이 있는 Post, 해시태그가 있는 댓글, 좋아요) 생성'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=3000)
+        parser.add_argument('--likes', type=int, default=5000)
+        parser.add_argument('--hashtags', type=int, default=300)
+        parser.add_argument(
+            '--tags-per-comment',
+            type=int,
+            default=3,
+            help='댓글 1개에 포함될 수 있는 최대 해시태그 수',
+        )
+        parser.add_argument(
+            '--tag-zipf',
+            type=float,
+            default=1.1,
+            help='해시태그 사용 빈도 분포의 Zipf 지수',
+        )
+        parser.add_argument(
+            '--post-zipf',
+            type=float,
+            default=0.7,
+            help='Post별 댓글/좋아요 수 분포의 Zipf 지수',
+        )
+        parser.add_argument(
+            '--photos',
+            type=int,
+            default=20,
+            help='생성할 사진 파일 수 (Post들이 나누어 사용)',
+        )
+        parser.add_argument('--photo-size', type=int, default=1080)
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='생성할 사용자명, 사진 파일명에 붙일 접두어',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='한 번의 bulk_create(트랜잭션)에서 생성할 객체 수',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f"'{prefix}-'로 시작하는 사용자가 이미 있습니다 (--prefix를 바꾸거나 DB를 비우세요)")
+        if options['users'] < 1 or options['posts'] < 1:
+            raise CommandError('--users, --posts는 1 이상이어야 합니다')
+
+        user_pks = self.create_users()
+        photo_names = self.create_photos()
+        post_pks = self.create_posts(user_pks, photo_names)
+        # 인기 있는 Post가 pk순서로 몰리지 않도록 순위를 섞음
+        popular_post_pks = post_pks[:]
+        self.rng.shuffle(popular_post_pks)
+        post_sampler = ZipfSampler(self.rng, len(popular_post_pks), options['post_zipf'])
+        comment_count = self.create_comments(user_pks, popular_post_pks, post_sampler)
+        like_count = self.create_likes(user_pks, popular_post_pks, post_sampler)
+        # 비정규화된 like_count, comment_count를 실제 수와 맞춤
+        call_command('reconcile_post_counters', stdout=io.StringIO())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'사용자 {len(user_pks)}명, Post {len(post_pks)}개, '
+            f'댓글 {comment_count}개, 좋아요 {like_count}개 생성 완료'
+        ))
+
+    def log(self, message):
+        if self.options['verbosity'] >= 2:
+            self.stdout.write(message)
+
+    def bulk_create(self, model, objs):
+        # batch_size개씩 나누어 각각 하나의 트랜잭션에서 생성하고, 생성된 pk목록을 순서대로 리턴
+        #  (SQLite는 bulk_create에서 pk를 돌려주지 않으므로 생성 전의 마지막 pk이후를 조회)
+        last = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        batch_size = self.options['batch_size']
+        for start in range(0, len(objs), batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(objs[start:start + batch_size])
+        return list(
+            model.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True)
+        )
+
+    def create_users(self):
+        # 비밀번호는 모두 'password', 해시는 한 번만 계산
+        password = make_password('password')
+        prefix = self.options['prefix']
+        user_pks = self.bulk_create(User, [
+            User(username=f'{prefix}-{index}', password=password)
+            for index in range(self.options['users'])
+        ])
+        self.log(f'사용자 {len(user_pks)}명')
+        return user_pks
+
+    def create_photos(self):
+        # 서로 다른 색의 사진 파일을 만들어서 Post들이 나누어 사용 (이미 있다면 다시 만들지 않음)
+        names = []
+        size = self.options['photo_size']
+        for index in range(max(1, self.options['photos'])):
+            name = f"post/{self.options['prefix']}-{index}.jpg"
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            if not default_storage.exists(name):
+                buffer = io.BytesIO()
+                Image.new('RGB', (size, size), color).save(buffer, 'JPEG')
+                name = default_storage.save(name, ContentFile(buffer.getvalue()))
+            names.append(name)
+        self.log(f'사진 {len(names)}개')
+        return names
+
+    def create_posts(self, user_pks, photo_names):
+        post_pks = self.bulk_create(Post, [
+            Post(author_id=self.rng.choice(user_pks), photo=self.rng.choice(photo_names))
+            for _ in range(self.options['posts'])
+        ])
+        self.log(f'Post {len(post_pks)}개')
+        return post_pks
+
+    def hashtag_names(self):
+        # 2~4음절의 서로 다른 태그명, 자동완성에서 접두어가 겹치도록 적은 수의 음절을 조합
+        names = []
+        seen = set()
+        while len(names) < self.options['hashtags']:
+            name = ''.join(self.rng.choices(SYLLABLES, k=self.rng.randint(2, 4)))
+            if name in seen:
+                name = f'{name}{len(names)}'
+            seen.add(name)
+            names.append(name)
+        return names
+
+    def create_comments(self, user_pks, popular_post_pks, post_sampler):
+        options = self.options
+        names = self.hashtag_names()
+        hashtag_pks = {}
+        for start in range(0, len(names), 500):
+            hashtag_pks.update(HashTag.objects.get_pks(names[start:start + 500]))
+        tag_sampler = ZipfSampler(self.rng, len(names), options['tag_zipf'])
+
+        comments = []
+        # 댓글 순서대로 (post_pk, 태그pk 목록)
+        comment_tags = []
+        for post_index in post_sampler.sample(options['comments']):
+            post_pk = popular_post_pks[post_index]
+            tag_count = self.rng.randint(0, options['tags_per_comment']) if names else 0
+            tags = list(dict.fromkeys(names[index] for index in tag_sampler.sample(tag_count)))
+            content = ' '.join(
+                self.rng.choices(WORDS, k=self.rng.randint(2, 8)) + [f'#{tag}' for tag in tags])
+            comments.append(Comment(
+                post_id=post_pk,
+                author_id=self.rng.choice(user_pks),
+                content=content,
+                _html=Comment.render_html(content),
+            ))
+            comment_tags.append((post_pk, [hashtag_pks[tag] for tag in tags]))
+        comment_pks = self.bulk_create(Comment, comments)
+
+        # Comment.tags와 태그별 Post 인덱스(PostHashTag)
+        through = Comment.tags.through
+        self.bulk_create(through, [
+            through(comment_id=comment_pk, hashtag_id=hashtag_pk)
+            for comment_pk, (post_pk, tag_pks) in zip(comment_pks, comment_tags)
+            for hashtag_pk in tag_pks
+        ])
+        entries = Counter(
+            (post_pk, hashtag_pk)
+            for post_pk, tag_pks in comment_tags
+            for hashtag_pk in tag_pks
+        )
+        self.bulk_create(PostHashTag, [
+            PostHashTag(post_id=post_pk, hashtag_id=hashtag_pk, comment_count=count)
+            for (post_pk, hashtag_pk), count in entries.items()
+        ])
+        self.log(f'해시태그 {len(hashtag_pks)}개, 댓글 {len(comment_pks)}개')
+        return len(comment_pks)
+
+    def create_likes(self, user_pks, popular_post_pks, post_sampler):
+        # (Post, 사용자)는 중복될 수 없으므로 가능한 최대 수를 넘지 않음
+        target = min(self.options['likes'], len(user_pks) * len(popular_post_pks))
+        pairs = set()
+        attempts = 0
+        while len(pairs) < target and attempts < target * 10:
+            for post_index in post_sampler.sample(target - len(pairs)):
+                pairs.add((popular_post_pks[post_index], self.rng.choice(user_pks)))
+            attempts += target
+        # 인기 있는 Post에 좋아요가 몰려서 목표 수를 채우지 못했다면 나머지는 고르게 추가
+        while len(pairs) < target:
+            pairs.add((self.rng.choice(popular_post_pks), self.rng.choice(user_pks)))
+        like_pks = self.bulk_create(PostLike, [
+            PostLike(post_id=post_pk, user_id=user_pk) for post_pk, user_pk in sorted(pairs)
+        ])
+        self.log(f'좋아요 {len(like_pks)}개')
+        return len(like_pks)
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = '크기별 사진이 없는 Post의 사진을 너비별로 줄여서 저장'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='이미 생성된 Post도 다시 생성',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='동시에 사진을 처리할 스레드 수',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='한 번에 가져올 Post의 수',
+        )
+
+    def generate(self, post_pk, force):
+        try:
+            return generate_renditions(post_pk, force=force)
+        except Exception as e:
+            self.stderr.write(f'Post[{post_pk}] 처리 실패: {e}')
+        finally:
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        force = options['force']
+        queryset = Post.objects.order_by('pk')
+        if not force:
+            queryset = queryset.filter(photo_widths__isnull=True)
+
+        done = 0
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                pks = list(
+                    queryset
+                    .filter(pk__gt=last_pk)
+                    .values_list('pk', flat=True)[:options['chunk_size']]
+                )
+                if not pks:
+                    break
+                last_pk = pks[-1]
+                for _ in executor.map(lambda pk: self.generate(pk, force), pks):
+                    done += 1
+                if options['verbosity'] >= 2:
+                    self.stdout.write(f'~{last_pk}: {done}개 처리')
+
+        self.stdout.write(self.style.SUCCESS(f'Post {done}개의 크기별 사진 생성 완료'))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, PostHashTag
+
+
+class Command(BaseCommand):
+    help = '태그 페이지의 (HashTag, Post) 인덱스(PostHashTag)를 실제 Comment의 태그 목록과 맞춤'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='한 트랜잭션에서 검사할 Post의 수',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='각 chunk를 처리한 후 쉬는 시간(초)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        sleep = options['sleep']
+
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            # reconcile_post_counters와 같이 pk순서대로 chunk_size만큼씩 잘라서 처리
+            pks = list(
+                Post.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            fixed_count = PostHashTag.objects.rebuild(pks)
+
+            checked += len(pks)
+            fixed += fixed_count
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'~{last_pk}: {fixed_count}개 수정')
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Post {checked}개 검사, (태그, Post) {fixed}개 수정 완료'
+        ))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Post의 like_count, comment_count값을 실제 PostLike, Comment 수와 맞춤'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='한 트랜잭션에서 검사할 Post의 수',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='각 chunk를 처리한 후 쉬는 시간(초)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        sleep = options['sleep']
+
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            # pk순서대로 chunk_size만큼씩 잘라서 처리
+            #  테이블 전체를 한 트랜잭션에서 다루지 않으므로
+            #  처리중에도 다른 요청의 쓰기가 오래 막히지 않음
+            pks = list(
+                Post.objects
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not pks:
+                break
+            last_pk = pks[-1]
+
+            fixed_count = Post.reconcile_counters(pks)
+
+            checked += len(pks)
+            fixed += fixed_count
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'~{last_pk}: {fixed_count}/{len(pks)}개 수정')
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Post {checked}개 검사, {fixed}개의 카운터 수정 완료'
+        ))
@@ -0,0 +1,46 @@
+# Generated by Django 2.1.2 on 2026-10-18 20:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model):
+    # Post 1개에 연결된 model 객체의 수 (reconcile_post_counters와 같은 Subquery)
+    queryset = model.objects\
+        .filter(post=OuterRef('pk'))\
+        .order_by()\
+        .values('post')\
+        .annotate(count=Count('pk'))\
+        .values('count')
+    return Coalesce(Subquery(queryset, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    # 기존 Post의 좋아요/댓글 수를 UPDATE문 안에서 집계해서 저장
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(
+        like_count=count_subquery(apps.get_model('posts', 'PostLike')),
+        comment_count=count_subquery(apps.get_model('posts', 'Comment')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_auto_20181028_2018'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='댓글 수'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='좋아요 수'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
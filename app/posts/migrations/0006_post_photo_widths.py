@@ -0,0 +1,18 @@
+# Generated by Django 2.1.2 on 2026-10-18 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='photo_widths',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='크기별 사진 너비 목록'),
+        ),
+    ]
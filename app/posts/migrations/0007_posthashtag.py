@@ -0,0 +1,47 @@
+# Generated by Django 2.1.2 on 2026-10-18 21:03
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_post_hashtags(apps, schema_editor):
+    # 기존 Comment의 태그 목록으로 (HashTag, Post)별 댓글 수를 계산해서 저장
+    Comment = apps.get_model('posts', 'Comment')
+    PostHashTag = apps.get_model('posts', 'PostHashTag')
+    rows = Comment.tags.through.objects\
+        .values('comment__post_id', 'hashtag_id')\
+        .annotate(comment_count=Count('comment_id'))\
+        .order_by()
+    PostHashTag.objects.bulk_create((
+        PostHashTag(
+            post_id=row['comment__post_id'],
+            hashtag_id=row['hashtag_id'],
+            comment_count=row['comment_count'],
+        )
+        for row in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_photo_widths'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostHashTag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_entries', to='posts.HashTag')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hashtag_entries', to='posts.Post')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='posthashtag',
+            unique_together={('hashtag', 'post')},
+        ),
+        migrations.RunPython(fill_post_hashtags, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,29 @@
+import random
 import re
+import threading
+from collections import OrderedDict
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, pre_delete
+from django.utils import timezone
+
+from config.response_cache import bump_generations
+from config.tasks import run_in_background
+from . import renditions
+
+
+def count_subquery(model):
+    # Post 1개에 연결된 model 객체의 수를 구하는 Subquery
+    queryset = model.objects\
+        .filter(post=OuterRef('pk'))\
+        .order_by()\
+        .values('post')\
+        .annotate(count=Count('pk'))\
+        .values('count')
+    return Coalesce(Subquery(queryset, output_field=IntegerField()), 0)
 
 
 class Post(models.Model):
@@ -27,20 +49,202 @@ class Post(models.Model):
         related_name='like_posts',
         related_query_name='like_post',
     )
+    # 좋아요/댓글 수를 매번 집계하지 않도록 비정규화해서 저장
+    #  PostLike, Comment의 생성/삭제시 F()를 사용해 DB에서 직접 증감
+    #  QuerySet.delete()는 PostLike/Comment.delete()를 거치지 않으므로 카운터가 변경되지 않음
+    #   (PostLikeManager는 직접 증감하며, User 삭제로 함께 삭제되는 경우는 connect_signals()에서 보정)
+    #  실제 값과 어긋난 경우 'reconcile_post_counters' 명령으로 보정
+    like_count = models.PositiveIntegerField('좋아요 수', default=0)
+    comment_count = models.PositiveIntegerField('댓글 수', default=0)
+    # 좋아요, 댓글, 수정으로 Post의 내용이 바뀔 때마다 1씩 증가
+    #  post_list.html의 캐시 키와 API의 ETag(config.conditional)로 사용
+    version = models.PositiveIntegerField('버전', default=1)
+    # 백그라운드에서 생성한 크기별 사진(posts.renditions)의 너비 목록 ('320,640,1080')
+    #  아직 생성하지 않았다면 None
+    photo_widths = models.CharField(
+        '크기별 사진 너비 목록',
+        max_length=100,
+        blank=True,
+        null=True,
+    )
 
-
+    # save()로 덮어쓰지 않고
+    #  update_counters()나 백그라운드 작업에서만 변경하는 필드
+    DERIVED_FIELDS = ('like_count', 'comment_count', 'version', 'photo_widths')
+    # 비로그인 사용자 응답 캐시(config.response_cache)의 세대 카운터
+    #  posts: Post의 생성/수정/삭제 (version만 바뀌는 변경 포함)
+    #  comments: 댓글 생성/삭제, likes: 좋아요/좋아요 취소
+    COUNTER_GENERATIONS = {'like_count': 'likes', 'comment_count': 'comments'}
 
     class Meta:
         verbose_name = '포스트'
         verbose_name_plural = f'{verbose_name} 목록'
         ordering = ['-pk']
 
+    @classmethod
+    def update_counters(cls, post_pk, **deltas):
+        # Post.update_counters(post.pk, like_count=1, ...)
+        #  메모리에 있는 값을 사용하지 않고
+        #  'UPDATE ... SET like_count = like_count + 1'형태로 한 번에 증감
+        #  같은 UPDATE문에서 version도 1 증가시키고 modified_at을 갱신
+        #   (조건부 GET의 ETag, Last-Modified로 사용)
+        #  변경된 row 수를 리턴 (Post가 없다면 0)
+        deltas.setdefault('version', 1)
+        updated = cls.objects.filter(pk=post_pk).update(modified_at=timezone.now(), **{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+        # UPDATE 후에 등록 (트랜잭션 밖(autocommit)에서는 on_commit이 바로 실행되므로
+        #  먼저 증가시키면 UPDATE 전의 값으로 다시 만든 응답이 새 세대로 저장될 수 있음)
+        if updated:
+            bump_generations(*[
+                cls.COUNTER_GENERATIONS[field] for field in deltas
+                if field in cls.COUNTER_GENERATIONS
+            ] or ['posts'])
+        return updated
+
+    @classmethod
+    def touch_commented_by(cls, user_pk):
+        # user_pk의 User가 댓글을 작성한 Post들의 version을 올림
+        #  댓글 작성자 이름이 바뀐 경우 캐시된 Post카드의 댓글 목록(post_card_body)을 갱신
+        #  변경된 row 수를 리턴
+        updated = cls.objects.filter(comments__author_id=user_pk).update(
+            version=F('version') + 1,
+            modified_at=timezone.now(),
+        )
+        if updated:
+            bump_generations('posts')
+        return updated
+
+    @classmethod
+    def reconcile_counters(cls, post_pks):
+        # post_pks중 like_count, comment_count가 실제 PostLike, Comment 수와 다른 Post를 보정
+        #  보정한 Post의 수를 리턴
+        with transaction.atomic():
+            drifted_pks = list(
+                cls.objects
+                .filter(pk__in=post_pks)
+                .annotate(
+                    actual_like_count=count_subquery(PostLike),
+                    actual_comment_count=count_subquery(Comment),
+                )
+                .exclude(
+                    like_count=F('actual_like_count'),
+                    comment_count=F('actual_comment_count'),
+                )
+                .values_list('pk', flat=True)
+            )
+            if drifted_pks:
+                # 읽어온 값을 다시 쓰지 않고 UPDATE문 안에서 다시 집계하므로
+                #  검사와 수정 사이에 생긴 좋아요/댓글도 반영됨
+                #  캐시된 Post카드와 ETag가 갱신되도록 version, modified_at도 변경
+                cls.objects.filter(pk__in=drifted_pks).update(
+                    like_count=count_subquery(PostLike),
+                    comment_count=count_subquery(Comment),
+                    version=F('version') + 1,
+                    modified_at=timezone.now(),
+                )
+                bump_generations('likes', 'comments')
+        return len(drifted_pks)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_photo = instance.__dict__.get('photo')
+        return instance
+
+    @property
+    def photo_renditions(self):
+        # [(너비, URL), ...]
+        return renditions.rendition_urls(self.photo.name, self.photo_widths)
+
+    @property
+    def photo_srcset(self):
+        # <img srcset="...">에 사용할 문자열
+        return ', '.join(f'{url} {width}w' for width, url in self.photo_renditions)
+
+    @property
+    def photo_thumbnail_url(self):
+        # 가장 작은 크기의 사진 URL, 없다면 원본 URL
+        photo_renditions = self.photo_renditions
+        if photo_renditions:
+            return photo_renditions[0][1]
+        return self.photo.url
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        loaded_photo = getattr(self, '_loaded_photo', None)
+        photo_changed = adding or self.photo.name != loaded_photo
+        # 이전 사진의 크기별 사진 너비 (deferred라면 가져오지 않음)
+        loaded_photo_widths = self.__dict__.get('photo_widths')
+        if not adding and kwargs.get('update_fields') is None:
+            # 이미 저장된 Post를 수정할 때는
+            #  메모리에 있던(오래된) 좋아요/댓글 수 등으로 덮어쓰지 않도록 해당 필드를 제외
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.DERIVED_FIELDS
+            ]
+            if photo_changed:
+                # 사진이 바뀌었다면 크기별 사진을 다시 생성
+                self.photo_widths = None
+                kwargs['update_fields'].append('photo_widths')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not adding:
+                Post.update_counters(self.pk)
+        self._loaded_photo = self.photo.name
+        if photo_changed:
+            # 트랜잭션이 커밋된 후 worker pool에서 크기별 사진 생성
+            run_in_background(renditions.generate_renditions, self.pk)
+            if loaded_photo:
+                # 이전 사진의 크기별 사진은 삭제
+                run_in_background(renditions.delete_renditions, loaded_photo, loaded_photo_widths)
+        if adding:
+            # 새 Post는 트랜잭션이 커밋된 후
+            #  작성자와 팔로워들의 타임라인에 추가 (fan-out-on-write)
+            transaction.on_commit(lambda: TimelineEntry.objects.fan_out(self))
+            bump_generations('posts')
+
     def like_toggle(self, user):
         # 전달받은 user가 이 Post를 Like한다면 해제
         # 안되어있다면 Like처리
-        postlike, postlike_created = self.postlike_set.get_or_create(user=user)
-        if not postlike_created:
-            postlike.delete()
+        # (좋아요 여부, 좋아요 수)를 리턴
+        return PostLike.objects.toggle(self.pk, user)
+
+
+def bump_post_generation(sender, instance, **kwargs):
+    bump_generations('posts')
+
+
+def reconcile_deleted_user_posts(sender, instance, **kwargs):
+    # User 삭제로 CASCADE 삭제되는 PostLike, Comment는 Post의 카운터를 변경하지 않으므로
+    #  다른 사용자의 Post중 영향을 받는 Post를 삭제 전에 찾아두고, 커밋된 후 다시 집계
+    #  (자신의 Post는 함께 삭제됨)
+    post_pks = set(
+        PostLike.objects
+        .filter(user=instance)
+        .exclude(post__author=instance)
+        .values_list('post_id', flat=True)
+    )
+    post_pks.update(
+        Comment.objects
+        .filter(author=instance)
+        .exclude(post__author=instance)
+        .values_list('post_id', flat=True)
+    )
+    if post_pks:
+        transaction.on_commit(lambda: Post.reconcile_counters(post_pks))
+
+
+def connect_signals():
+    # PostsConfig.ready()에서 호출
+    #  QuerySet.delete()나 작성자 삭제로 함께 삭제되는 경우에도 실행됨
+    post_delete.connect(
+        bump_post_generation, sender=Post, dispatch_uid='response_cache_post_delete')
+    pre_delete.connect(
+        reconcile_deleted_user_posts,
+        sender=settings.AUTH_USER_MODEL,
+        dispatch_uid='post_counters_user_delete',
+    )
 
 
 class Comment(models.Model):
@@ -70,26 +274,80 @@ class Comment(models.Model):
         verbose_name = '댓글'
         verbose_name_plural = f'{verbose_name} 목록'
 
+    @classmethod
+    def render_html(cls, content):
+        # content의 해시태그를 태그 페이지 링크로 바꾼 HTML
+        return re.sub(
+            cls.TAG_PATTERN,
+            r'<a href="/explore/tags/\g<tag>/">#\g<tag></a>',
+            content,
+        )
+
     def save(self, *args, **kwargs):
+        adding = self._state.adding
+
         def save_html():
             # 저장하기 전에 _html필드를 채워야 함 (content값을 사용해서)
-            self._html = re.sub(
-                self.TAG_PATTERN,
-                r'<a href="/explore/tags/\g<tag>/">#\g<tag></a>',
-                self.content,
-            )
+            self._html = self.render_html(self.content)
 
         def save_tags():
             # DB에 Comment저장이 완료된 후,
             #  자신의 'content'값에서 해시태그 목록을 가져와서
             #  자신의 'tags'속성 (MTM필드)에 할당
-            tags = [HashTag.objects.get_or_create(name=name)[0]
-                    for name in re.findall(self.TAG_PATTERN, self.content)]
-            self.tags.set(tags)
+            #  content가 바뀌지 않았다면 아무것도 하지 않음
+            if not adding and self.content == getattr(self, '_loaded_content', None):
+                return
+            tag_pks = set(HashTag.objects.get_pks(
+                re.findall(self.TAG_PATTERN, self.content)).values())
+            through = Comment.tags.through
+            current_tag_pks = set() if adding else set(
+                through.objects
+                .filter(comment=self)
+                .values_list('hashtag_id', flat=True)
+            )
+            # 기존 태그 목록과 비교해서 바뀐 부분만 추가/삭제
+            removed_tag_pks = current_tag_pks - tag_pks
+            added_tag_pks = tag_pks - current_tag_pks
+            if removed_tag_pks:
+                through.objects.filter(
+                    comment=self, hashtag_id__in=removed_tag_pks).delete()
+                PostHashTag.objects.remove(self.post_id, removed_tag_pks)
+            if added_tag_pks:
+                through.objects.bulk_create([
+                    through(comment=self, hashtag_id=tag_pk) for tag_pk in added_tag_pks
+                ])
+                PostHashTag.objects.add(self.post_id, added_tag_pks)
+            # 기존 댓글의 내용이 바뀌었다면 Post의 version을 올려서 캐시를 무효화
+            if not adding:
+                Post.update_counters(self.post_id)
 
-        save_html()
-        super().save(*args, **kwargs)
-        save_tags()
+        with transaction.atomic():
+            save_html()
+            super().save(*args, **kwargs)
+            save_tags()
+            if adding:
+                Post.update_counters(self.post_id, comment_count=1)
+        self._loaded_content = self.content
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            tag_pks = list(
+                Comment.tags.through.objects
+                .filter(comment=self)
+                .values_list('hashtag_id', flat=True)
+            )
+            result = super().delete(*args, **kwargs)
+            PostHashTag.objects.remove(self.post_id, tag_pks)
+            Post.update_counters(self.post_id, comment_count=-1)
+        return result
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # DB에서 가져온 시점의 content값을 기억해두고
+        #  save()시 content가 바뀐 경우에만 태그 목록을 다시 계산
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_content = instance.__dict__.get('content')
+        return instance
 
     @property
     def html(self):
@@ -115,6 +373,57 @@ class Comment(models.Model):
         #  해당 값을 사용해 위에서 만든 view로 이동
 
 
+class HashTagManager(models.Manager):
+    # 자주 사용되는 태그의 {태그명: pk}를 프로세스별로 기억해두는 LRU 캐시
+    _pk_cache = OrderedDict()
+    _pk_cache_lock = threading.Lock()
+
+    def get_pks(self, names):
+        """
+        태그명 목록에 해당하는 {태그명: pk} dict를 리턴
+         캐시에 없는 태그는 'WHERE name IN (...)' 1번으로 가져오고
+         DB에도 없는 태그는 bulk_create 1번으로 생성
+        """
+        names = list(OrderedDict.fromkeys(names))
+        pks = {}
+        with self._pk_cache_lock:
+            for name in names:
+                if name in self._pk_cache:
+                    self._pk_cache.move_to_end(name)
+                    pks[name] = self._pk_cache[name]
+
+        missing_names = [name for name in names if name not in pks]
+        if missing_names:
+            pks.update(self.filter(name__in=missing_names).values_list('name', 'pk'))
+            new_names = [name for name in missing_names if name not in pks]
+            if new_names:
+                try:
+                    with transaction.atomic():
+                        self.bulk_create([self.model(name=name) for name in new_names])
+                except IntegrityError:
+                    # 다른 요청이 같은 태그를 먼저 생성한 경우
+                    for name in new_names:
+                        self.get_or_create(name=name)
+                pks.update(self.filter(name__in=new_names).values_list('name', 'pk'))
+
+            # 새로 생성한 태그는 트랜잭션이 롤백될 수 있으므로 커밋된 후에 캐시
+            self._remember({name: pks[name] for name in missing_names if name not in new_names})
+            if new_names:
+                transaction.on_commit(
+                    lambda: self._remember({name: pks[name] for name in new_names}))
+        return pks
+
+    def _remember(self, pks):
+        with self._pk_cache_lock:
+            self._pk_cache.update(pks)
+            while len(self._pk_cache) > settings.HASHTAG_PK_CACHE_SIZE:
+                self._pk_cache.popitem(last=False)
+
+    def forget(self, name):
+        with self._pk_cache_lock:
+            self._pk_cache.pop(name, None)
+
+
 class HashTag(models.Model):
     name = models.CharField(
         '태그명',
@@ -122,14 +431,204 @@ class HashTag(models.Model):
         unique=True,
     )
 
+    objects = HashTagManager()
+
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        HashTag.objects.forget(self.name)
+        return super().delete(*args, **kwargs)
+
     class Meta:
         verbose_name = '해시태그'
         verbose_name_plural = f'{verbose_name} 목록'
 
 
+class PostHashTagManager(models.Manager):
+    def posts_for(self, tag_name):
+        # tag_name의 HashTag를 가진 Post목록
+        #  PostHashTag의 post_id를 tagged_post_id로 가져와서 정렬/페이지 구분에 사용해야
+        #  (hashtag, post)인덱스를 순서대로 읽어서 LIMIT만큼만 가져옴
+        #  (Post의 pk로 정렬하면 해당 태그의 전체 범위를 읽어서 정렬함)
+        return Post.objects\
+            .filter(hashtag_entries__hashtag__name=tag_name)\
+            .annotate(tagged_post_id=F('hashtag_entries__post_id'))\
+            .order_by('-tagged_post_id')
+
+    def add(self, post_pk, hashtag_pks):
+        # post_pk의 Post에 hashtag_pks의 태그를 가진 댓글이 하나씩 추가됨
+        #  이미 있는 (태그, Post)는 댓글 수를 1 증가, 없다면 생성
+        hashtag_pks = set(hashtag_pks)
+        if not hashtag_pks:
+            return
+        existing_pks = set(
+            self.filter(post_id=post_pk, hashtag_id__in=hashtag_pks)
+            .values_list('hashtag_id', flat=True)
+        )
+        if existing_pks:
+            self.filter(post_id=post_pk, hashtag_id__in=existing_pks)\
+                .update(comment_count=F('comment_count') + 1)
+        missing_pks = hashtag_pks - existing_pks
+        if not missing_pks:
+            return
+        try:
+            with transaction.atomic():
+                self.bulk_create([
+                    self.model(post_id=post_pk, hashtag_id=hashtag_pk, comment_count=1)
+                    for hashtag_pk in missing_pks
+                ])
+        except IntegrityError:
+            # 다른 요청이 그 사이에 생성한 경우 하나씩 처리
+            for hashtag_pk in missing_pks:
+                entry, created = self.get_or_create(
+                    post_id=post_pk,
+                    hashtag_id=hashtag_pk,
+                    defaults={'comment_count': 1},
+                )
+                if not created:
+                    self.filter(pk=entry.pk).update(comment_count=F('comment_count') + 1)
+
+    def remove(self, post_pk, hashtag_pks):
+        # post_pk의 Post에서 hashtag_pks의 태그를 가진 댓글이 하나씩 삭제됨
+        #  마지막 댓글이었다면 (태그, Post)를 삭제, 아니라면 댓글 수를 1 감소
+        if not hashtag_pks:
+            return
+        entries = self.filter(post_id=post_pk, hashtag_id__in=hashtag_pks)
+        entries.filter(comment_count__lte=1).delete()
+        entries.update(comment_count=F('comment_count') - 1)
+
+    def rebuild(self, post_pks):
+        """
+        post_pks의 (태그, Post)를 Comment의 태그 목록으로 다시 집계해서 맞춤
+         Comment.save/delete를 거치지 않은 변경(QuerySet.delete(), User 삭제로 함께 삭제된 댓글 등)을 보정
+         추가/수정/삭제한 row의 수를 리턴
+        """
+        with transaction.atomic():
+            actual = {
+                (row['comment__post_id'], row['hashtag_id']): row['comment_count']
+                for row in Comment.tags.through.objects
+                .filter(comment__post_id__in=post_pks)
+                .values('comment__post_id', 'hashtag_id')
+                .annotate(comment_count=Count('comment_id'))
+                .order_by()
+            }
+            stored = {
+                (post_pk, hashtag_pk): (pk, comment_count)
+                for pk, post_pk, hashtag_pk, comment_count in self
+                .filter(post_id__in=post_pks)
+                .values_list('pk', 'post_id', 'hashtag_id', 'comment_count')
+            }
+            stale_pks = [pk for key, (pk, _) in stored.items() if key not in actual]
+            if stale_pks:
+                self.filter(pk__in=stale_pks).delete()
+            changed = len(stale_pks)
+            missing = []
+            for (post_pk, hashtag_pk), comment_count in actual.items():
+                pk, stored_count = stored.get((post_pk, hashtag_pk), (None, None))
+                if pk is None:
+                    missing.append(self.model(
+                        post_id=post_pk, hashtag_id=hashtag_pk, comment_count=comment_count))
+                elif stored_count != comment_count:
+                    self.filter(pk=pk).update(comment_count=comment_count)
+                    changed += 1
+            self.bulk_create(missing)
+            changed += len(missing)
+            if changed:
+                bump_generations('comments')
+        return changed
+
+
+class PostHashTag(models.Model):
+    """
+    태그 페이지에서 사용하는 (HashTag, Post) 인덱스
+     Post에 속한 Comment중 해당 HashTag를 가진 Comment가 있다면 row가 존재
+     Comment.save/delete에서 함께 변경되며
+     어긋난 경우 'rebuild_post_hashtags' 명령으로 보정
+    unique_together의 (hashtag, post) 인덱스로
+     'WHERE hashtag_id = ? AND post_id < ? ORDER BY post_id DESC'형태의
+     최신순 keyset 페이지를 인덱스의 한 범위만 읽어서 가져옴
+    """
+    hashtag = models.ForeignKey(
+        HashTag,
+        on_delete=models.CASCADE,
+        related_name='post_entries',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='hashtag_entries',
+    )
+    # Post의 Comment중 이 HashTag를 가진 Comment의 수
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PostHashTagManager()
+
+    class Meta:
+        unique_together = (
+            ('hashtag', 'post'),
+        )
+
+
+class PostLikeManager(models.Manager):
+    """
+    좋아요/좋아요 취소를 하나의 트랜잭션 안에서
+     조건부 DELETE/INSERT로 처리 (먼저 SELECT해서 확인하지 않음)
+    동시에 같은 요청이 들어와도 unique_together에 의해 하나만 생성되고
+    좋아요 수는 실제로 생성/삭제된 경우에만 증감됨
+    모든 메서드는 Post가 없다면 Post.DoesNotExist를 발생시킴
+    user에는 User인스턴스 또는 pk값이 올 수 있음
+    """
+
+    def _insert(self, post_pk, user):
+        # 생성된 PostLike, 이미 있었다면 None을 리턴
+        user_pk = getattr(user, 'pk', user)
+        try:
+            with transaction.atomic():
+                return self.create(post_id=post_pk, user_id=user_pk)
+        except IntegrityError:
+            # 다른 요청이 먼저 생성한 경우
+            #  (DB에 따라 Post가 없는 경우에도 IntegrityError가 발생하므로 구분)
+            if not self.filter(post_id=post_pk, user_id=user_pk).exists():
+                raise Post.DoesNotExist('Post matching query does not exist.')
+            return None
+
+    def _delete(self, post_pk, user):
+        # 삭제되었다면 True, 없었다면 False를 리턴
+        #  (signal 수신자나 연결된 객체가 없으므로 DELETE문 하나로 처리됨)
+        deleted, _ = self.filter(post_id=post_pk, user_id=getattr(user, 'pk', user)).delete()
+        if deleted:
+            Post.update_counters(post_pk, like_count=-deleted)
+        return bool(deleted)
+
+    def _like_count(self, post_pk):
+        like_count = Post.objects.filter(pk=post_pk).values_list('like_count', flat=True).first()
+        if like_count is None:
+            raise Post.DoesNotExist('Post matching query does not exist.')
+        return like_count
+
+    def like(self, post_pk, user):
+        # (생성된 PostLike 또는 None, 좋아요 수)
+        with transaction.atomic():
+            postlike = self._insert(post_pk, user)
+            return postlike, self._like_count(post_pk)
+
+    def unlike(self, post_pk, user):
+        # (삭제 여부, 좋아요 수)
+        with transaction.atomic():
+            deleted = self._delete(post_pk, user)
+            return deleted, self._like_count(post_pk)
+
+    def toggle(self, post_pk, user):
+        # (좋아요 여부, 좋아요 수)
+        #  먼저 삭제를 시도하고, 삭제된 row가 없을 때만 생성
+        with transaction.atomic():
+            liked = not self._delete(post_pk, user)
+            if liked:
+                self._insert(post_pk, user)
+            return liked, self._like_count(post_pk)
+
+
 class PostLike(models.Model):
     post = models.ForeignKey(
         Post,
@@ -141,14 +640,170 @@ class PostLike(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = PostLikeManager()
+
     def __str__(self):
         return 'Post[{post_pk}] Like (User: {username})'.format(
             post_pk=self.post.pk,
             username=self.user.username,
         )
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        # 바깥 트랜잭션(PostLikeManager 등) 안에서는 savepoint를 만들지 않음
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if adding and not Post.update_counters(self.post_id, like_count=1):
+                # 좋아요 수를 변경할 Post가 없다면 생성을 취소
+                raise Post.DoesNotExist('Post matching query does not exist.')
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            result = super().delete(*args, **kwargs)
+            Post.update_counters(self.post_id, like_count=-1)
+        return result
+
     class Meta:
         # 특정 User가 특정 Post를 좋아요 누른 정보는 unique해야함
         unique_together = (
             ('post', 'user'),
         )
+
+
+class TimelineEntryManager(models.Manager):
+    def fan_out(self, post):
+        """
+        post를 작성자 자신과 작성자를 팔로우하는 사용자들의 타임라인에 추가
+        팔로워가 TIMELINE_CELEBRITY_FOLLOWER_COUNT명 이상인 사용자의 Post는
+         타임라인에 넣지 않고 읽을 때 합쳐서 가져옴 (fan-out-on-read)
+        """
+        author = post.author
+        self.insert_missing('user_id', [author.pk], post_id=post.pk)
+        if author.follower_count >= settings.TIMELINE_CELEBRITY_FOLLOWER_COUNT:
+            return
+
+        # 팔로워 목록을 한 번에 메모리로 가져오지 않고
+        #  Relation의 pk순서로 TIMELINE_FANOUT_BATCH_SIZE명씩 나누어 추가
+        batch_size = settings.TIMELINE_FANOUT_BATCH_SIZE
+        last_relation_pk = 0
+        while True:
+            relations = list(
+                author.follower_relations
+                .filter(pk__gt=last_relation_pk)
+                .order_by('pk')
+                .values_list('pk', 'from_user_id')[:batch_size]
+            )
+            if not relations:
+                break
+            last_relation_pk = relations[-1][0]
+            user_pks = [user_pk for _, user_pk in relations]
+            self.insert_missing('user_id', user_pks, post_id=post.pk)
+            self.trim(user_pks)
+
+    def insert_missing(self, field, pks, retries=3, **fixed):
+        """
+        fixed와 field=pk인 항목중 아직 없는 항목만 추가
+         insert_missing('user_id', [1, 2], post_id=3)
+        fan_out()은 커밋 후에 실행되므로 그 사이에 팔로우한 사용자의 항목을
+         Relation.save()의 add_author_posts()가 먼저 추가했을 수 있음
+         동시에 추가되어 IntegrityError가 발생하면 savepoint까지만 되돌리고
+         기존 항목을 다시 확인해서 retries번까지 재시도
+        """
+        for attempt in range(retries):
+            existing = set(
+                self.filter(**fixed, **{f'{field}__in': pks})
+                .values_list(field, flat=True)
+            )
+            try:
+                with transaction.atomic():
+                    self.bulk_create([
+                        self.model(**fixed, **{field: pk}) for pk in pks if pk not in existing
+                    ])
+                return
+            except IntegrityError:
+                if attempt == retries - 1:
+                    raise
+
+    def trim(self, user_pks):
+        """
+        타임라인의 길이가 TIMELINE_MAX_LENGTH를 넘지 않도록 오래된 항목을 삭제
+         Post를 추가할 때마다 모든 팔로워의 타임라인을 검사하지 않고
+         TIMELINE_TRIM_INTERVAL번에 1번꼴로만 검사하므로
+         각 타임라인의 길이는 대략 TIMELINE_MAX_LENGTH + TIMELINE_TRIM_INTERVAL 이내로 유지됨
+        """
+        max_length = settings.TIMELINE_MAX_LENGTH
+        interval = settings.TIMELINE_TRIM_INTERVAL
+        for user_pk in user_pks:
+            if random.randrange(interval):
+                continue
+            cutoff = list(
+                self.filter(user_id=user_pk)
+                .order_by('-post_id')
+                .values_list('post_id', flat=True)[max_length:max_length + 1]
+            )
+            if cutoff:
+                self.filter(user_id=user_pk, post_id__lte=cutoff[0]).delete()
+
+    def add_author_posts(self, user, author):
+        # user가 author를 새로 팔로우했을 때, author의 최근 Post를 user의 타임라인에 추가
+        if author.follower_count >= settings.TIMELINE_CELEBRITY_FOLLOWER_COUNT:
+            return
+        post_pks = list(
+            Post.objects
+            .filter(author=author)
+            .values_list('pk', flat=True)[:settings.TIMELINE_FOLLOW_BACKFILL]
+        )
+        self.insert_missing('post_id', post_pks, user_id=user.pk)
+
+    def remove_author_posts(self, user, author):
+        # user가 author를 언팔로우했을 때, user의 타임라인에서 author의 Post를 삭제
+        self.filter(user=user, post__author=author).delete()
+
+    def posts_for(self, user):
+        """
+        user의 홈 타임라인에 보여줄 Post QuerySet
+         일반적인 경우 user의 타임라인 인덱스(user, post)의 범위 조회 1번으로 처리되며,
+         팔로우하는 사용자중 fan-out하지 않는 사용자(celebrity)가 있다면
+         해당 사용자들의 Post를 함께 가져옴
+        """
+        celebrity_pks = list(
+            user.following_relations
+            .filter(to_user__follower_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWER_COUNT)
+            .values_list('to_user_id', flat=True)
+        )
+        if not celebrity_pks:
+            return Post.objects.filter(timeline_entries__user=user)
+        return Post.objects.filter(
+            models.Q(pk__in=self.filter(user=user).values('post_id')) |
+            models.Q(author_id__in=celebrity_pks)
+        )
+
+
+class TimelineEntry(models.Model):
+    """
+    사용자별 홈 타임라인에 보여줄 Post목록을 미리 만들어둔 테이블
+     (user, post) unique인덱스를 사용해
+     'WHERE user_id = ? AND post_id < ? ORDER BY post_id DESC'형태로 조회
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+
+    objects = TimelineEntryManager()
+
+    def __str__(self):
+        return f'Timeline[{self.user_id}] Post[{self.post_id}]'
+
+    class Meta:
+        verbose_name = '타임라인 항목'
+        verbose_name_plural = f'{verbose_name} 목록'
+        unique_together = (
+            ('user', 'post'),
+        )
@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PostCursorPagination(CursorPagination):
+    """
+    Post목록을 pk기준 커서(keyset)로 나누어 돌려주는 Pagination
+     OFFSET/COUNT(*)를 사용하지 않으므로
+     몇 번째 페이지를 요청하더라도 'WHERE id < <cursor> ORDER BY id DESC LIMIT n'
+     형태의 인덱스 범위 조회 1번으로 처리됨
+    """
+    # Post.Meta.ordering과 동일한 기준을 사용
+    ordering = '-pk'
+    # 기본 페이지 크기, ?page_size=<n>으로 max_page_size까지 변경 가능
+    page_size = 12
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+
+
+class TagPostCursorPagination(PostCursorPagination):
+    # PostHashTagManager.posts_for()의 결과를
+    #  (hashtag, post)인덱스의 post_id기준 커서로 나누어 돌려줌
+    ordering = '-tagged_post_id'
@@ -0,0 +1,154 @@
+"""
+PostSerializer와 같은 JSON을 DRF Serializer를 거치지 않고 만드는 읽기 전용 경로
+ PostList, PostDetail의 GET에서 JSON을 요청한 경우에 사용
+ - Post/Comment를 모델 인스턴스 대신 .values() row로 가져오고 (작성자는 JOIN으로 함께)
+ - 요청한 필드(?fields=, ?expand=, config.fieldsets)만 row에서 꺼내서 dict를 직접 구성
+ - DRF JSONRenderer와 같은 설정의 JSONEncoder로 한 번에 인코딩
+ 출력은 PostSerializer + JSONRenderer의 결과와 byte단위로 같아야 함 (posts.tests.PostPayloadTest)
+ PostSerializer의 필드를 바꾼다면 이 모듈도 함께 변경
+"""
+from operator import itemgetter
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import DateTimeField
+from rest_framework.utils.encoders import JSONEncoder
+
+from config.fieldsets import Fieldset
+from . import renditions
+from .models import Comment, Post
+from .serializers import PostSerializer
+from .viewer import ViewerState
+
+# 필드별로 필요한 .values()의 컬럼 (pk는 항상 포함)
+#  PostSerializer.Meta.field_columns의 모델 필드명을 컬럼명(author -> author_id)으로 바꿔서 사용
+#  author는 확장한 경우에만 author__username을 JOIN해서 가져옴
+FIELD_COLUMNS = {
+    name: tuple(Post._meta.get_field(column).attname for column in columns)
+    for name, columns in PostSerializer.Meta.field_columns.items()
+}
+COMMENT_COLUMNS = (
+    'post_id',
+    'pk',
+    'author_id',
+    'author__username',
+    'content',
+)
+comment_values = itemgetter(*COMMENT_COLUMNS)
+
+# DRF DateTimeField와 같은 형식(DATETIME_FORMAT, 현재 timezone)으로 변환
+format_datetime = DateTimeField().to_representation
+photo_url = Post._meta.get_field('photo').storage.url
+
+# JSONRenderer.render()와 같은 설정 (indent가 없는 경우)
+encoder = JSONEncoder(
+    ensure_ascii=JSONRenderer.ensure_ascii,
+    allow_nan=not JSONRenderer.strict,
+    separators=(',', ':') if JSONRenderer.compact else (', ', ': '),
+)
+
+
+def render_json(data):
+    ret = encoder.encode(data)
+    return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
+
+
+def accepts_json(request):
+    # 내용 협상 결과가 JSONRenderer이고, indent를 요청하지 않은 경우에만 이 경로를 사용
+    #  (Browsable API등은 Serializer를 사용)
+    renderer = getattr(request, 'accepted_renderer', None)
+    return type(renderer) is JSONRenderer and \
+        renderer.get_indent(request.accepted_media_type, {}) is None
+
+
+def default_fieldset():
+    # ?fields=, ?expand=가 없는 요청은 모든 필드를 확장해서 포함
+    return Fieldset(PostSerializer)
+
+
+def post_rows(queryset, fieldset=None):
+    fieldset = fieldset or default_fieldset()
+    columns = ['pk']
+    for name in fieldset.fields:
+        columns.extend(FIELD_COLUMNS.get(name, ()))
+    if fieldset.expanded('author'):
+        columns.append('author__username')
+    return queryset.values(*dict.fromkeys(columns))
+
+
+class PostPayloadBuilder:
+    """
+    post_rows()의 row 목록으로 PostSerializer(many=True).data와 같은 list를 만듦
+     댓글(작성자 포함)과 요청한 사용자의 좋아요 여부는 Post목록 전체에 대해 한 번씩 조회
+     fieldset에 포함되지 않은 필드는 조회하지 않음
+    """
+
+    def __init__(self, request, fieldset=None):
+        self.request = request
+        self.fieldset = fieldset or default_fieldset()
+        self.absolute_uri = request.build_absolute_uri
+
+    def comments_for(self, post_pks):
+        # {post_pk: [comment, ...]}
+        comments = {pk: [] for pk in post_pks}
+        queryset = Comment.objects.filter(post_id__in=post_pks).order_by('pk')
+        if not self.fieldset.expanded('comments'):
+            for post_pk, pk in queryset.values_list('post_id', 'pk'):
+                comments[post_pk].append(pk)
+            return comments
+        for row in queryset.values(*COMMENT_COLUMNS):
+            post_pk, pk, author_pk, username, content = comment_values(row)
+            comments[post_pk].append({
+                'pk': pk,
+                'author': {'pk': author_pk, 'username': username},
+                'content': content,
+            })
+        return comments
+
+    def is_like_for(self, post_pks):
+        # {post_pk: PostLikeSerializer(postlike).data}, 좋아요하지 않은 Post는 없음
+        user = self.request.user
+        if not user.is_authenticated:
+            return {}
+        viewer_state = ViewerState.load(user, post_pks)
+        return {
+            post_pk: {
+                'pk': postlike.pk,
+                'post': post_pk,
+                'created_at': format_datetime(postlike.created_at),
+            }
+            for post_pk, postlike in viewer_state.postlikes.items()
+        }
+
+    def build(self, rows):
+        rows = list(rows)
+        fieldset = self.fieldset
+        post_pks = [row['pk'] for row in rows]
+        comments = self.comments_for(post_pks) if post_pks and 'comments' in fieldset else {}
+        is_like = self.is_like_for(post_pks) if post_pks and 'is_like' in fieldset else {}
+        expand_author = fieldset.expanded('author')
+        absolute_uri = self.absolute_uri
+
+        # 필드별로 row에서 값을 만드는 함수 (PostSerializer.Meta.fields의 순서)
+        getters = {
+            'pk': itemgetter('pk'),
+            'author': (lambda row: {'pk': row['author_id'], 'username': row['author__username']})
+            if expand_author else itemgetter('author_id'),
+            'photo': lambda row: absolute_uri(photo_url(row['photo'])) if row['photo'] else None,
+            'photo_renditions': lambda row: {
+                str(width): absolute_uri(url)
+                for width, url in renditions.rendition_urls(row['photo'], row['photo_widths'])
+            },
+            'created_at': lambda row: format_datetime(row['created_at']),
+            'like_count': itemgetter('like_count'),
+            'comment_count': itemgetter('comment_count'),
+            'is_like': lambda row: is_like.get(row['pk']),
+            'comments': lambda row: comments[row['pk']],
+        }
+        fields = [(name, getters[name]) for name in fieldset.fields]
+        return [{name: getter(row) for name, getter in fields} for row in rows]
+
+
+def json_response(data):
+    # DRF Response(JSONRenderer)와 같은 Content-Type
+    return HttpResponse(render_json(data), content_type=JSONRenderer.media_type)
@@ -0,0 +1,123 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from config.response_cache import bump_generations
+
+# EXIF의 Orientation값에 따라 적용할 변환
+#  (Pillow 5.x에는 ImageOps.exif_transpose가 없음)
+EXIF_ORIENTATION_TAG = 274
+EXIF_ORIENTATION_TRANSPOSE = {
+    2: [Image.FLIP_LEFT_RIGHT],
+    3: [Image.ROTATE_180],
+    4: [Image.FLIP_TOP_BOTTOM],
+    5: [Image.ROTATE_270, Image.FLIP_LEFT_RIGHT],
+    6: [Image.ROTATE_270],
+    7: [Image.ROTATE_90, Image.FLIP_LEFT_RIGHT],
+    8: [Image.ROTATE_90],
+}
+
+
+def rendition_name(photo_name, width):
+    # post/abc.png -> post/renditions/abc.png.640w.jpg
+    #  (확장자만 다른 원본끼리 겹치지 않도록 원본 파일명을 그대로 사용)
+    directory, filename = os.path.split(photo_name)
+    return os.path.join(directory, 'renditions', f'{filename}.{width}w.jpg')
+
+
+def rendition_urls(photo_name, photo_widths):
+    # Post.photo_widths('320,640,1080')에 해당하는 [(너비, URL), ...]
+    if not photo_widths:
+        return []
+    return [
+        (int(width), default_storage.url(rendition_name(photo_name, width)))
+        for width in photo_widths.split(',')
+    ]
+
+
+def delete_renditions(photo_name, photo_widths=None):
+    """
+    사진이 바뀐 Post의 이전 사진(photo_name)의 크기별 사진을 삭제
+     기록된 너비(photo_widths)와 현재 설정의 너비를 모두 확인
+     원본 사진은 Django의 FileField와 같이 삭제하지 않음 (Post를 삭제한 경우도 마찬가지)
+    """
+    widths = set(settings.POST_PHOTO_RENDITION_WIDTHS)
+    if photo_widths:
+        widths.update(int(width) for width in photo_widths.split(','))
+    for width in widths:
+        name = rendition_name(photo_name, width)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def open_image(f):
+    image = Image.open(f)
+    image.load()
+    exif = image._getexif() if hasattr(image, '_getexif') else None
+    orientation = (exif or {}).get(EXIF_ORIENTATION_TAG)
+    for method in EXIF_ORIENTATION_TRANSPOSE.get(orientation, []):
+        image = image.transpose(method)
+    # 투명 배경은 흰색으로 채워서 JPEG로 저장할 수 있는 RGB로 변환
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def generate_renditions(post_pk, force=False):
+    """
+    post_pk에 해당하는 Post의 사진을
+     settings.POST_PHOTO_RENDITION_WIDTHS의 너비별로 줄여서 저장하고
+     생성한 너비 목록을 Post.photo_widths에 기록
+    원본보다 큰 너비로는 늘리지 않음
+    """
+    # posts.models에서 이 모듈을 사용하므로 순환 import를 피하기 위해 함수 내에서 import
+    from .models import Post
+
+    post = Post.objects.filter(pk=post_pk).only('pk', 'photo', 'photo_widths').first()
+    if post is None or not post.photo:
+        return
+    if post.photo_widths is not None and not force:
+        return
+
+    with default_storage.open(post.photo.name) as f:
+        image = open_image(f)
+
+    widths = []
+    for width in sorted(settings.POST_PHOTO_RENDITION_WIDTHS):
+        if width >= image.width:
+            break
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.LANCZOS)
+        buffer = BytesIO()
+        resized.save(
+            buffer,
+            'JPEG',
+            quality=settings.POST_PHOTO_RENDITION_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+        name = rendition_name(post.photo.name, width)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+        widths.append(width)
+
+    # 그 사이에 사진이 바뀌지 않은 경우에만 기록
+    if Post.objects.filter(pk=post_pk, photo=post.photo.name).update(
+        photo_widths=','.join(str(width) for width in widths),
+        version=F('version') + 1,
+        modified_at=timezone.now(),
+    ):
+        bump_generations('posts')
+    return widths
@@ -1,8 +1,12 @@
 
+from django.db import models
 from rest_framework import serializers
 
+from config.fieldsets import FieldsetSerializerMixin
 from members.serializers import UserSerializer
 from .models import Post, PostLike, Comment
+from .uploads import PhotoSerializerField
+from .viewer import ViewerState
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -17,10 +21,26 @@ class CommentSerializer(serializers.ModelSerializer):
         )
 
 
-class PostSerializer(serializers.ModelSerializer):
-    author = UserSerializer()
+class PostListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # 여러 Post를 serialize할 때는
+        #  요청한 사용자의 상태값(좋아요 여부 등)을 미리 한 번에 가져와
+        #  각 PostSerializer가 공유하는 context에 넣어둠
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        iterable = list(iterable)
+        request = self.context.get('request')
+        if request is not None and 'is_like' in self.child.fields:
+            self.context['viewer_state'] = ViewerState.load(request.user, iterable)
+        return super().to_representation(iterable)
+
+
+class PostSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
+    # author는 PostList.perform_create에서 요청한 사용자로 지정
+    author = UserSerializer(read_only=True)
+    photo = PhotoSerializerField()
     is_like = serializers.SerializerMethodField()
-    comments = CommentSerializer(many=True)
+    photo_renditions = serializers.SerializerMethodField()
+    comments = CommentSerializer(many=True, read_only=True)
 
     class Meta:
         model = Post
@@ -28,22 +48,80 @@ class PostSerializer(serializers.ModelSerializer):
             'pk',
             'author',
             'photo',
+            'photo_renditions',
             'created_at',
+            'like_count',
+            'comment_count',
             'is_like',
             'comments',
         )
         read_only_fields = (
             'author',
+            'like_count',
+            'comment_count',
         )
+        list_serializer_class = PostListSerializer
+        # ?expand=로 선택, 확장하지 않으면 pk(목록)로 대체 (config.fieldsets)
+        expandable_fields = (
+            'author',
+            'comments',
+        )
+        # 필드별로 필요한 Post의 컬럼
+        field_columns = {
+            'author': ('author',),
+            'photo': ('photo',),
+            'photo_renditions': ('photo', 'photo_widths'),
+            'created_at': ('created_at',),
+            'like_count': ('like_count',),
+            'comment_count': ('comment_count',),
+        }
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fieldset):
+        # 요청한 필드에 필요한 컬럼, JOIN, prefetch만 사용
+        #  (View의 queryset에 지정된 select_related/prefetch_related는 대체함)
+        columns = ['pk']
+        for name in fieldset.fields:
+            columns.extend(cls.Meta.field_columns.get(name, ()))
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if fieldset.expanded('author'):
+            queryset = queryset.select_related('author')
+            columns.append('author__username')
+        if fieldset.expanded('comments'):
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'comments',
+                Comment.objects.select_related('author')
+                    .only('post', 'author__username', 'content'),
+            ))
+        elif 'comments' in fieldset:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'comments', Comment.objects.only('post'),
+            ))
+        return queryset.only(*dict.fromkeys(columns))
+
+    def get_viewer_state(self, obj):
+        # PostListSerializer에서 미리 가져온 ViewerState가 있다면 사용하고
+        #  단일 Post를 serialize하는 경우에는 해당 Post에 대해서만 가져옴
+        viewer_state = self.context.get('viewer_state')
+        if viewer_state is None or not viewer_state.covers(obj):
+            viewer_state = ViewerState.load(self.context['request'].user, [obj])
+        return viewer_state
+
+    def get_photo_renditions(self, obj):
+        # {'320': '<URL>', '640': '<URL>', ...}
+        #  photo필드와 같이 request가 있다면 절대경로 URL로 변환
+        request = self.context.get('request')
+        return {
+            str(width): request.build_absolute_uri(url) if request else url
+            for width, url in obj.photo_renditions
+        }
 
     def get_is_like(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
-            try:
-                postlike = obj.postlike_set.get(user=user)
+            postlike = self.get_viewer_state(obj).get_postlike(obj)
+            if postlike is not None:
                 return PostLikeSerializer(postlike).data
-            except PostLike.DoesNotExist:
-                return
 
 
 class PostLikeSerializer(serializers.ModelSerializer):
@@ -1,3 +1,1100 @@
-from django.test import TestCase
+import fcntl
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from members.models import User
+from . import payloads, renditions, uploads
+from .autocomplete import HashTagIndex
+from .like_buffer import LikeBuffer, like_buffer
+from .serializers import PostSerializer
+from .models import Comment, HashTag, Post, PostHashTag, PostLike
+from .viewer import ViewerState
+
+
+@override_settings(QUERY_BUDGET_MODE='raise', QUERY_BUDGET_SAMPLE_RATE=1.0)
+class PostListQueryBudgetTest(TestCase):
+    # Post/댓글 수가 늘어나도 목록의 쿼리 수가 settings.QUERY_BUDGETS를 넘지 않는지 확인
+    #  (캐시가 비어있을 때 Post/댓글마다 쿼리를 실행하면 QueryBudgetExceeded)
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'u{i}') for i in range(3)]
+        Post.objects.bulk_create([
+            Post(author=cls.users[i % 3], photo='post/test.jpg') for i in range(10)
+        ])
+        for post in Post.objects.all():
+            for user in cls.users:
+                Comment.objects.create(post=post, author=user, content=f'#tag {user}')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.users[0])
+
+    def test_post_list(self):
+        self.assertEqual(self.client.get('/posts/').status_code, 200)
+
+    def test_tag_post_list(self):
+        self.assertEqual(self.client.get('/explore/tags/tag/').status_code, 200)
+
+    def test_api_post_list(self):
+        self.assertEqual(self.client.get('/api/posts/post/').status_code, 200)
+
+    def test_api_post_detail(self):
+        post = Post.objects.first()
+        self.assertEqual(self.client.get(f'/api/posts/post/{post.pk}/').status_code, 200)
+
+
+class GenerateDatasetTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def generate(self, prefix):
+        call_command(
+            'generate_dataset', prefix=prefix, users=10, posts=30, comments=100, likes=200,
+            hashtags=20, photos=2, photo_size=16, seed=1, stdout=io.StringIO(),
+        )
+        return list(
+            Comment.objects.filter(author__username__startswith=f'{prefix}-')
+            .order_by('pk').values_list('content', flat=True)
+        )
+
+    def test_counts_and_derived_data(self):
+        self.generate('a')
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertEqual(PostLike.objects.count(), 200)
+        # 비정규화된 카운터와 태그별 Post 인덱스가 실제 데이터와 일치
+        for post in Post.objects.annotate(
+                actual_likes=Count('postlike', distinct=True),
+                actual_comments=Count('comments', distinct=True)):
+            self.assertEqual((post.like_count, post.comment_count), (post.actual_likes, post.actual_comments))
+        self.assertEqual(
+            PostHashTag.objects.aggregate(total=Sum('comment_count'))['total'],
+            Comment.tags.through.objects.count(),
+        )
+        comment = Comment.objects.filter(content__contains='#').first()
+        self.assertEqual(comment.html, Comment.render_html(comment.content))
+
+    def test_same_seed_same_dataset(self):
+        self.assertEqual(self.generate('a'), self.generate('b'))
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class PostPayloadTest(TestCase):
+    # posts.payloads의 응답이 PostSerializer + JSONRenderer의 응답과 byte단위로 같은지 확인
+    #  (비로그인 사용자의 두 번째 요청이 캐시된 응답을 사용하지 않도록 응답 캐시는 사용하지 않음)
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=name) for name in ['a', '사용자', 'c"\\']]
+        for index in range(5):
+            post = Post.objects.create(
+                author=cls.users[index % 3],
+                photo=f'post/사진 {index}.jpg',
+                photo_widths='320,640' if index % 2 else None,
+            )
+            for user in cls.users[:index % 3 + 1]:
+                Comment.objects.create(
+                    post=post, author=user, content=f'#태그{index} <b>&</b> \u2028 🙂 "x"')
+            if index % 2:
+                PostLike.objects.like(post.pk, cls.users[0])
+        Post.objects.create(author=cls.users[0], photo='post/empty.jpg')
+
+    def assertSameResponse(self, path, **extra):
+        fast = self.client.get(path, **extra)
+        with mock.patch.object(payloads, 'accepts_json', return_value=False):
+            slow = self.client.get(path, **extra)
+        self.assertEqual(fast.status_code, slow.status_code)
+        self.assertEqual(fast['Content-Type'], slow['Content-Type'])
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_post_list(self):
+        for user in [None, self.users[0], self.users[1]]:
+            if user is not None:
+                self.client.force_login(user)
+            response = self.assertSameResponse('/api/posts/post/?page_size=2')
+            self.assertSameResponse(response.json()['next'])
+            self.assertSameResponse('/api/posts/post/')
+
+    def test_post_detail(self):
+        self.client.force_login(self.users[0])
+        for post in Post.objects.all():
+            self.assertSameResponse(f'/api/posts/post/{post.pk}/')
+        self.assertSameResponse('/api/posts/post/0/')
+
+    def test_browsable_api_uses_serializer(self):
+        with mock.patch.object(payloads.PostPayloadBuilder, 'build') as build:
+            response = self.client.get('/api/posts/post/', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        build.assert_not_called()
+
+    # ?fields=, ?expand= (config.fieldsets)의 응답과 실행되는 쿼리
+    def test_fieldsets(self):
+        self.client.force_login(self.users[0])
+        post = Post.objects.filter(comment_count__gt=1).first()
+        for query in [
+            'fields=pk,photo',
+            'fields=photo,pk,photo,photo_renditions',
+            'fields=author,comments,is_like',
+            'fields=author,comments&expand=author',
+            'fields=author,comments&expand=comments',
+            'expand=',
+            'expand=author,comments',
+            'fields=',
+        ]:
+            with self.subTest(query=query):
+                response = self.assertSameResponse(f'/api/posts/post/?{query}')
+                self.assertSameResponse(f'/api/posts/post/{post.pk}/?{query}')
+        self.assertEqual(list(response.json()['results'][0]), [
+            'pk', 'author', 'photo', 'photo_renditions', 'created_at',
+            'like_count', 'comment_count', 'is_like', 'comments',
+        ])
+
+        data = self.client.get(f'/api/posts/post/{post.pk}/?fields=photo,pk').json()
+        self.assertEqual(list(data), ['pk', 'photo'])
+        data = self.client.get(f'/api/posts/post/{post.pk}/?fields=author,comments').json()
+        self.assertEqual(data['author'], {'pk': post.author_id, 'username': post.author.username})
+        data = self.client.get(f'/api/posts/post/{post.pk}/?expand=').json()
+        self.assertEqual(data['author'], post.author_id)
+        self.assertEqual(data['comments'], sorted(post.comments.values_list('pk', flat=True)))
+
+    def test_fieldset_queries(self):
+        self.client.force_login(self.users[0])
+        for fast in [True, False]:
+            with mock.patch.object(payloads, 'accepts_json', return_value=fast), \
+                    CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/posts/post/?fields=pk,photo')
+            sqls = [query['sql'] for query in queries if 'posts_' in query['sql']]
+            # 첫 쿼리는 ETag를 위한 (pk, version) 조회 (config.conditional)
+            self.assertNotIn('photo', sqls.pop(0))
+            self.assertEqual(len(sqls), 1, sqls)
+            self.assertNotIn('JOIN', sqls[0])
+            self.assertNotIn('comment_count', sqls[0])
+
+            with mock.patch.object(payloads, 'accepts_json', return_value=fast), \
+                    CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/posts/post/?fields=comments&expand=')
+            sqls = [query['sql'] for query in queries if 'posts_' in query['sql']]
+            # 첫 쿼리는 ETag를 위한 (pk, version) 조회 (config.conditional)
+            self.assertNotIn('photo', sqls.pop(0))
+            self.assertEqual(len(sqls), 2, sqls)
+            self.assertFalse(any('JOIN' in sql or 'content' in sql for sql in sqls), sqls)
+
+    def test_fieldset_unknown_fields(self):
+        response = self.client.get('/api/posts/post/?fields=pk,password&expand=photo')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'fields', 'expand'})
+        post = Post.objects.first()
+        response = self.client.get(f'/api/posts/post/{post.pk}/?fields=nope')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTest(TestCase):
+    # ETag를 사용한 조건부 GET (config.conditional)
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='conditional')
+        cls.other = User.objects.create_user(username='other')
+        cls.posts = [Post.objects.create(author=cls.user, photo='post/a.jpg') for _ in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertNotModified(self, path, **headers):
+        with mock.patch.object(payloads.PostPayloadBuilder, 'build') as build, \
+                mock.patch.object(PostSerializer, 'to_representation') as to_representation, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        build.assert_not_called()
+        to_representation.assert_not_called()
+        # 세션, 사용자, validator(Post, 댓글 작성자) 조회만 실행
+        self.assertLessEqual(len(queries), 4, [query['sql'] for query in queries])
+        return response
+
+    def test_post_detail(self):
+        path = f'/api/posts/post/{self.posts[0].pk}/'
+        response = self.client.get(path)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.assertNotModified(path, HTTP_IF_NONE_MATCH=etag)['ETag'], etag)
+
+        # 요청한 필드와 사용자가 다르면 다른 응답
+        self.assertNotEqual(self.client.get(f'{path}?fields=pk')['ETag'], etag)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.client.force_login(self.user)
+
+        Comment.objects.create(post=self.posts[0], author=self.other, content='댓글')
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment_count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.get(path)
+        PostLike.objects.like(self.posts[0].pk, self.user)
+        self.assertEqual(self.client.get(
+            path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_post_list(self):
+        path = '/api/posts/post/?page_size=2'
+        response = self.client.get(path)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertNotModified(path, HTTP_IF_NONE_MATCH=etag)
+        next_page = self.client.get(response.json()['next'])
+        self.assertNotEqual(next_page['ETag'], etag)
+
+        # 다른 페이지에 포함된 Post의 변경은 영향이 없음
+        Comment.objects.create(post=self.posts[0], author=self.user, content='댓글')
+        self.assertNotModified(path, HTTP_IF_NONE_MATCH=etag)
+        Comment.objects.create(post=self.posts[2], author=self.user, content='댓글')
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(path)['ETag']
+        Post.objects.create(author=self.user, photo='post/b.jpg')
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_author_change(self):
+        # 응답에 포함된 작성자, 댓글 작성자의 username 변경 (Post.version은 그대로)
+        Comment.objects.create(post=self.posts[0], author=self.other, content='댓글')
+        for path in [f'/api/posts/post/{self.posts[0].pk}/', '/api/posts/post/']:
+            for user, username in [(self.user, 'renamed'), (self.other, 'renamed-other')]:
+                etag = self.client.get(path)['ETag']
+                User.objects.filter(pk=user.pk).update(username=f'{username}-{len(path)}')
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(f'{username}-{len(path)}', response.content.decode())
+
+        # 댓글을 확장하지 않는 요청은 댓글 작성자를 조회하지 않음
+        path = f'/api/posts/post/{self.posts[0].pk}/?expand=author'
+        etag = self.client.get(path)['ETag']
+        User.objects.filter(pk=self.other.pk).update(username='not-included')
+        self.assertNotModified(path, HTTP_IF_NONE_MATCH=etag)
+
+    def test_missing_post(self):
+        response = self.client.get('/api/posts/post/0/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+    def test_reconcile_changes_etag(self):
+        path = f'/api/posts/post/{self.posts[1].pk}/'
+        etag = self.client.get(path)['ETag']
+        Post.objects.filter(pk=self.posts[1].pk).update(like_count=5)
+        call_command('reconcile_post_counters', stdout=io.StringIO())
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['like_count'], 0)
+
+
+class ResponseCacheTest(TransactionTestCase):
+    # 비로그인 사용자 응답 캐시와 쓰기에 따른 무효화 (config.response_cache)
+    #  세대 카운터는 트랜잭션이 커밋된 후 증가하므로 TransactionTestCase를 사용
+    def setUp(self):
+        cache.clear()
+        # 이전 테스트가 끝날 때 DB를 비우므로 프로세스별 태그 pk 캐시도 비움
+        HashTag.objects.forget('캐시태그')
+        self.user = User.objects.create_user(username='writer')
+        self.post = Post.objects.create(author=self.user, photo='post/a.jpg')
+        Comment.objects.create(post=self.post, author=self.user, content='#캐시태그 첫 댓글')
+
+    def assertCached(self, path, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, **headers)
+        self.assertEqual(len(queries), 0, [query['sql'] for query in queries])
+        return response
+
+    def test_post_list_and_tag_post_list(self):
+        self.assertContains(self.client.get('/posts/'), '첫 댓글')
+        self.assertNotContains(self.assertCached('/posts/'), '<strong>1개</strong>')
+        self.client.get('/explore/tags/캐시태그/')
+        self.assertCached('/explore/tags/캐시태그/')
+
+        # 좋아요는 태그 페이지에 영향이 없음
+        PostLike.objects.like(self.post.pk, self.user)
+        self.assertContains(self.client.get('/posts/'), '<strong>1개</strong>')
+        self.assertCached('/explore/tags/캐시태그/')
+
+        Comment.objects.create(post=self.post, author=self.user, content='두 번째 댓글')
+        self.assertContains(self.client.get('/posts/'), '두 번째 댓글')
+        self.client.get('/explore/tags/캐시태그/')
+        self.assertCached('/explore/tags/캐시태그/')
+
+        self.post.delete()
+        self.assertNotContains(self.client.get('/posts/'), '두 번째 댓글')
+
+    def test_api_post_list(self):
+        path = '/api/posts/post/?fields=pk,like_count'
+        response = self.client.get(path)
+        self.assertEqual(response.json()['results'], [{'pk': self.post.pk, 'like_count': 0}])
+        etag = response['ETag']
+        self.assertEqual(self.assertCached(path).content, response.content)
+        self.assertEqual(self.assertCached(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # 형식(media type)별로 저장
+        self.assertContains(self.client.get(path, HTTP_ACCEPT='text/html'), 'like_count')
+
+        PostLike.objects.like(self.post.pk, self.user)
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'pk': self.post.pk, 'like_count': 1}])
+
+    def test_bump_after_update(self):
+        # autocommit에서는 on_commit이 바로 실행되므로 세대는 UPDATE 후에 증가해야 함
+        like_counts = []
+
+        def bump(names):
+            like_counts.append(Post.objects.get(pk=self.post.pk).like_count)
+
+        with mock.patch('config.response_cache._bump', bump):
+            Post.update_counters(self.post.pk, like_count=1)
+            # 변경된 Post가 없다면 증가시키지 않음
+            Post.update_counters(0, like_count=1)
+        self.assertEqual(like_counts, [1])
+
+    def test_author_change(self):
+        # Post카드의 작성자 정보는 version에 반영되지 않음 (post_card_header조각의 키에 포함)
+        self.assertNotContains(self.client.get('/posts/'), 'user/new.png')
+        self.user.img_profile = 'user/new.png'
+        self.user.save()
+        self.assertContains(self.client.get('/posts/'), 'user/new.png')
+
+        self.client.force_login(self.user)
+        User.objects.filter(pk=self.user.pk).update(username='renamed-writer')
+        self.assertContains(self.client.get('/posts/'), 'renamed-writer')
+
+    def test_comment_author_change(self):
+        # 댓글 목록(post_card_body조각)은 댓글 작성자의 username이 바뀌면 Post의 version으로 갱신
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(post=self.post, author=commenter, content='다른 사용자의 댓글')
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get('/posts/'), '<strong>commenter</strong>')
+        version = Post.objects.get(pk=self.post.pk).version
+
+        # username이 바뀌지 않았다면 version을 올리지 않음
+        commenter = User.objects.get(pk=commenter.pk)
+        commenter.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version, version)
+
+        commenter.username = 'renamed-commenter'
+        commenter.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version, version + 1)
+        response = self.client.get('/posts/')
+        self.assertContains(response, '<strong>renamed-commenter</strong>')
+        self.assertNotContains(response, '<strong>commenter</strong>')
+
+    def test_authenticated_not_cached(self):
+        self.client.force_login(self.user)
+        self.client.get('/posts/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/posts/')
+        self.assertGreater(len(queries), 0)
+
+
+class LikeBufferTest(TestCase):
+    # 좋아요 쓰기 지연 버퍼 (posts.like_buffer)
+    def setUp(self):
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir, ignore_errors=True)
+        settings_override = override_settings(
+            POST_LIKE_BUFFER_ENABLED=True,
+            POST_LIKE_BUFFER_JOURNAL_DIR=journal_dir,
+            POST_LIKE_BUFFER_FLUSH_INTERVAL=3600,
+            POST_LIKE_BUFFER_MAX_SIZE=1000,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.journal_dir = journal_dir
+        self.users = [User.objects.create_user(username=f'u{i}') for i in range(3)]
+        self.post = Post.objects.create(author=self.users[0], photo='post/a.jpg')
+        self.buffer = LikeBuffer()
+        self.addCleanup(self.buffer.shutdown)
+
+    def journal_files(self):
+        return sorted(os.listdir(self.journal_dir))
+
+    def test_add_and_flush(self):
+        self.buffer.add(self.users[0].pk, self.post.pk, True)
+        self.buffer.add(self.users[1].pk, self.post.pk, True)
+        self.buffer.add(self.users[1].pk, self.post.pk, False)
+        self.assertEqual(self.buffer.pending(self.users[1].pk, [self.post.pk]), {self.post.pk: False})
+        self.assertFalse(PostLike.objects.exists())
+        with open(os.path.join(self.journal_dir, f'{os.getpid()}.log')) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(
+            list(PostLike.objects.values_list('user_id', flat=True)), [self.users[0].pk])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.buffer.pending(self.users[0].pk, [self.post.pk]), {})
+        # 기록된 journal은 삭제되고 빈 새 journal만 남음
+        self.assertEqual(self.journal_files(), [f'{os.getpid()}.log'])
+        self.assertEqual(os.path.getsize(os.path.join(self.journal_dir, f'{os.getpid()}.log')), 0)
+
+    def test_failed_flush_keeps_journal(self):
+        self.buffer.add(self.users[0].pk, self.post.pk, True)
+        with mock.patch.object(self.buffer, 'apply', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.buffer.flush()
+        self.assertEqual(len(self.journal_files()), 2)
+        self.assertEqual(self.buffer.pending(self.users[0].pk, [self.post.pk]), {self.post.pk: True})
+        self.buffer.flush()
+        self.assertEqual(self.journal_files(), [f'{os.getpid()}.log'])
+        self.assertTrue(PostLike.objects.filter(user=self.users[0]).exists())
+
+    def test_recover(self):
+        # 잠기지 않은 journal (비정상 종료된 프로세스)을 다시 적용, 잘린 마지막 줄은 무시
+        path = os.path.join(self.journal_dir, '99999.1.flushing')
+        with open(path, 'w') as f:
+            f.write(json.dumps([self.users[0].pk, self.post.pk, True]) + '\n')
+            f.write(json.dumps([self.users[1].pk, self.post.pk, True]) + '\n')
+            f.write(json.dumps([self.users[1].pk, self.post.pk, False]) + '\n')
+            f.write('[%d, %d, tr' % (self.users[2].pk, self.post.pk))
+        self.buffer.recover()
+        self.assertEqual(
+            list(PostLike.objects.values_list('user_id', flat=True)), [self.users[0].pk])
+        self.assertFalse(os.path.exists(path))
+        # 같은 내용을 다시 적용해도 결과가 같음
+        LikeBuffer.apply({(self.users[0].pk, self.post.pk): True})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_recover_vanished_journal(self):
+        # 다른 프로세스가 기록을 마치고 삭제한 journal은 건너뛰고 다시 만들지 않음
+        path = os.path.join(self.journal_dir, '99999.log')
+        getmtime = os.path.getmtime
+        with open(path, 'w') as f:
+            f.write(json.dumps([self.users[0].pk, self.post.pk, True]) + '\n')
+
+        def vanished(name):
+            if name == path:
+                os.remove(path)
+            return getmtime(name)
+
+        with mock.patch('os.path.getmtime', side_effect=vanished):
+            self.buffer.recover()
+        self.assertEqual(self.journal_files(), [])
+        self.assertIsNone(LikeBuffer._open_locked(path, create=False))
+        self.assertEqual(self.journal_files(), [])
+
+        # 연 후 잠그는 사이에 삭제되고 같은 이름으로 다시 만들어진 경우
+        open(path, 'w').close()
+        flock = fcntl.flock
+
+        def replaced(f, operation):
+            os.remove(path)
+            open(path, 'w').close()
+            return flock(f, operation)
+
+        with mock.patch('fcntl.flock', side_effect=replaced):
+            self.assertIsNone(LikeBuffer._open_locked(path, create=False))
+        self.buffer.recover()
+        self.assertEqual(self.journal_files(), [])
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_api(self):
+        # 버퍼를 사용해도 버퍼를 사용하지 않을 때와 같은 경우에 400, 404로 응답
+        path = f'/api/posts/post/{self.post.pk}/like/'
+        self.client.force_login(self.users[1])
+        with mock.patch('posts.apis.like_buffer', self.buffer):
+            self.assertEqual(self.client.delete(path).status_code, 404)
+            self.assertEqual(self.client.post(path).status_code, 202)
+            self.assertEqual(self.client.post(path).status_code, 400)
+            self.buffer.flush()
+            self.assertEqual(self.client.post(path).status_code, 400)
+            self.assertEqual(self.client.delete(path).status_code, 204)
+            self.assertEqual(self.client.delete(path).status_code, 404)
+            self.assertEqual(self.client.post('/api/posts/post/0/like/').status_code, 404)
+        self.buffer.flush()
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_pending_and_toggle_during_flush(self):
+        self.buffer.add(self.users[0].pk, self.post.pk, True)
+        apply = LikeBuffer.apply
+        seen = {}
+
+        def apply_batch(batch):
+            # 기록중인 내용은 버퍼와 DB 어디에도 없지만 pending()에 포함되어야 함
+            seen['pending'] = self.buffer.pending(self.users[0].pk, [self.post.pk])
+            seen['toggle'] = self.buffer.toggle(self.users[0].pk, self.post.pk)
+            apply(batch)
+
+        with mock.patch.object(self.buffer, 'apply', side_effect=apply_batch):
+            self.buffer.flush()
+        self.assertEqual(seen, {'pending': {self.post.pk: True}, 'toggle': False})
+        self.assertEqual(self.buffer.pending(self.users[0].pk, [self.post.pk]), {self.post.pk: False})
+        self.buffer.flush()
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_pending_while_flushing(self):
+        # 다른 스레드의 flush()와 동시에 pending()을 호출해도 예외가 발생하지 않음
+        post_pks = list(range(20))
+        errors = []
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                try:
+                    self.buffer.pending(1, post_pks)
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        with mock.patch.object(self.buffer, 'apply'):
+            reader = threading.Thread(target=read)
+            reader.start()
+            for _ in range(30):
+                for post_pk in post_pks:
+                    self.buffer.add(1, post_pk, True)
+                self.buffer.flush()
+            stop.set()
+            reader.join()
+        self.assertEqual(errors, [])
+
+    def test_write_through_without_journal(self):
+        with mock.patch.object(LikeBuffer, '_open_locked', return_value=None):
+            self.buffer.add(self.users[0].pk, self.post.pk, True)
+        self.assertTrue(PostLike.objects.filter(user=self.users[0]).exists())
+        self.assertEqual(self.buffer.pending(self.users[0].pk, [self.post.pk]), {})
+        # journal을 다시 열 수 있게 되면 버퍼를 사용
+        self.buffer.add(self.users[1].pk, self.post.pk, True)
+        self.assertEqual(self.buffer.pending(self.users[1].pk, [self.post.pk]), {self.post.pk: True})
+
+
+class PostCounterTest(TransactionTestCase):
+    # Post.like_count, comment_count의 보정
+    #  User 삭제시의 보정은 트랜잭션이 커밋된 후 실행되므로 TransactionTestCase를 사용
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.user = User.objects.create_user(username='user')
+        self.post = Post.objects.create(author=self.author, photo='post/a.jpg')
+
+    def assertCounters(self, like_count, comment_count):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.like_count, post.comment_count), (like_count, comment_count))
+
+    def test_delete_user(self):
+        PostLike.objects.like(self.post.pk, self.user)
+        PostLike.objects.like(self.post.pk, self.author)
+        Comment.objects.create(post=self.post, author=self.user, content='댓글')
+        self.assertCounters(2, 1)
+        # User와 함께 삭제된 PostLike, Comment를 반영
+        self.user.delete()
+        self.assertCounters(1, 0)
+        self.assertTrue(Post.objects.filter(author=self.author).exists())
+
+    def test_reconcile(self):
+        Comment.objects.create(post=self.post, author=self.user, content='댓글')
+        Comment.objects.filter(post=self.post).delete()
+        PostLike.objects.bulk_create([PostLike(post=self.post, user=self.user)])
+        self.assertCounters(0, 1)
+        version = Post.objects.get(pk=self.post.pk).version
+
+        stdout = io.StringIO()
+        call_command('reconcile_post_counters', stdout=stdout)
+        self.assertIn('1개의 카운터 수정', stdout.getvalue())
+        self.assertCounters(1, 0)
+        self.assertGreater(Post.objects.get(pk=self.post.pk).version, version)
+        self.assertEqual(Post.reconcile_counters([self.post.pk]), 0)
+
+
+class PostLikeManagerTest(TestCase):
+    # 좋아요/좋아요 취소와 Post.like_count (PostLikeManager)
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='liker')
+        cls.other = User.objects.create_user(username='other-liker')
+        cls.post = Post.objects.create(author=cls.user, photo='post/a.jpg')
+
+    def assertLikeCount(self, like_count):
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, like_count)
+        self.assertEqual(PostLike.objects.filter(post=self.post).count(), like_count)
+
+    def test_like_twice(self):
+        postlike, like_count = PostLike.objects.like(self.post.pk, self.user)
+        self.assertIsNotNone(postlike)
+        self.assertEqual(like_count, 1)
+        # 이미 좋아요한 경우 생성하지 않고 좋아요 수도 그대로
+        self.assertEqual(PostLike.objects.like(self.post.pk, self.user.pk), (None, 1))
+        self.assertEqual(PostLike.objects.like(self.post.pk, self.other)[1], 2)
+        self.assertLikeCount(2)
+
+    def test_unlike_twice(self):
+        PostLike.objects.like(self.post.pk, self.user)
+        self.assertEqual(PostLike.objects.unlike(self.post.pk, self.user), (True, 0))
+        self.assertEqual(PostLike.objects.unlike(self.post.pk, self.user), (False, 0))
+        self.assertLikeCount(0)
+
+    def test_toggle(self):
+        self.assertEqual(PostLike.objects.toggle(self.post.pk, self.user), (True, 1))
+        self.assertEqual(self.post.like_toggle(self.other), (True, 2))
+        self.assertEqual(PostLike.objects.toggle(self.post.pk, self.user), (False, 1))
+        self.assertEqual(self.other.like_post_toggle(self.post), (False, 0))
+        self.assertLikeCount(0)
+
+    def test_version(self):
+        # 실제로 생성/삭제된 경우에만 version이 증가
+        version = Post.objects.get(pk=self.post.pk).version
+        PostLike.objects.like(self.post.pk, self.user)
+        PostLike.objects.like(self.post.pk, self.user)
+        PostLike.objects.unlike(self.post.pk, self.other)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version, version + 1)
+
+    def test_missing_post(self):
+        for method in [PostLike.objects.like, PostLike.objects.unlike, PostLike.objects.toggle]:
+            with self.subTest(method=method.__name__), self.assertRaises(Post.DoesNotExist):
+                method(0, self.user)
+        self.assertFalse(PostLike.objects.exists())
+
+
+class PostHashTagTest(TestCase):
+    # 댓글의 추가/수정/삭제에 따른 (태그, Post) 인덱스와 보정 명령
+    tag_names = ['인덱스태그', '다른태그']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='tagger')
+        cls.post = Post.objects.create(author=cls.user, photo='post/a.jpg')
+
+    def setUp(self):
+        # 테스트마다 롤백되므로 프로세스별 태그 pk 캐시도 비움
+        for name in self.tag_names:
+            HashTag.objects.forget(name)
+            self.addCleanup(HashTag.objects.forget, name)
+
+    def entries(self):
+        return dict(
+            PostHashTag.objects
+            .filter(post=self.post)
+            .values_list('hashtag__name', 'comment_count')
+        )
+
+    def test_add_edit_delete(self):
+        first = Comment.objects.create(post=self.post, author=self.user, content='#인덱스태그')
+        second = Comment.objects.create(
+            post=self.post, author=self.user, content='#인덱스태그 #다른태그 #다른태그')
+        self.assertEqual(self.entries(), {'인덱스태그': 2, '다른태그': 1})
+
+        second.content = '#다른태그'
+        second.save()
+        self.assertEqual(self.entries(), {'인덱스태그': 1, '다른태그': 1})
+        first.content = '태그 없음'
+        first.save()
+        self.assertEqual(self.entries(), {'다른태그': 1})
+        first.content = '#인덱스태그'
+        first.save()
+        self.assertEqual(self.entries(), {'인덱스태그': 1, '다른태그': 1})
+
+        second.delete()
+        self.assertEqual(self.entries(), {'인덱스태그': 1})
+        first.delete()
+        self.assertEqual(self.entries(), {})
+
+    def test_rebuild(self):
+        Comment.objects.create(post=self.post, author=self.user, content='#인덱스태그')
+        Comment.objects.create(post=self.post, author=self.user, content='#인덱스태그 #다른태그')
+        # Comment.delete()를 거치지 않은 삭제와 직접 변경한 값
+        Comment.objects.filter(content='#인덱스태그').delete()
+        PostHashTag.objects.filter(hashtag__name='다른태그').delete()
+        self.assertEqual(self.entries(), {'인덱스태그': 2})
+
+        stdout = io.StringIO()
+        call_command('rebuild_post_hashtags', stdout=stdout)
+        self.assertIn('(태그, Post) 2개 수정', stdout.getvalue())
+        self.assertEqual(self.entries(), {'인덱스태그': 1, '다른태그': 1})
+        self.assertEqual(PostHashTag.objects.rebuild([self.post.pk]), 0)
+
+        Comment.objects.all().delete()
+        self.assertEqual(PostHashTag.objects.rebuild([self.post.pk]), 2)
+        self.assertEqual(self.entries(), {})
+        self.assertEqual(
+            [post.pk for post in PostHashTag.objects.posts_for('인덱스태그')], [])
+
+
+class PhotoUploadTest(TestCase):
+    # 업로드된 사진의 header 검사와 최대 크기를 넘는 파일의 처리 (posts.uploads)
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def image(self, size=(40, 30), image_format='PNG', name='photo.png',
+              content_type='application/octet-stream'):
+        buffer = io.BytesIO()
+        Image.new('RGB', size).save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type)
+
+    def assertInvalid(self, f, message):
+        with self.assertRaisesMessage(ValidationError, message):
+            uploads.validate_photo(f)
+
+    def test_valid(self):
+        f = self.image()
+        with mock.patch.object(Image.Image, 'load') as load:
+            self.assertIs(uploads.validate_photo(f), f)
+        # 전체 이미지를 decode하지 않고, 형식에 맞는 content_type을 사용
+        load.assert_not_called()
+        self.assertEqual(f.content_type, 'image/png')
+        self.assertEqual(f.tell(), 0)
+        self.assertEqual(
+            uploads.validate_photo(self.image(image_format='JPEG')).content_type, 'image/jpeg')
+
+    def test_invalid(self):
+        self.assertInvalid(
+            SimpleUploadedFile('photo.png', b'not an image'), '이미지 파일이 아니거나 손상된 파일입니다')
+        self.assertInvalid(self.image(image_format='BMP'), '지원하지 않는 이미지 형식입니다')
+        with override_settings(POST_PHOTO_MAX_PIXELS=40 * 30 - 1):
+            self.assertInvalid(self.image(), '사진의 해상도가 너무 큽니다')
+            uploads.validate_photo(self.image(size=(30, 30)))
+        with override_settings(POST_PHOTO_MAX_UPLOAD_SIZE=2 ** 20):
+            self.assertInvalid(
+                uploads.OversizedUploadedFile('photo.png', 2 ** 20 + 1),
+                '1MB 이하의 사진만 업로드할 수 있습니다')
+
+    def receive(self, content, max_size):
+        handler = uploads.LimitedTemporaryFileUploadHandler(max_size=max_size)
+        handler.chunk_size = 10
+        handler.new_file('photo', 'photo.png', 'image/png', len(content))
+        for start in range(0, len(content), handler.chunk_size):
+            handler.receive_data_chunk(content[start:start + handler.chunk_size], start)
+        return handler.file_complete(len(content))
+
+    def test_upload_handler(self):
+        content = self.image().read()
+        f = self.receive(content, max_size=len(content))
+        self.addCleanup(f.close)
+        self.assertEqual(f.size, len(content))
+        self.assertTrue(os.path.exists(f.temporary_file_path()))
+        self.assertIs(uploads.validate_photo(f), f)
+
+        # 최대 크기를 넘은 이후의 내용은 기록하지 않고 size만 가짐
+        f = self.receive(content, max_size=len(content) - 1)
+        self.assertIsInstance(f, uploads.OversizedUploadedFile)
+        self.assertEqual(f.size, len(content))
+        with self.assertRaises(ValueError):
+            f.open()
+        with override_settings(POST_PHOTO_MAX_UPLOAD_SIZE=len(content) - 1):
+            self.assertInvalid(f, 'MB 이하의 사진만 업로드할 수 있습니다')
+
+    def test_api(self):
+        self.client.force_login(User.objects.create_user(username='uploader'))
+        response = self.client.post(
+            '/api/posts/post/', {'photo': self.image(image_format='BMP', name='photo.bmp')})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'photo': ['지원하지 않는 이미지 형식입니다']})
+
+        with override_settings(POST_PHOTO_MAX_UPLOAD_SIZE=10):
+            response = self.client.post('/api/posts/post/', {'photo': self.image()})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+        response = self.client.post('/api/posts/post/', {'photo': self.image()})
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get()
+        self.assertEqual(Image.open(post.photo).size, (40, 30))
+
+
+class HashTagPkTest(TestCase):
+    # 태그명 목록의 pk를 가져오거나 생성 (HashTagManager.get_pks)
+    tag_names = ['있는태그', '새태그', '경쟁태그']
+
+    def setUp(self):
+        for name in self.tag_names:
+            HashTag.objects.forget(name)
+            self.addCleanup(HashTag.objects.forget, name)
+        self.existing = HashTag.objects.create(name='있는태그')
+
+    def test_get_pks(self):
+        pks = HashTag.objects.get_pks(['있는태그', '새태그', '있는태그'])
+        self.assertEqual(pks, dict(HashTag.objects.values_list('name', 'pk')))
+        self.assertEqual(pks['있는태그'], self.existing.pk)
+        self.assertEqual(HashTag.objects.count(), 2)
+
+        # 이미 있던 태그는 바로 캐시, 새로 생성한 태그는 커밋된 후에 캐시
+        #  (TestCase는 커밋하지 않으므로 다시 조회)
+        with self.assertNumQueries(0):
+            self.assertEqual(HashTag.objects.get_pks(['있는태그']), {'있는태그': self.existing.pk})
+        with self.assertNumQueries(1):
+            self.assertEqual(HashTag.objects.get_pks(['새태그']), {'새태그': pks['새태그']})
+        with self.assertNumQueries(0):
+            self.assertEqual(HashTag.objects.get_pks([]), {})
+
+    def test_created_concurrently(self):
+        # 조회한 후 bulk_create전에 다른 요청이 같은 태그를 먼저 생성한 경우
+        #  bulk_create는 IntegrityError로 실패하고 get_or_create로 하나씩 가져오거나 생성
+        raced = HashTag.objects.create(name='경쟁태그')
+        filter_ = HashTag.objects.filter
+        calls = []
+
+        def stale_filter(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                return filter_(pk__in=[self.existing.pk])
+            return filter_(*args, **kwargs)
+
+        with mock.patch.object(HashTag.objects, 'filter', side_effect=stale_filter), \
+                mock.patch.object(HashTag.objects, 'get_or_create',
+                                  wraps=HashTag.objects.get_or_create) as get_or_create:
+            pks = HashTag.objects.get_pks(['있는태그', '경쟁태그', '새태그'])
+        self.assertEqual(get_or_create.call_count, 2)
+        self.assertEqual(pks['있는태그'], self.existing.pk)
+        self.assertEqual(pks['경쟁태그'], raced.pk)
+        self.assertEqual(pks, dict(HashTag.objects.values_list('name', 'pk')))
+        self.assertEqual(HashTag.objects.filter(name='경쟁태그').count(), 1)
+
+
+class HashTagIndexTest(TestCase):
+    # 해시태그 자동완성 메모리 인덱스 (posts.autocomplete)
+    tag_names = ['python', 'Pytest', 'pythonic', 'pytorch', 'pyramid', 'pyre', 'django']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='autocompleter')
+        cls.post = Post.objects.create(author=cls.user, photo='post/a.jpg')
+
+    def setUp(self):
+        for name in self.tag_names:
+            HashTag.objects.forget(name)
+            self.addCleanup(HashTag.objects.forget, name)
+        # 사용 횟수: python 3, Pytest 2, pythonic 1, pytorch 1, django 1, pyramid 0
+        for content in ['#python #Pytest', '#python #Pytest #pythonic', '#python #pytorch #django']:
+            self.comment(content)
+        HashTag.objects.create(name='pyramid')
+        self.index = HashTagIndex()
+
+    def comment(self, content):
+        return Comment.objects.create(post=self.post, author=self.user, content=content)
+
+    def names(self, keyword, limit=10):
+        return [tag['name'] for tag in self.index.search(keyword, limit)]
+
+    def test_long_prefix(self):
+        # 사용 횟수가 많은 순서, 같다면 이름순 (대소문자 구분 없음)
+        self.assertEqual(self.names('pyth'), ['python', 'pythonic'])
+        self.assertEqual(self.names('PYTHO'), ['python', 'pythonic'])
+        self.assertEqual(self.names('pythonic'), ['pythonic'])
+        self.assertEqual(self.names('pythons'), [])
+        self.assertEqual(self.names('pyth', limit=1), ['python'])
+        tag = self.index.search('djan', 10)[0]
+        self.assertEqual(tag, {'id': HashTag.objects.get(name='django').pk, 'name': 'django'})
+
+    def test_short_prefix(self):
+        # 미리 계산해둔 상위 결과
+        self.assertEqual(
+            self.names('py'), ['python', 'Pytest', 'pythonic', 'pytorch', 'pyramid'])
+        self.assertEqual(self.names('PYT'), ['python', 'Pytest', 'pythonic', 'pytorch'])
+        self.assertEqual(self.names('p', limit=2), ['python', 'Pytest'])
+        self.assertEqual(self.names('d'), ['django'])
+        self.assertEqual(self.names('x'), [])
+
+    def test_refresh(self):
+        self.assertEqual(self.names('pyr'), ['pyramid'])
+        self.comment('#pyre')
+        # 갱신 간격 전에는 이전 인덱스(와 결과 캐시)를 사용
+        self.assertEqual(self.names('pyr'), ['pyramid'])
+        with override_settings(HASHTAG_AUTOCOMPLETE_REFRESH_INTERVAL=-1):
+            self.assertEqual(self.names('pyr'), ['pyre', 'pyramid'])
+            self.assertEqual(self.names('pyre'), ['pyre'])
+            self.assertEqual(
+                self.names('py'), ['python', 'Pytest', 'pyre', 'pythonic', 'pytorch', 'pyramid'])
+
+    def test_reload(self):
+        self.assertEqual(self.names('pyth'), ['python', 'pythonic'])
+        for _ in range(3):
+            self.comment('#pythonic')
+        # 새 태그만 추가하는 갱신으로는 사용 횟수가 바뀌지 않음
+        with override_settings(HASHTAG_AUTOCOMPLETE_REFRESH_INTERVAL=-1):
+            self.assertEqual(self.names('pyth'), ['python', 'pythonic'])
+        with override_settings(HASHTAG_AUTOCOMPLETE_RELOAD_INTERVAL=-1):
+            self.assertEqual(self.names('pyth'), ['pythonic', 'python'])
+            self.assertEqual(self.names('pyt')[:2], ['pythonic', 'python'])
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class PostListPaginationTest(TestCase):
+    # PostList의 커서 페이지 (posts.pagination.PostCursorPagination)
+    path = '/api/posts/post/'
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='paginator')
+        Post.objects.bulk_create([Post(author=user, photo='post/a.jpg') for _ in range(55)])
+        cls.pks = list(Post.objects.order_by('-pk').values_list('pk', flat=True))
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data, [post['pk'] for post in data['results']]
+
+    def test_page_size(self):
+        data, pks = self.get_page(f'{self.path}?fields=pk')
+        self.assertEqual(pks, self.pks[:12])
+        self.assertIsNone(data['previous'])
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(self.get_page(f'{self.path}?fields=pk&page_size=5')[1], self.pks[:5])
+        # max_page_size를 넘는 값은 max_page_size로 제한
+        self.assertEqual(len(self.get_page(f'{self.path}?fields=pk&page_size=100')[1]), 50)
+
+    def test_next_and_previous(self):
+        url = f'{self.path}?fields=pk&page_size=20'
+        pages = []
+        while url:
+            data, pks = self.get_page(url)
+            pages.append((data, pks))
+            url = data['next']
+        self.assertEqual([len(pks) for data, pks in pages], [20, 20, 15])
+        self.assertEqual(sum((pks for data, pks in pages), []), self.pks)
+        # next/previous 링크는 요청의 다른 파라미터를 유지
+        self.assertIn('page_size=20', pages[1][0]['next'])
+        self.assertEqual(self.get_page(pages[1][0]['previous'])[1], pages[0][1])
+        self.assertEqual(self.get_page(pages[2][0]['previous'])[1], pages[1][1])
+
+    def test_cursor_is_stable(self):
+        # 첫 페이지를 가져온 후 새 Post가 생겨도 다음 페이지가 밀리지 않음
+        data, pks = self.get_page(f'{self.path}?fields=pk&page_size=10')
+        Post.objects.create(author=User.objects.get(), photo='post/b.jpg')
+        self.assertEqual(self.get_page(data['next'])[1], self.pks[10:20])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(f'{self.path}?cursor=invalid').status_code, 404)
+
+
+class RenditionTest(TransactionTestCase):
+    # 크기별 사진 생성과 삭제 (posts.renditions)
+    #  백그라운드 작업은 트랜잭션이 커밋된 후 실행되므로 TransactionTestCase를 사용
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            BACKGROUND_TASKS_EAGER=True,
+            POST_PHOTO_RENDITION_WIDTHS=[320, 640, 1080],
+        )
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = User.objects.create_user(username='photographer')
+
+    def upload(self, size, mode='RGB', name='photo.png'):
+        buffer = io.BytesIO()
+        Image.new(mode, size).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+    def rendition_sizes(self, post):
+        sizes = {}
+        for width, url in post.photo_renditions:
+            with default_storage.open(renditions.rendition_name(post.photo.name, width)) as f:
+                image = Image.open(f)
+                sizes[width] = (image.format, image.size)
+        return sizes
+
+    def test_generate(self):
+        post = Post.objects.create(author=self.user, photo=self.upload((2000, 1000)))
+        post.refresh_from_db()
+        self.assertEqual(post.photo_widths, '320,640,1080')
+        self.assertEqual(post.version, 2)
+        self.assertEqual(self.rendition_sizes(post), {
+            320: ('JPEG', (320, 160)),
+            640: ('JPEG', (640, 320)),
+            1080: ('JPEG', (1080, 540)),
+        })
+        self.assertIn(f'{post.photo_renditions[0][1]} 320w', post.photo_srcset)
+        self.assertEqual(post.photo_thumbnail_url, post.photo_renditions[0][1])
+
+    def test_small_or_transparent_photo(self):
+        # 원본보다 큰 너비로는 늘리지 않고, 투명 배경은 JPEG로 저장할 수 있도록 변환
+        post = Post.objects.create(author=self.user, photo=self.upload((500, 500), 'RGBA'))
+        post.refresh_from_db()
+        self.assertEqual(post.photo_widths, '320')
+        self.assertEqual(self.rendition_sizes(post), {320: ('JPEG', (320, 320))})
+
+        post = Post.objects.create(author=self.user, photo=self.upload((200, 100)))
+        post.refresh_from_db()
+        self.assertEqual(post.photo_widths, '')
+        self.assertEqual(post.photo_thumbnail_url, post.photo.url)
+
+    def test_photo_change_deletes_old_renditions(self):
+        post = Post.objects.create(author=self.user, photo=self.upload((1000, 1000)))
+        post = Post.objects.get(pk=post.pk)
+        old_names = [renditions.rendition_name(post.photo.name, width) for width in [320, 640]]
+        self.assertTrue(all(default_storage.exists(name) for name in old_names))
+
+        post.photo = self.upload((700, 700), name='new.png')
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.photo_widths, '320,640')
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+        self.assertEqual(set(self.rendition_sizes(post)), {320, 640})
+
+        # 사진이 바뀌지 않은 수정은 다시 생성하지 않음
+        with mock.patch.object(renditions, 'generate_renditions') as generate:
+            post.save()
+        generate.assert_not_called()
+
+
+class ViewerStateTest(TestCase):
+    # 요청한 사용자 기준의 Post별 좋아요 여부 (posts.viewer)
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='viewer')
+        cls.posts = [Post.objects.create(author=cls.user, photo='post/a.jpg') for _ in range(3)]
+        cls.other_post = Post.objects.create(author=cls.user, photo='post/b.jpg')
+        for post in [cls.posts[0], cls.posts[2], cls.other_post]:
+            PostLike.objects.like(post.pk, cls.user)
+
+    def test_load(self):
+        with self.assertNumQueries(1):
+            state = ViewerState.load(self.user, self.posts)
+        self.assertEqual(state.liked_post_pks, {self.posts[0].pk, self.posts[2].pk})
+        self.assertTrue(state.is_like(self.posts[0]))
+        self.assertFalse(state.is_like(self.posts[1]))
+        self.assertEqual(state.get_postlike(self.posts[2]).user_id, self.user.pk)
+        self.assertIsNone(state.get_postlike(self.posts[1]))
+        # 전달받지 않은 Post의 정보는 가지고 있지 않음
+        self.assertTrue(state.covers(self.posts[1]))
+        self.assertFalse(state.covers(self.other_post))
+        self.assertFalse(state.is_like(self.other_post))
+
+        # pk 목록도 사용 가능
+        self.assertEqual(
+            ViewerState.load(self.user, [self.other_post.pk]).liked_post_pks, {self.other_post.pk})
+
+    def test_anonymous_or_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(ViewerState.load(AnonymousUser(), self.posts).liked_post_pks, set())
+            self.assertEqual(ViewerState.load(self.user, []).liked_post_pks, set())
+
+    def test_buffered_likes(self):
+        # 아직 DB에 기록되지 않은 좋아요/좋아요 취소를 반영
+        pending = {self.posts[0].pk: False, self.posts[1].pk: True}
+        with mock.patch.object(like_buffer, 'enabled', return_value=True), \
+                mock.patch.object(like_buffer, 'pending', return_value=pending):
+            state = ViewerState.load(self.user, self.posts)
+        self.assertEqual(state.liked_post_pks, {self.posts[1].pk, self.posts[2].pk})
+        self.assertIsNone(state.get_postlike(self.posts[1]).pk)
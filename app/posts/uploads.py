@@ -0,0 +1,121 @@
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from rest_framework import serializers
+
+
+class OversizedUploadedFile(UploadedFile):
+    """
+    최대 크기를 넘어서 내용을 저장하지 않은 업로드 파일
+     size값만 가지고 있으며, 유효성 검사에서 오류로 처리됨
+    """
+
+    def __init__(self, name, size, content_type=None, charset=None):
+        super().__init__(None, name, content_type, size, charset)
+
+    def open(self, mode=None):
+        raise ValueError('저장되지 않은 업로드 파일입니다')
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    업로드 파일을 메모리에 올리지 않고 chunk_size만큼씩 바로 임시파일에 기록하는 upload handler
+     max_size를 넘는 파일은 그 이후의 내용을 기록하지 않고 버림
+     (파일 크기와 상관없이 요청을 처리하는 동안 사용하는 메모리는 chunk_size정도로 유지됨)
+    """
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.POST_PHOTO_MAX_UPLOAD_SIZE
+        self.received_size = 0
+        self.oversized = False
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received_size = 0
+        self.oversized = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received_size += len(raw_data)
+        if self.oversized:
+            return
+        if self.received_size > self.max_size:
+            # 더이상 기록하지 않고 지금까지 기록한 임시파일도 삭제
+            self.oversized = True
+            self.file.close()
+            return
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.oversized:
+            return OversizedUploadedFile(
+                self.file_name, file_size, self.content_type, self.charset)
+        return super().file_complete(file_size)
+
+
+def photo_upload_handlers(request):
+    # request.POST, request.FILES에 접근하기 전에 request.upload_handlers에 할당
+    return [LimitedTemporaryFileUploadHandler(request)]
+
+
+def validate_photo(f):
+    """
+    업로드된 사진의 크기, 형식, 가로x세로 픽셀 수를 검사
+     Image.open()은 파일의 header만 읽으므로 전체 이미지를 decode하지 않음
+    """
+    if f.size > settings.POST_PHOTO_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            f'{settings.POST_PHOTO_MAX_UPLOAD_SIZE // 2 ** 20}MB 이하의 사진만 업로드할 수 있습니다')
+
+    if hasattr(f, 'temporary_file_path'):
+        source = f.temporary_file_path()
+    else:
+        f.seek(0)
+        source = f
+    try:
+        image = Image.open(source)
+        image_format, (width, height) = image.format, image.size
+        if isinstance(source, str):
+            # Image.close()는 전달받은 파일 객체도 닫으므로 경로로 연 경우에만 닫음
+            image.close()
+    except Exception:
+        raise ValidationError('이미지 파일이 아니거나 손상된 파일입니다')
+    finally:
+        if not isinstance(source, str):
+            f.seek(0)
+
+    if image_format not in settings.POST_PHOTO_FORMATS:
+        raise ValidationError('지원하지 않는 이미지 형식입니다')
+    if not width or not height or width * height > settings.POST_PHOTO_MAX_PIXELS:
+        raise ValidationError('사진의 해상도가 너무 큽니다')
+
+    f.content_type = Image.MIME.get(image_format)
+    return f
+
+
+class PhotoField(forms.FileField):
+    """
+    forms.ImageField대신 사용하는 사진 필드
+     forms.ImageField는 유효성 검사시 이미지 전체를 읽어서 verify()하므로
+     header만 검사하는 validate_photo를 사용
+    """
+
+    def to_python(self, data):
+        f = super().to_python(data)
+        if f is None:
+            return None
+        return validate_photo(f)
+
+
+class PhotoSerializerField(serializers.FileField):
+    # PhotoField와 같은 검사를 하는 DRF Serializer필드
+    def to_internal_value(self, data):
+        f = super().to_internal_value(data)
+        try:
+            return validate_photo(f)
+        except ValidationError as e:
+            raise serializers.ValidationError(e.messages)
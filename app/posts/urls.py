@@ -11,6 +11,9 @@ urlpatterns = [
     path('',
          views.post_list,
          name='post-list'),
+    path('feed/',
+         views.feed,
+         name='feed'),
     path('create/',
          views.post_create,
          name='post-create'),
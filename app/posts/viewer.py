@@ -0,0 +1,54 @@
+from .like_buffer import like_buffer
+from .models import PostLike
+
+
+class ViewerState:
+    """
+    요청한 사용자(viewer)를 기준으로 한 Post별 상태값을 모아둔 객체
+     한 페이지에 포함된 Post목록에 대해 필요한 정보를 한 번의 쿼리로 가져온 후
+     Serializer/Template에서 Post마다 쿼리를 실행하지 않고 꺼내 쓰도록 함
+    """
+
+    def __init__(self, user, post_pks):
+        self.user = user
+        self.post_pks = set(post_pks)
+        # {post_pk: PostLike}
+        self.postlikes = {}
+
+    @classmethod
+    def load(cls, user, posts):
+        # posts에는 Post인스턴스 또는 pk값의 목록이 올 수 있음
+        post_pks = [getattr(post, 'pk', post) for post in posts]
+        state = cls(user, post_pks)
+        if user.is_authenticated and post_pks:
+            state.load_postlikes()
+        return state
+
+    def load_postlikes(self):
+        postlikes = PostLike.objects.filter(
+            user=self.user,
+            post_id__in=self.post_pks,
+        )
+        self.postlikes = {postlike.post_id: postlike for postlike in postlikes}
+        if like_buffer.enabled():
+            # 아직 DB에 기록되지 않은 좋아요/좋아요 취소를 덮어씀
+            #  (저장되지 않은 PostLike이므로 pk, created_at값은 없음)
+            for post_pk, like in like_buffer.pending(self.user.pk, self.post_pks).items():
+                if not like:
+                    self.postlikes.pop(post_pk, None)
+                elif post_pk not in self.postlikes:
+                    self.postlikes[post_pk] = PostLike(post_id=post_pk, user=self.user)
+
+    def covers(self, post):
+        # 이 ViewerState가 전달받은 post에 대한 정보를 가지고 있는지 여부
+        return post.pk in self.post_pks
+
+    def get_postlike(self, post):
+        return self.postlikes.get(post.pk)
+
+    def is_like(self, post):
+        return post.pk in self.postlikes
+
+    @property
+    def liked_post_pks(self):
+        return set(self.postlikes)
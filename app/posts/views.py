@@ -1,13 +1,54 @@
 import re
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 
+from config.response_cache import cache_anonymous_response
 from .forms import CommentForm, PostForm
-from .models import Post, PostLike
+from .like_buffer import like_buffer
+from .models import Comment, Post, PostHashTag, PostLike, TimelineEntry
+from .uploads import photo_upload_handlers
+from .viewer import ViewerState
+
+
+def prefetch_uncached_comments(posts):
+    # 댓글 목록 조각(post_card_body)이 캐시되지 않은 Post만
+    #  댓글과 작성자를 한 번에 가져옴 (캐시가 비었을 때 Post/댓글마다 쿼리를 실행하지 않도록)
+    keys = {
+        make_template_fragment_key('post_card_body', [post.pk, post.version]): post
+        for post in posts
+    }
+    cached = cache.get_many(keys)
+    prefetch_related_objects(
+        [post for key, post in keys.items() if key not in cached],
+        Prefetch('comments', queryset=Comment.objects.select_related('author')),
+    )
+
+
+def post_list_context(request, posts):
+    # 'posts/post_list.html'을 렌더링할 때 사용하는 context
+    #  각 Post카드는 (pk, version)을 키로 템플릿 조각 캐시에 저장되며
+    #  요청한 사용자에 따라 달라지는 '좋아요' 버튼만 매번 렌더링
+    #  (좋아요 여부는 ViewerState를 사용해 한 번의 쿼리로 가져옴)
+    posts = list(posts)
+    prefetch_uncached_comments(posts)
+    viewer_state = ViewerState.load(request.user, posts)
+    return {
+        'posts': posts,
+        'liked_post_pks': viewer_state.liked_post_pks,
+        'comment_form': CommentForm(),
+        'post_card_cache_timeout': settings.POST_CARD_CACHE_TIMEOUT,
+    }
 
 
+@cache_anonymous_response('posts', 'comments', 'likes')
 def post_list(request):
     # 1. Post모델에
     #  created_at (생성시간 저장)
@@ -35,17 +76,35 @@ def post_list(request):
     #     view의 URL은 비워둔다
     #      결과: localhost:8000/posts/ 로 접근시
     #            이 view가 처리하도록 함
-    posts = Post.objects.all()
+    posts = Post.objects.select_related('author')
     # 적절히 CommentCreateForm을 전달
-    context = {
-        'posts': posts,
-        'comment_form': CommentForm(),
-    }
+    context = post_list_context(request, posts)
     return render(request, 'posts/post_list.html', context)
 
 
+@login_required
+def feed(request):
+    # URL: /posts/feed/
+    # 로그인한 사용자와 사용자가 팔로우하는 사람들의 Post목록
+    #  Template은 post_list와 같은 'posts/post_list.html'을 사용
+    posts = TimelineEntry.objects.posts_for(request.user)\
+        .select_related('author')[:settings.TIMELINE_PAGE_SIZE]
+    context = post_list_context(request, posts)
+    return render(request, 'posts/post_list.html', context)
+
+
+@csrf_exempt
 @login_required
 def post_create(request):
+    # 업로드된 사진을 메모리에 올리지 않고 임시파일에 나누어 기록하도록
+    #  upload handler를 교체한 후 처리
+    #  (request.POST에 접근하기 전에 교체해야 하므로 CSRF검사는 _post_create에서 실행)
+    request.upload_handlers = photo_upload_handlers(request)
+    return _post_create(request)
+
+
+@csrf_protect
+def _post_create(request):
     context = {}
     if request.method == 'POST':
         # request.FILES에 form에서 보낸 파일객체가 들어있음
@@ -106,15 +165,24 @@ def comment_create(request, post_pk):
             return redirect('posts:post-list')
 
 
+@cache_anonymous_response('posts', 'comments')
 def tag_post_list(request, tag_name):
     # Post중, 자신에게 속한 Comment가 가진 HashTag목록 중 tag_name이 name인 HashTag가 포함된
     #  Post목록을 posts변수에 할당
     #  context에 담아서 리턴 render
     # HTML: /posts/tag_post_list.html
-    posts = Post.objects.filter(
-        comments__tags__name=tag_name).distinct()
+    # Comment를 모두 join하지 않고 PostHashTag(태그별 Post 인덱스)에서 최신순으로 한 페이지씩 가져옴
+    #  ?before=<pk>: pk보다 이전(작은 pk)의 Post목록
+    posts = PostHashTag.objects.posts_for(tag_name)
+    before = request.GET.get('before', '')
+    if before.isdigit():
+        posts = posts.filter(tagged_post_id__lt=int(before))
+    page_size = settings.TAG_POST_PAGE_SIZE
+    posts = list(posts[:page_size + 1])
     context = {
-        'posts': posts,
+        'tag_name': tag_name,
+        'posts': posts[:page_size],
+        'next_before': posts[page_size - 1].pk if len(posts) > page_size else None,
     }
     return render(request, 'posts/tag_post_list.html', context)
 
@@ -141,7 +209,15 @@ def post_like_toggle(request, post_pk):
     #############################
 
     if request.method == 'POST':
-        post = get_object_or_404(Post, pk=post_pk)
-        post.like_toggle(request.user)
+        # Post를 먼저 가져오지 않고 바로 toggle처리
+        #  좋아요 버퍼를 사용한다면 버퍼를 통해 처리 (posts.like_buffer)
+        if like_buffer.enabled():
+            get_object_or_404(Post.objects.only('pk'), pk=post_pk)
+            like_buffer.toggle(request.user.pk, post_pk)
+        else:
+            try:
+                PostLike.objects.toggle(post_pk, request.user)
+            except Post.DoesNotExist:
+                raise Http404
         url = reverse('posts:post-list')
         return redirect(url + f'#post-{post_pk}')
\ No newline at end of file